@@ -1,11 +1,27 @@
 import streamlit as st
 import pandas as pd
 import numpy as np
-import plotly.express as px
-import plotly.graph_objects as go
-from datetime import datetime, timedelta
-import subprocess
-import sys
+from datetime import timedelta
+import os
+import storage
+import snapshot
+import refresh
+from metrics import RISK_COLUMNS, REGRESSION_COLUMNS, calculate_returns, calculate_drawdown, calculate_risk_metrics, regression_matrix
+from cube import PRESETS, preset_start, load_cube, lookup
+from memo import Memo
+import instrument
+from simulation import run_monte_carlo
+import forecast
+import rolling
+import correlation
+import volume
+import tracking
+from downsample import column_width, downsample
+import backtest
+import optimizer
+
+# Span thời gian của lần rerun này (xem bảng Diagnostics ẩn: ?diag=1 hoặc biến môi trường FUNDS_TRACE)
+TRACE = instrument.Tracer("rerun").start()
 
 # ==========================================
 # 1. TỪ ĐIỂN NGÔN NGỮ CHUYÊN SÂU
@@ -20,10 +36,11 @@ LANG = {
         "time_range": "Khung thời gian",
         "update_btn": "Cập nhật Dữ liệu",
         "loading": "Đang tải dữ liệu...",
-        "success_update": "Đã cập nhật xong! Nhấn 'R' để tải lại.",
+        "success_update": "Đã cập nhật xong! Dữ liệu mới đã được nạp.",
+        "refresh_joined": "Đang cập nhật, đã gộp vào lượt hiện tại.",
         "tab_perf": "Hiệu Suất", "tab_risk": "Rủi Ro", "tab_rr": "Risk-Return",
         "tab_trend": "Xu Hướng", "tab_corr": "Tương Quan", "tab_struct": "Cấu Trúc",
-        "tab_cycle": "Chu Kỳ", "tab_forecast": "Dự Báo",
+        "tab_cycle": "Chu Kỳ", "tab_forecast": "Dự Báo", "tab_backtest": "Backtest",
         "chart_cum_ret": "Tăng trưởng tài sản lũy kế",
         "chart_dd": "Mức sụt giảm từ đỉnh (Drawdown)",
         "chart_rr": "Vị thế Rủi ro vs Lợi nhuận",
@@ -33,6 +50,11 @@ LANG = {
         "chart_vol": "Thanh khoản (Volume)",
         "chart_bb": "Hiệu suất Bull vs Bear",
         "chart_forecast": "Dự báo Xu hướng (ETS)",
+        "chart_backtest": "Backtest Danh mục", "chart_cloud": "Danh mục ngẫu nhiên",
+        "bt_weights": "Tỷ trọng (%)", "bt_rebalance": "Tái cân bằng", "bt_dca": "Nạp thêm mỗi tháng (DCA)",
+        "bt_fees": "Trừ phí quản lý (Fee)", "bt_none": "Không (mua và giữ)", "bt_portfolio": "Danh mục", "bt_equal": "Tỷ trọng đều",
+        "opt_frontier": "Đường biên hiệu quả", "opt_portfolios": "Danh mục tối ưu (%)",
+        "trk_missing": "Chưa có dữ liệu chỉ số tham chiếu, tạm so với benchmark mặc định: ",
         "metric_ret": "Lợi nhuận", "metric_vol": "Biến động (Năm)", 
         "metric_sharpe": "Sharpe Ratio", "metric_alpha": "Alpha", "metric_beta": "Beta",
         "interp_title": "💡 Phân tích chuyên sâu:",
@@ -72,11 +94,18 @@ LANG = {
         - **Bear Market (Cột Đỏ):** Khi thị trường sập, quỹ có giữ giá tốt hơn không? (Cần < Benchmark, tức là cột đỏ ngắn hơn).
         """,
         "interp_forecast": """
-        - **Mô hình:** Sử dụng Monte Carlo Simulation (1000 kịch bản ngẫu nhiên dựa trên biến động quá khứ) và ETS (Dự báo chuỗi thời gian).
+        - **Mô hình:** Sử dụng Monte Carlo Simulation (1.000 - 100.000 kịch bản ngẫu nhiên dựa trên biến động quá khứ) và ETS (Dự báo chuỗi thời gian).
         - **Fan Chart:** Vùng màu hiển thị khoảng dao động giá có xác suất xảy ra cao nhất (Confidence Interval).
         - **Lưu ý:** Dự báo chỉ mang tính tham khảo dựa trên dữ liệu lịch sử. Thị trường luôn có những biến số vĩ mô bất ngờ (Black Swan) không thể dự báo bằng toán học.
         """,
-        "prob_up": "Xác suất Tăng", "scenario": "Kịch bản", "worst": "Xấu nhất", "best": "Tốt nhất"
+        "interp_backtest": """
+        - **Cách tính:** Khoản đầu tư 100 đơn vị chia theo tỷ trọng đã chọn; tái cân bằng cuối mỗi kỳ về tỷ trọng mục tiêu, tiền nạp thêm (DCA) mua theo cùng tỷ trọng.
+        - **Phí:** Phí quản lý năm (cột Fee) được trừ dần mỗi phiên. Quỹ chưa ra mắt được giữ như tiền mặt.
+        - **Chỉ số:** Lợi nhuận, Sharpe, Drawdown tính trên lợi nhuận theo thời gian (loại bỏ ảnh hưởng của tiền nạp thêm). Đám mây điểm là hàng nghìn danh mục ngẫu nhiên trên cùng các quỹ.
+        """,
+        "prob_up": "Xác suất Tăng", "scenario": "Kịch bản", "worst": "Xấu nhất", "best": "Tốt nhất",
+        "mc_short": "Chưa đủ lịch sử giá (cần ít nhất 3 phiên) để mô phỏng.",
+        "opt_short": "Cần ít nhất {n} quỹ có đủ {obs} phiên trong khung thời gian để tối ưu danh mục."
     },
     "EN": {
         "page_title": "Vietnam ETF Analytics Hub",
@@ -87,10 +116,11 @@ LANG = {
         "time_range": "Time Range",
         "update_btn": "Update Data",
         "loading": "Loading data...",
-        "success_update": "Update complete! Press 'R' to reload.",
+        "success_update": "Update complete! New data is loaded.",
+        "refresh_joined": "An update is already running; joined it.",
         "tab_perf": "Performance", "tab_risk": "Risk", "tab_rr": "Risk-Return",
         "tab_trend": "Trend", "tab_corr": "Correlation", "tab_struct": "Structure",
-        "tab_cycle": "Cycles", "tab_forecast": "Forecast",
+        "tab_cycle": "Cycles", "tab_forecast": "Forecast", "tab_backtest": "Backtest",
         "chart_cum_ret": "Cumulative Wealth Growth",
         "chart_dd": "Drawdown from Peak",
         "chart_rr": "Risk vs Return Positioning",
@@ -100,6 +130,11 @@ LANG = {
         "chart_vol": "Liquidity (Volume)",
         "chart_bb": "Bull vs Bear Performance",
         "chart_forecast": "Trend Forecast (ETS)",
+        "chart_backtest": "Portfolio Backtest", "chart_cloud": "Random Portfolios",
+        "bt_weights": "Weights (%)", "bt_rebalance": "Rebalancing", "bt_dca": "Monthly contribution (DCA)",
+        "bt_fees": "Deduct expense ratio (Fee)", "bt_none": "None (buy and hold)", "bt_portfolio": "Portfolio", "bt_equal": "Equal Weight",
+        "opt_frontier": "Efficient Frontier", "opt_portfolios": "Optimal Portfolios (%)",
+        "trk_missing": "Benchmark index has no price data, compared with the default benchmark instead: ",
         "metric_ret": "Return", "metric_vol": "Volatility (Ann.)",
         "metric_sharpe": "Sharpe Ratio", "metric_alpha": "Alpha", "metric_beta": "Beta",
         "interp_title": "💡 Analytical Insight:",
@@ -139,11 +174,18 @@ LANG = {
         - **Bear Market (Red Bar):** Does the fund fall less than the market? (Downside Protection).
         """,
         "interp_forecast": """
-        - **Models:** Uses Monte Carlo (1000 scenarios based on historical volatility) and ETS (Time-series forecasting).
+        - **Models:** Uses Monte Carlo (1,000 - 100,000 scenarios based on historical volatility) and ETS (Time-series forecasting).
         - **Fan Chart:** The shaded area shows the most probable price range (Confidence Interval).
         - **Disclaimer:** Forecasts are probabilistic and based on history. Markets are subject to unpredictable macro events (Black Swans).
         """,
-        "prob_up": "Prob. of Increase", "scenario": "Scenario", "worst": "Worst case", "best": "Best case"
+        "interp_backtest": """
+        - **Method:** 100 units invested with the chosen weights; rebalanced to target at each period end, contributions (DCA) are bought at the target weights.
+        - **Fees:** The annual expense ratio (Fee column) is deducted daily. Funds not yet launched are held as cash.
+        - **Metrics:** Return, Sharpe and Drawdown use time-weighted returns (contributions excluded). The cloud shows thousands of random portfolios of the same funds.
+        """,
+        "prob_up": "Prob. of Increase", "scenario": "Scenario", "worst": "Worst case", "best": "Best case",
+        "mc_short": "Not enough price history (at least 3 sessions) to simulate.",
+        "opt_short": "At least {n} funds with {obs} sessions in the time frame are needed to optimize."
     },
     "DE": {
         "page_title": "Vietnam ETF Analysezentrum",
@@ -154,10 +196,11 @@ LANG = {
         "time_range": "Zeitraum",
         "update_btn": "Daten aktualisieren",
         "loading": "Daten werden geladen...",
-        "success_update": "Update fertig! Drücken Sie 'R' zum Neuladen.",
+        "success_update": "Update fertig! Neue Daten sind geladen.",
+        "refresh_joined": "Ein Update läuft bereits; Anfrage zusammengeführt.",
         "tab_perf": "Performance", "tab_risk": "Risiko", "tab_rr": "Risiko-Rendite",
         "tab_trend": "Trend", "tab_corr": "Korrelation", "tab_struct": "Struktur",
-        "tab_cycle": "Zyklen", "tab_forecast": "Prognose",
+        "tab_cycle": "Zyklen", "tab_forecast": "Prognose", "tab_backtest": "Backtest",
         "chart_cum_ret": "Kumuliertes Vermögenswachstum",
         "chart_dd": "Wertverlust vom Höchststand (Drawdown)",
         "chart_rr": "Risiko-Rendite-Positionierung",
@@ -167,6 +210,11 @@ LANG = {
         "chart_vol": "Liquidität (Volumen)",
         "chart_bb": "Bull vs Bear Performance",
         "chart_forecast": "Trendprognose (ETS)",
+        "chart_backtest": "Portfolio-Backtest", "chart_cloud": "Zufällige Portfolios",
+        "bt_weights": "Gewichte (%)", "bt_rebalance": "Rebalancing", "bt_dca": "Monatliche Einzahlung (Sparplan)",
+        "bt_fees": "Verwaltungsgebühr abziehen (Fee)", "bt_none": "Keines (Kaufen und Halten)", "bt_portfolio": "Portfolio", "bt_equal": "Gleichgewichtet",
+        "opt_frontier": "Effizienzkurve", "opt_portfolios": "Optimale Portfolios (%)",
+        "trk_missing": "Keine Kursdaten für den Referenzindex, stattdessen mit dem Standard-Benchmark verglichen: ",
         "metric_ret": "Rendite", "metric_vol": "Volatilität (p.a.)",
         "metric_sharpe": "Sharpe-Quotient", "metric_alpha": "Alpha", "metric_beta": "Beta",
         "interp_title": "💡 Erklärung:",
@@ -206,11 +254,18 @@ LANG = {
         - **Bärenmarkt (Rot):** Fällt der Fonds weniger als der Markt? (Downside Protection).
         """,
         "interp_forecast": """
-        - **Modelle:** Nutzt Monte-Carlo-Simulation (1000 Szenarien basierend auf historischer Volatilität) und ETS (Zeitreihenprognose).
+        - **Modelle:** Nutzt Monte-Carlo-Simulation (1.000 - 100.000 Szenarien basierend auf historischer Volatilität) und ETS (Zeitreihenprognose).
         - **Fan-Chart:** Der farbige Bereich zeigt die Preisspanne mit der höchsten Wahrscheinlichkeit (Konfidenzintervall).
         - **Disclaimer:** Prognosen sind probabilistisch und basieren auf der Vergangenheit. Märkte unterliegen unvorhersehbaren Makroereignissen (Black Swans).
         """,
-        "prob_up": "Aufstiegs-WSK", "scenario": "Szenario", "worst": "Worst Case", "best": "Best Case"
+        "interp_backtest": """
+        - **Methode:** 100 Einheiten werden nach den gewählten Gewichten investiert; am Periodenende wird auf die Zielgewichte zurückgesetzt, Einzahlungen (Sparplan) werden nach denselben Gewichten gekauft.
+        - **Gebühren:** Die jährliche Verwaltungsgebühr (Spalte Fee) wird täglich abgezogen. Noch nicht aufgelegte Fonds werden als Cash gehalten.
+        - **Kennzahlen:** Rendite, Sharpe und Drawdown basieren auf zeitgewichteten Renditen (ohne Einzahlungen). Die Punktwolke zeigt tausende zufällige Portfolios derselben Fonds.
+        """,
+        "prob_up": "Aufstiegs-WSK", "scenario": "Szenario", "worst": "Worst Case", "best": "Best Case",
+        "mc_short": "Zu wenig Kurshistorie (mindestens 3 Handelstage) für die Simulation.",
+        "opt_short": "Für die Optimierung werden mindestens {n} Fonds mit {obs} Handelstagen im Zeitraum benötigt."
     }
 }
 
@@ -293,94 +348,79 @@ st.title(f"📈 {t('page_title')}")
 # ==========================================
 # 3. CORE LOGIC
 # ==========================================
-TRADING_DAYS = 252
-
-def calculate_returns(df): return df.pct_change()
-def calculate_cumulative_returns(df): return (1 + df.pct_change()).cumprod() - 1
-def calculate_drawdown(df):
-    roll_max = df.cummax()
-    return (df - roll_max) / roll_max
-
-def calculate_risk_metrics(daily_ret, risk_free_rate=0.0):
-    if daily_ret.empty: return pd.Series()
-    ann_ret = daily_ret.mean() * TRADING_DAYS
-    ann_vol = daily_ret.std() * np.sqrt(TRADING_DAYS)
-    neg_ret = daily_ret[daily_ret < 0]
-    downside_dev = neg_ret.std() * np.sqrt(TRADING_DAYS)
-    sharpe = (ann_ret - risk_free_rate) / ann_vol if ann_vol != 0 else 0
-    sortino = (ann_ret - risk_free_rate) / downside_dev if downside_dev != 0 else 0
-    cum_ret = (1 + daily_ret).cumprod()
-    max_dd = ((cum_ret - cum_ret.cummax()) / cum_ret.cummax()).min()
-    calmar = ann_ret / abs(max_dd) if max_dd != 0 else 0
-    return pd.Series({"Ann. Return": ann_ret, "Volatility": ann_vol, "Max Drawdown": max_dd, "Sharpe Ratio": sharpe, "Sortino Ratio": sortino, "Calmar Ratio": calmar})
-
-def calculate_beta_alpha(asset_ret, bench_ret):
-    asset_ret = asset_ret.rename("Asset")
-    bench_ret = bench_ret.rename("Benchmark")
-    df = pd.concat([asset_ret, bench_ret], axis=1).dropna()
-    if df.empty: return 0, 0
-    cov = np.cov(df["Asset"], df["Benchmark"])[0][1]
-    var = np.var(df["Benchmark"])
-    beta = cov / var if var != 0 else 0
-    alpha = (df["Asset"].mean() - beta * df["Benchmark"].mean()) * TRADING_DAYS
-    return beta, alpha
-
-def calculate_tracking_error(asset_ret, bench_ret, window=63):
-    diff = asset_ret - bench_ret
-    return diff.rolling(window).std() * np.sqrt(TRADING_DAYS) * 100
-
-def calculate_bull_bear_stats(asset_ret, bench_ret):
-    a_name, b_name = "Asset", "Bench"
-    df = pd.concat([asset_ret.rename(a_name), bench_ret.rename(b_name)], axis=1).dropna()
-    if df.empty: return 0, 0
-    bull = df[df[b_name] > 0][a_name].mean() * 252
-    bear = df[df[b_name] < 0][a_name].mean() * 252
-    return (bull if not pd.isna(bull) else 0) * 100, (bear if not pd.isna(bear) else 0) * 100
-
-def run_monte_carlo(price_series, days=30, simulations=1000):
-    returns = price_series.pct_change().dropna()
-    last_price = price_series.iloc[-1]
-    mu = returns.mean()
-    sigma = returns.std()
-    daily_returns = np.random.normal(mu, sigma, (days, simulations))
-    price_paths = np.zeros_like(daily_returns)
-    price_paths[0] = last_price
-    for t in range(1, days):
-        price_paths[t] = price_paths[t-1] * (1 + daily_returns[t])
-    final_prices = price_paths[-1]
-    prob_up = np.mean(final_prices > last_price) * 100
-    expected_price = np.median(final_prices)
-    worst_case = np.percentile(final_prices, 5)
-    best_case = np.percentile(final_prices, 95)
-    return price_paths, prob_up, expected_price, worst_case, best_case
-
-# Mock ETS
-try:
-    from statsmodels.tsa.holtwinters import ExponentialSmoothing
-    def run_ets_forecast(price_series, days=30):
-        ts = price_series.asfreq('B').fillna(method='ffill')
-        try:
-            model = ExponentialSmoothing(ts, trend='add', damped_trend=True, seasonal=None).fit()
-            return model.forecast(days)
-        except: return ExponentialSmoothing(ts).fit().forecast(days)
-except ImportError:
-    def run_ets_forecast(price_series, days=30): return pd.Series([price_series.iloc[-1]]*days)
+# Returns, Drawdown, Risk Metrics, Beta/Alpha, Bull/Bear: dùng engine vector hóa trong metrics.py
+# ETS: tính sẵn bởi forecast.py sau mỗi lần cập nhật, chỉ fit trực tiếp khi cache không phủ lựa chọn
+def run_ets_forecast(price_series, days=30):
+    return forecast.fit_one(price_series.name, price_series, days)['Forecast']
 
 # ==========================================
 # 4. LOAD DATA
 # ==========================================
-@st.cache_data
-def load_all_data():
-    try:
-        df_p = pd.read_csv('funds_data.csv', parse_dates=['Date'], index_col='Date')
-        df_v = pd.read_csv('funds_volume.csv', parse_dates=['Date'], index_col='Date')
-        df_meta = pd.read_csv('funds_profile.csv', index_col='Ticker')
-        return df_p, df_v, df_meta
-    except FileNotFoundError: return None, None, None
-
-df, df_vol, df_profile = load_all_data()
+def load_profile(path):
+    return pd.read_csv(path, index_col='Ticker') if os.path.exists(path) else None
+
+# cache_resource: một Reader dùng chung giữa các phiên (TickStore memory-map, không pickle/copy mỗi lần rerun).
+# Mỗi rerun chỉ đọc con trỏ snapshot CURRENT; khi có snapshot mới thì chỉ đọc lại các bảng đã đổi.
+@st.cache_resource
+def get_reader():
+    return snapshot.Reader({
+        'ticks': storage.open_store, 'profile': load_profile, 'cube': load_cube,
+        'forecasts': forecast.load_forecasts, 'rolling': rolling.load_rolling, 'volume': volume.load_volume,
+        'tracking': tracking.load_tracking,
+    })
 
-if df is None:
+def load_all_data():
+    tables = get_reader().load()
+    if tables['ticks'] is None or tables['profile'] is None: return None, None, None, None, None, None, None
+    return tuple(tables[k] for k in ('ticks', 'profile', 'cube', 'forecasts', 'rolling', 'volume', 'tracking'))
+
+store, df_profile, metric_cube, ets_cache, roll_cache, vol_cache, trk_cache = TRACE.call("load", load_all_data)
+
+# Bộ nhớ đệm tính toán dùng chung (LRU theo số mục & dung lượng); khóa luôn chứa store.version
+@st.cache_resource
+def get_memo():
+    return Memo()
+
+MEMO = get_memo()
+
+@st.cache_resource
+def get_worker():
+    return refresh.RefreshWorker()
+
+WORKER = get_worker()
+
+def refresh_panel():
+    job = WORKER.status()
+    if job is None: return
+    if job["state"] in ("queued", "running"):
+        p = job.get("progress") or {}
+        total, done = p.get("total") or 0, p.get("done", 0)
+        text = f"{t('loading')} {job['step'] or ''}"
+        if p: text += f" · {p['stage']} · {done}/{total} · {p['bytes'] / 1e6:.1f} MB"
+        if p.get("errors"): text += f" · ❌ {len(p['errors'])}"
+        st.progress(done / total if total else 0.0, text=text)
+    elif job["state"] == "done":
+        # Snapshot mới đã được công bố: chỉ phiên đã thấy job này chạy mới cần tải lại một lần
+        if st.session_state.get("refresh_seen") == job["id"] and st.session_state.get("refresh_applied") != job["id"]:
+            st.session_state["refresh_applied"] = job["id"]
+            fresh = TRACE.call("load", load_all_data)[0]
+            if fresh is not None: MEMO.invalidate(fresh.version)  # Bỏ kết quả của phiên bản dữ liệu cũ
+            st.rerun()
+        st.success(t("success_update"))
+    elif job["state"] == "rejected": st.warning(job["error"])
+    else: st.error(f"Error: {job['error']}")
+    if job["state"] in ("queued", "running"): st.session_state["refresh_seen"] = job["id"]
+
+def refresh_status():
+    # Khi có job đang chạy: hỏi lại tiến độ mỗi giây bằng fragment (chỉ phần này chạy lại, phần còn lại vẫn tương tác được).
+    # Streamlit cũ không có fragment: tiến độ cập nhật theo mỗi lần rerun.
+    job = WORKER.status()
+    if job is not None and job["state"] in ("queued", "running") and hasattr(st, "fragment"):
+        st.fragment(run_every=1)(refresh_panel)()
+    else:
+        refresh_panel()
+
+if store is None:
     st.warning(t("loading"))
     st.stop()
 
@@ -388,18 +428,14 @@ if df is None:
 with st.sidebar:
     st.header(f"⚙️ {t('sidebar_settings')}")
     
-    # Update Button
+    # Update Button: gửi yêu cầu cho worker nền (dùng chung mọi phiên) rồi theo dõi tiến độ, không chặn phiên
     if st.button(t("update_btn")):
-        with st.spinner(t("loading")):
-            try:
-                result = subprocess.run([sys.executable, "update_data.py"], capture_output=True, text=True)
-                if result.returncode == 0:
-                    st.success(t("success_update"))
-                    st.cache_data.clear()
-                else: st.error(f"Error: {result.stderr}")
-            except Exception as e: st.error(f"Error: {e}")
+        job, coalesced = WORKER.submit()
+        st.session_state["refresh_job"] = job["id"]
+        if coalesced: st.toast(f"⏳ {t('refresh_joined')}")
+    refresh_status()
     
-    last_update = df.index.max().strftime('%d/%m/%Y')
+    last_update = store.last_date().strftime('%d/%m/%Y')
     st.info(f"📅 {t('data_updated')}: **{last_update}**")
     
     all_issuers = df_profile['Issuer'].dropna().unique().tolist()
@@ -407,7 +443,7 @@ with st.sidebar:
     
     filtered_profile = df_profile[df_profile['Issuer'].isin(sel_issuers)]
     avail_funds = filtered_profile.index.tolist()
-    display_list = [c for c in df.columns if c in (['VNINDEX', 'VN30'] + avail_funds)]
+    display_list = [c for c in store.tickers if c in (['VNINDEX', 'VN30'] + avail_funds)]
     
     default_f = [f for f in ['VNINDEX', 'E1VFVN30', 'FUEVFVND'] if f in display_list]
     if not default_f and display_list: default_f = [display_list[0]]
@@ -415,30 +451,59 @@ with st.sidebar:
     sel_funds = st.multiselect(f"{t('select_ticker')}:", display_list, default=default_f)
     if not sel_funds: st.stop()
 
-    t_range = st.select_slider(f"{t('time_range')}:", options=["3M", "6M", "YTD", "1Y", "3Y", "5Y", "Max"], value="1Y")
-    end_d = df.index.max()
-    start_d = {
-        "3M": end_d - timedelta(days=90), "6M": end_d - timedelta(days=180),
-        "1Y": end_d - timedelta(days=365), "3Y": end_d - timedelta(days=365*3),
-        "5Y": end_d - timedelta(days=365*5), "YTD": datetime(end_d.year, 1, 1),
-        "Max": df.index.min()
-    }[t_range]
+    t_range = st.select_slider(f"{t('time_range')}:", options=PRESETS, value="1Y")
+    end_d = store.last_date()
+    start_d = preset_start(t_range, end_d, store.first_date())
     
     st.markdown("---")
     st.caption("© 2026 | Developed by Minh Phu Dinh")
 
-df_view = df.loc[start_d:end_d, sel_funds]
-daily_ret = calculate_returns(df_view)
-bench_ticker = 'VNINDEX' if 'VNINDEX' in df.columns else sel_funds[0]
-bench_ret = calculate_returns(df.loc[start_d:end_d, bench_ticker])
+# Chỉ đọc các mã được chọn (và benchmark) trong khoảng thời gian, căn ngày chung.
+# Mọi kết quả theo lựa chọn được ghi nhớ theo (mã, benchmark, start_d, end_d, phiên bản dữ liệu),
+# nên đổi ngôn ngữ / tab / selectbox không tính lại.
+bench_ticker = 'VNINDEX' if 'VNINDEX' in store else sel_funds[0]
+view_key = (tuple(sel_funds), bench_ticker, start_d, end_d, store.version)
+
+def memo(name, compute, *extra):
+    # Span chỉ được ghi khi phải tính (miss); hit gần như không tốn thời gian
+    TRACE.count("memo.calls")
+    return MEMO.get((name,) + view_key + extra, lambda: traced(name, compute))
+
+def traced(name, compute):
+    TRACE.count("memo.miss")
+    return TRACE.call(name, compute)
+
+df_sel = memo("prices", lambda: store.wide(list(dict.fromkeys(sel_funds + [bench_ticker])), start_d, end_d))
+df_view = df_sel[sel_funds]
+daily_ret = memo("returns", lambda: calculate_returns(df_view))
+bench_ret = memo("bench_ret", lambda: calculate_returns(df_sel[bench_ticker]))
+
+def live_metrics():
+    # Risk/Beta/Alpha/Bull/Bear/Tương quan: tra metric cube tính sẵn, chỉ tính trực tiếp khi cube không phủ lựa chọn
+    cached = lookup(metric_cube, t_range, sel_funds, store.version, bench_ticker)
+    TRACE.count("cube.hit" if cached is not None else "cube.miss")
+    if cached is not None:
+        cube_table, corr = cached
+        return cube_table[RISK_COLUMNS], cube_table[REGRESSION_COLUMNS], corr
+    return calculate_risk_metrics(daily_ret), regression_matrix(daily_ret, bench_ret), correlation.pairwise_corr(daily_ret)
 
 # ==========================================
 # 5. DASHBOARD TABS
 # ==========================================
-tab1, tab2, tab3, tab4, tab5, tab6, tab7, tab8 = st.tabs([
-    t("tab_perf"), t("tab_risk"), t("tab_rr"), 
-    t("tab_trend"), t("tab_corr"), t("tab_struct"), t("tab_cycle"), t("tab_forecast")
-])
+# Chỉ tab đang mở được tính và vẽ (on_change="rerun"); Streamlit cũ không hỗ trợ thì vẽ tất cả như trước
+TAB_LABELS = [t("tab_perf"), t("tab_risk"), t("tab_rr"), t("tab_trend"), t("tab_corr"), t("tab_struct"), t("tab_cycle"), t("tab_forecast"), t("tab_backtest")]
+# Khóa cố định để đổi ngôn ngữ không đóng tab đang mở; nhãn tab đã lưu được dịch sang ngôn ngữ mới theo vị trí
+prev_labels = st.session_state.get("tab_labels")
+if prev_labels and prev_labels != TAB_LABELS and st.session_state.get("tabs") in prev_labels:
+    st.session_state["tabs"] = TAB_LABELS[prev_labels.index(st.session_state["tabs"])]
+st.session_state["tab_labels"] = TAB_LABELS
+try:
+    tab1, tab2, tab3, tab4, tab5, tab6, tab7, tab8, tab9 = st.tabs(TAB_LABELS, key="tabs", on_change="rerun")
+except TypeError:
+    tab1, tab2, tab3, tab4, tab5, tab6, tab7, tab8, tab9 = st.tabs(TAB_LABELS)
+
+def tab_open(tab):
+    return getattr(tab, "open", None) is not False
 
 def chart_layout(fig, title="", x_title="", y_title=""):
     fig.update_layout(
@@ -450,134 +515,309 @@ def chart_layout(fig, title="", x_title="", y_title=""):
     )
     return fig
 
+def plot(fig):
+    # Plotly serialise figure sang JSON bên trong st.plotly_chart
+    with TRACE.span("plotly"):
+        st.plotly_chart(fig, use_container_width=True)
+
 def interpret(text):
     st.markdown(f"""<div class="interpret-box"><span class="interpret-title">{t('interp_title')}</span> {text}</div>""", unsafe_allow_html=True)
 
 # --- TAB 1 ---
-with tab1:
-    st.markdown(f"### 🚀 {t('chart_cum_ret')}")
-    cols = st.columns(len(sel_funds))
-    norm_df = (df_view / df_view.iloc[0] - 1) * 100
-    latest = norm_df.iloc[-1]
-    for i, f in enumerate(sel_funds):
-        cols[i].metric(label=f, value=f"{latest[f]:.2f}%")
-    fig = chart_layout(px.line(norm_df, height=500), y_title=f"{t('metric_ret')} (%)")
-    fig.update_xaxes(rangeslider_visible=True)
-    st.plotly_chart(fig, use_container_width=True)
-    interpret(t("interp_perf"))
+if tab_open(tab1):
+    with tab1, TRACE.span("tab.perf"):
+        import plotly.express as px
+        st.markdown(f"### 🚀 {t('chart_cum_ret')}")
+        cols = st.columns(len(sel_funds))
+        norm_df = memo("norm", lambda: (df_view / df_view.iloc[0] - 1) * 100)
+        latest = norm_df.iloc[-1]
+        for i, f in enumerate(sel_funds):
+            cols[i].metric(label=f, value=f"{latest[f]:.2f}%")
+        # Rút gọn điểm trước khi gửi xuống trình duyệt (LTTB giữ hình dạng đường)
+        fig = chart_layout(px.line(memo("norm_plot", lambda: downsample(norm_df, 'lttb')), height=500), y_title=f"{t('metric_ret')} (%)")
+        fig.update_xaxes(rangeslider_visible=True)
+        plot(fig)
+        interpret(t("interp_perf"))
 
 # --- TAB 2 ---
-with tab2:
-    st.markdown(f"### 📉 {t('chart_dd')}")
-    dd = calculate_drawdown(df_view) * 100
-    fig = chart_layout(px.area(dd, height=450), y_title="Drawdown (%)")
-    st.plotly_chart(fig, use_container_width=True)
-    interpret(t("interp_risk"))
+if tab_open(tab2):
+    with tab2, TRACE.span("tab.risk"):
+        import plotly.express as px
+        st.markdown(f"### 📉 {t('chart_dd')}")
+        dd = memo("drawdown", lambda: calculate_drawdown(df_view) * 100)
+        # min/max theo bucket: giữ nguyên đỉnh và đáy drawdown
+        fig = chart_layout(px.area(memo("drawdown_plot", lambda: downsample(dd, 'minmax')), height=450), y_title="Drawdown (%)")
+        plot(fig)
+        interpret(t("interp_risk"))
 
 # --- TAB 3 ---
-with tab3:
-    st.markdown(f"### ⚖️ {t('chart_rr')}")
-    r_data = []
-    for f in sel_funds:
-        m = calculate_risk_metrics(daily_ret[f])
-        b, a = calculate_beta_alpha(daily_ret[f], bench_ret)
-        if not m.empty: r_data.append({"Ticker": f, "Return": m["Ann. Return"]*100, "Vol": m["Volatility"]*100, "Sharpe": m["Sharpe Ratio"], "Beta": b, "Alpha": a*100})
+if tab_open(tab3):
+    with tab3, TRACE.span("tab.rr"):
+        import plotly.express as px
+        import plotly.graph_objects as go
+        risk, reg, corr = memo("metrics", live_metrics)
+        st.markdown(f"### ⚖️ {t('chart_rr')}")
+        df_r = pd.DataFrame({"Return": risk["Ann. Return"]*100, "Vol": risk["Volatility"]*100, "Sharpe": risk["Sharpe Ratio"],
+                             "Beta": reg["Beta"], "Alpha": reg["Alpha"]*100})
+        df_r.index.name = "Ticker"
     
-    if r_data:
-        df_r = pd.DataFrame(r_data).set_index("Ticker")
-        c1, c2 = st.columns([2, 1])
-        with c1:
-            fig = chart_layout(px.scatter(df_r, x="Vol", y="Return", color=df_r.index, size=[25]*len(df_r), text=df_r.index), title="Positioning", x_title=f"{t('metric_vol')} (%)", y_title=f"{t('metric_ret')} (%)")
-            st.plotly_chart(fig, use_container_width=True)
-        with c2:
-            st.markdown("##### 🏆 Ranking")
-            # Removed styling to fix import error
-            st.dataframe(df_r[["Sharpe", "Alpha", "Beta"]], use_container_width=True)
-    interpret(t("interp_rr"))
+        if not df_r.empty:
+            c1, c2 = st.columns([2, 1])
+            with c1:
+                fig = chart_layout(px.scatter(df_r, x="Vol", y="Return", color=df_r.index, size=[25]*len(df_r), text=df_r.index), title="Positioning", x_title=f"{t('metric_vol')} (%)", y_title=f"{t('metric_ret')} (%)")
+                opt = None
+                if len(sel_funds) > 1:
+                    # Đường biên hiệu quả + Min Variance / Max Sharpe / Risk Parity, ghi nhớ theo (mã, khung thời gian, phiên bản dữ liệu)
+                    shrink = st.radio("Shrinkage", optimizer.SHRINK, horizontal=True, key="opt_shrink")
+                    opt = memo("optimizer", lambda: optimizer.optimize(daily_ret, shrink), shrink)
+                    ef, ports = opt["frontier"], opt["portfolios"]
+                    # Còn dưới 2 quỹ đủ phiên (khung thời gian ngắn / quỹ mới): không có đường biên để vẽ
+                    if not ports.empty:
+                        fig.add_trace(go.Scatter(x=ef["Vol"] * 100, y=ef["Return"] * 100, mode="lines", name=t("opt_frontier"), line=dict(color="#004D40", width=2)))
+                        fig.add_trace(go.Scatter(x=ports["Vol"] * 100, y=ports["Return"] * 100, text=ports.index, mode="markers+text", textposition="top center",
+                                                 marker=dict(color="#D32F2F", size=14, symbol="star"), name=t("opt_portfolios")))
+                plot(fig)
+            with c2:
+                st.markdown("##### 🏆 Ranking")
+                # Removed styling to fix import error
+                st.dataframe(df_r[["Sharpe", "Alpha", "Beta"]], use_container_width=True)
+            if opt is not None:
+                st.markdown(f"##### 🧮 {t('opt_portfolios')}")
+                if ports.empty:
+                    st.info(t("opt_short").format(n=optimizer.MIN_FUNDS, obs=optimizer.MIN_OBS))
+                else:
+                    st.dataframe(ports.drop(columns="Sharpe").mul(100).round(1).assign(Sharpe=ports["Sharpe"].round(2))[ports.columns].T, use_container_width=True)
+                if opt["info"]["dropped"]: st.caption(f"⚠️ < {optimizer.MIN_OBS} sessions: {', '.join(opt['info']['dropped'])}")
+        interpret(t("interp_rr"))
 
 # --- TAB 4 ---
-with tab4:
-    tf = st.selectbox(f"{t('select_ticker')}:", sel_funds, key="trend")
-    td = df_view[[tf]].copy()
-    td['MA50'], td['MA200'] = td[tf].rolling(50).mean(), td[tf].rolling(200).mean()
-    fig = go.Figure()
-    fig.add_trace(go.Scatter(x=td.index, y=td[tf], name="Price", line=dict(color='#263238', width=1.5)))
-    fig.add_trace(go.Scatter(x=td.index, y=td['MA50'], name="MA50", line=dict(color='#FBC02D')))
-    fig.add_trace(go.Scatter(x=td.index, y=td['MA200'], name="MA200", line=dict(color='#D32F2F')))
-    st.plotly_chart(chart_layout(fig, title=f"{t('chart_trend')}: {tf}"), use_container_width=True)
-    interpret(t("interp_trend"))
+if tab_open(tab4):
+    with tab4, TRACE.span("tab.trend"):
+        import plotly.graph_objects as go
+        tf = st.selectbox(f"{t('select_ticker')}:", sel_funds, key="trend")
+        def trend_frame():
+            td = df_view[[tf]].copy()
+            # MA tính sẵn trên toàn bộ lịch sử (rolling.py), chỉ tính trực tiếp khi cache cũ
+            cached = [rolling.lookup(roll_cache, k, [tf], store.version, start_d, end_d) for k in ("MA50", "MA200")]
+            TRACE.count("rolling.miss" if any(c is None for c in cached) else "rolling.hit")
+            if any(c is None for c in cached):
+                td['MA50'], td['MA200'] = td[tf].rolling(50).mean(), td[tf].rolling(200).mean()
+            else:
+                td['MA50'], td['MA200'] = [c[tf].reindex(td.index) for c in cached]
+            return td
+        td = memo("trend", lambda: downsample(trend_frame(), 'lttb'), tf)
+        fig = go.Figure()
+        fig.add_trace(go.Scatter(x=td.index, y=td[tf], name="Price", line=dict(color='#263238', width=1.5)))
+        fig.add_trace(go.Scatter(x=td.index, y=td['MA50'], name="MA50", line=dict(color='#FBC02D')))
+        fig.add_trace(go.Scatter(x=td.index, y=td['MA200'], name="MA200", line=dict(color='#D32F2F')))
+        plot(chart_layout(fig, title=f"{t('chart_trend')}: {tf}"))
+        interpret(t("interp_trend"))
 
 # --- TAB 5 ---
-with tab5:
-    st.markdown(f"### 🔗 {t('chart_corr')}")
-    st.plotly_chart(chart_layout(px.imshow(daily_ret.corr(), text_auto=".2f", color_continuous_scale='RdBu', zmin=-1, zmax=1)), use_container_width=True)
-    interpret(t("interp_corr"))
+if tab_open(tab5):
+    with tab5, TRACE.span("tab.corr"):
+        import plotly.express as px
+        st.markdown(f"### 🔗 {t('chart_corr')}")
+        c_mode = st.radio("Mode", ["Pearson", "Rolling 63", "EW (63)"], horizontal=True, key="corr_mode", label_visibility="collapsed")
+        if c_mode == "Pearson": corr = memo("metrics", live_metrics)[2]
+        elif c_mode == "Rolling 63": corr = memo("corr_rolling", lambda: correlation.pairwise_corr(daily_ret.tail(63)))
+        else: corr = memo("corr_ew", lambda: correlation.ewm_corr(daily_ret, 63))
+        # Sắp theo phân cụm để các nhóm quỹ tương quan cao nằm cạnh nhau
+        corr = memo("corr_order", lambda: correlation.reorder(corr), c_mode)
+        plot(chart_layout(px.imshow(corr, text_auto=".2f", color_continuous_scale='RdBu', zmin=-1, zmax=1)))
+        interpret(t("interp_corr"))
 
 # --- TAB 6 ---
-with tab6:
-    c_a, c_b = st.columns(2)
-    with c_a:
-        st.markdown(f"##### 🎯 {t('chart_te')}")
-        te_df = pd.DataFrame({f: calculate_tracking_error(daily_ret[f], bench_ret) for f in sel_funds if f != bench_ticker})
-        if not te_df.empty: st.plotly_chart(chart_layout(px.line(te_df), y_title="TE (%)"), use_container_width=True)
-    with c_b:
-        st.markdown(f"##### 💰 {t('chart_vol')}")
-        if df_vol is not None:
-            v_cols = [c for c in sel_funds if c in df_vol.columns]
+if tab_open(tab6):
+    with tab6, TRACE.span("tab.struct"):
+        import plotly.express as px
+        import plotly.graph_objects as go
+        c_a, c_b = st.columns(2)
+        with c_a:
+            st.markdown(f"##### 🎯 {t('chart_te')}")
+            # Mỗi ETF so với chỉ số tham chiếu riêng (cột Benchmark); bảng tính sẵn theo phiên bản dữ liệu (tracking.py)
+            TRACE.count("tracking.miss" if trk_cache is None or trk_cache['version'] != store.version else "tracking.hit")
+            if trk_cache is None or trk_cache['version'] != store.version:
+                trk_cache = MEMO.get(("tracking", store.version), lambda: TRACE.call("tracking", tracking.build_tracking, store, df_profile))
+            te_funds = [f for f in sel_funds if f in trk_cache['funds']]
+            if te_funds:
+                trk_kind = st.radio("Tracking", tracking.ROLLING_OUTPUTS, horizontal=True, key="trk_kind", label_visibility="collapsed",
+                                    format_func=lambda k: f"TE {tracking.ROLL_WINDOW}D (%)" if k == "TE" else f"{k} {tracking.ROLL_WINDOW}D")
+                trk_table = memo("tracking_table", lambda: tracking.table(trk_cache, t_range, te_funds))
+                def tracking_roll():
+                    # Chuỗi trượt cập nhật tiến dần trong cache thống kê trượt (rolling.py), chỉ tính lại toàn bộ khi cache cũ
+                    te = tracking.rolling_table(roll_cache, trk_kind, te_funds, store.version, start_d, end_d)
+                    TRACE.count("rolling.miss" if te is None else "rolling.hit")
+                    if te is None:
+                        roll = MEMO.get(("rolling", store.version), lambda: TRACE.call(
+                            "rolling", rolling.build, store, tracking.benchmark_pairs(store.tickers, df_profile)))
+                        te = tracking.rolling_table(roll, trk_kind, te_funds, store.version, start_d, end_d)
+                    return te
+                te_df = memo("tracking_roll", lambda: downsample(tracking_roll(), 'lttb', column_width(2)), trk_kind)
+                fig = px.line(te_df.rename(columns=lambda f: f"{f} vs {trk_table.loc[f, 'Used']}"))
+                plot(chart_layout(fig, y_title="TE (%)" if trk_kind == "TE" else trk_kind))
+                st.dataframe(trk_table.drop(columns="Missing").round(2), use_container_width=True)
+                miss = trk_table[trk_table["Missing"]]
+                if not miss.empty:
+                    st.warning(t("trk_missing") + ", ".join(f"{f} ({b} → {u})" for f, (b, u) in miss[["Benchmark", "Used"]].iterrows()))
+        with c_b:
+            st.markdown(f"##### 💰 {t('chart_vol')}")
+            v_cols = [c for c in sel_funds if c in store]
             if v_cols:
                 vf = st.selectbox(f"{t('select_ticker')}:", v_cols, key="v")
-                st.plotly_chart(chart_layout(go.Figure(go.Bar(x=df_vol.index, y=df_vol.loc[start_d:end_d, vf], marker_color='#00897B')), title=f"Volume: {vf}"), use_container_width=True)
-    interpret(t("interp_struct"))
+                # Bucket D/W/M tính sẵn theo phiên bản dữ liệu (volume.py); độ phân giải theo khoảng thời gian đã chọn
+                TRACE.count("volume.miss" if vol_cache is None or vol_cache['version'] != store.version else "volume.hit")
+                if vol_cache is None or vol_cache['version'] != store.version:
+                    vol_cache = MEMO.get(("volume_buckets", store.version), lambda: TRACE.call("volume_buckets", volume.build_volume, store))
+                res, vb = memo("volume", lambda: volume.bars(vol_cache, vf, start_d, end_d), vf)
+                if vf in vol_cache['liquidity'].index:
+                    st.metric("Liquidity Score", f"{vol_cache['liquidity'].loc[vf, 'Liquidity Score']:.0f}/100")
+                fig = go.Figure(go.Bar(x=vb.index, y=vb['Volume'], customdata=vb['Value'], marker_color='#00897B',
+                                       hovertemplate="%{y:,.0f}<br>Value: %{customdata:,.0f}<extra></extra>"))
+                plot(chart_layout(fig, title=f"Volume ({res}): {vf}"))
+        interpret(t("interp_struct"))
 
 # --- TAB 7 ---
-with tab7:
-    st.markdown(f"### 🔄 {t('chart_bb')}")
-    bb_list = []
-    for f in sel_funds:
-        bu, be = calculate_bull_bear_stats(daily_ret[f], bench_ret)
-        bb_list.append({"Asset": f, "Bull": bu, "Bear": be})
-    bb = pd.DataFrame(bb_list).set_index("Asset")
-    fig = go.Figure()
-    fig.add_trace(go.Bar(x=bb.index, y=bb['Bull'], name="Bull (Up)", marker_color='#4CAF50'))
-    fig.add_trace(go.Bar(x=bb.index, y=bb['Bear'], name="Bear (Down)", marker_color='#EF5350'))
-    st.plotly_chart(chart_layout(fig, title=f"vs {bench_ticker}"), use_container_width=True)
-    interpret(t("interp_cycle"))
+if tab_open(tab7):
+    with tab7, TRACE.span("tab.cycle"):
+        import plotly.graph_objects as go
+        risk, reg, corr = memo("metrics", live_metrics)
+        st.markdown(f"### 🔄 {t('chart_bb')}")
+        bb = reg[["Bull", "Bear"]]
+        fig = go.Figure()
+        fig.add_trace(go.Bar(x=bb.index, y=bb['Bull'], name="Bull (Up)", marker_color='#4CAF50'))
+        fig.add_trace(go.Bar(x=bb.index, y=bb['Bear'], name="Bear (Down)", marker_color='#EF5350'))
+        plot(chart_layout(fig, title=f"vs {bench_ticker}"))
+        interpret(t("interp_cycle"))
 
 # --- TAB 8 ---
-with tab8:
-    st.markdown(f"### 🔮 {t('chart_forecast')}")
-    f_fund = st.selectbox(f"{t('select_ticker')}:", sel_funds, key="forecast")
-    train_data = df[f_fund].last('2Y')
+if tab_open(tab8):
+    with tab8, TRACE.span("tab.forecast"):
+        import plotly.graph_objects as go
+        st.markdown(f"### 🔮 {t('chart_forecast')}")
+        f_fund = st.selectbox(f"{t('select_ticker')}:", sel_funds, key="forecast")
+        # Dự báo chỉ phụ thuộc vào mã và dữ liệu, không phụ thuộc lựa chọn khác
+        fc_key = (f_fund, end_d, store.version)
+        train_data = MEMO.get(("train",) + fc_key, lambda: TRACE.call("train", forecast.train_window, store, f_fund, end_d))
     
-    c1, c2 = st.columns([2, 1])
-    with c1:
-        st.markdown("#### ETS Forecast (30 Days/Tage/Ngày)")
-        days = 30
-        try:
-            fc = run_ets_forecast(train_data, days)
-            last_date = train_data.index[-1]
-            dates = [last_date + timedelta(days=i) for i in range(1, days+1)]
-            vol = train_data.pct_change().std() * np.sqrt(days)
-            upper, lower = fc * (1 + vol), fc * (1 - vol)
+        c1, c2 = st.columns([2, 1])
+        with c1:
+            st.markdown("#### ETS Forecast (30 Days/Tage/Ngày)")
+            days = 30
+            try:
+                fc = forecast.lookup(ets_cache, f_fund, store.version, end_d, days)
+                TRACE.count("forecast.miss" if fc is None else "forecast.hit")
+                if fc is None: fc = MEMO.get(("ets", days) + fc_key, lambda: TRACE.call("ets", run_ets_forecast, train_data, days))
+                last_date = train_data.index[-1]
+                dates = [last_date + timedelta(days=i) for i in range(1, days+1)]
+                vol = train_data.pct_change().std() * np.sqrt(days)
+                upper, lower = fc * (1 + vol), fc * (1 - vol)
             
-            fig = go.Figure()
-            fig.add_trace(go.Scatter(x=train_data.last('3M').index, y=train_data.last('3M'), name="History", line=dict(color='black')))
-            fig.add_trace(go.Scatter(x=dates, y=fc, name="Forecast", line=dict(color='#00897B', dash='dash')))
-            fig.add_trace(go.Scatter(x=dates+dates[::-1], y=pd.concat([upper, lower[::-1]]), fill='toself', fillcolor='rgba(0,137,123,0.2)', line=dict(color='rgba(0,0,0,0)'), name="Confidence"))
-            st.plotly_chart(chart_layout(fig, title=f"Forecast: {f_fund}"), use_container_width=True)
-        except Exception as e: st.error(f"Error: {e}")
+                fig = go.Figure()
+                hist = train_data[train_data.index > last_date - pd.DateOffset(months=3)]
+                fig.add_trace(go.Scatter(x=hist.index, y=hist, name="History", line=dict(color='black')))
+                fig.add_trace(go.Scatter(x=dates, y=fc, name="Forecast", line=dict(color='#00897B', dash='dash')))
+                fig.add_trace(go.Scatter(x=dates+dates[::-1], y=pd.concat([upper, lower[::-1]]), fill='toself', fillcolor='rgba(0,137,123,0.2)', line=dict(color='rgba(0,0,0,0)'), name="Confidence"))
+                plot(chart_layout(fig, title=f"Forecast: {f_fund}"))
+            except Exception as e: st.error(f"Error: {e}")
         
-    with c2:
-        st.markdown("#### Monte Carlo Prob.")
-        paths, prob, exp, worst, best = run_monte_carlo(train_data)
-        st.metric(t("prob_up"), f"{prob:.1f}%", delta=f"{prob-50:.1f}%")
-        st.write(f"**Median:** {exp:,.0f}")
-        st.write(f"**{t('worst')} (5%):** :red[{worst:,.0f}]")
-        st.write(f"**{t('best')} (5%):** :green[{best:,.0f}]")
+        with c2:
+            st.markdown("#### Monte Carlo Prob.")
+            n_paths = st.select_slider("Paths", options=[1_000, 10_000, 100_000], value=10_000, key="mc_paths")
+            bands, prob, exp, worst, best = MEMO.get(("monte_carlo", n_paths) + fc_key, lambda: TRACE.call("monte_carlo", run_monte_carlo, train_data, simulations=n_paths))
+            if bands.empty:
+                st.info(t("mc_short"))
+            else:
+                st.metric(t("prob_up"), f"{prob:.1f}%", delta=f"{prob-50:.1f}%")
+                st.write(f"**Median:** {exp:,.0f}")
+                st.write(f"**{t('worst')} (5%):** :red[{worst:,.0f}]")
+                st.write(f"**{t('best')} (5%):** :green[{best:,.0f}]")
         
-        fig = go.Figure()
-        for i in range(50): fig.add_trace(go.Scatter(y=paths[:, i], line=dict(color='gray', width=0.5), opacity=0.3, showlegend=False))
-        fig.add_trace(go.Scatter(y=np.median(paths, axis=1), line=dict(color='red', width=2), name="Median"))
-        fig.update_layout(template="plotly_white", height=200, margin=dict(l=0,r=0,t=0,b=0), xaxis=dict(visible=False), yaxis=dict(visible=False))
-        st.plotly_chart(fig, use_container_width=True)
-    interpret(t("interp_forecast"))
\ No newline at end of file
+                fig = go.Figure()
+                # Fan chart: dải 5-95% và 25-75% quanh trung vị
+                for lo, hi, alpha in [("5%", "95%", 0.15), ("25%", "75%", 0.3)]:
+                    fig.add_trace(go.Scatter(x=list(bands.index) + list(bands.index[::-1]), y=list(bands[hi]) + list(bands[lo][::-1]),
+                                             fill='toself', fillcolor=f'rgba(128,128,128,{alpha})', line=dict(color='rgba(0,0,0,0)'), showlegend=False))
+                fig.add_trace(go.Scatter(x=bands.index, y=bands["50%"], line=dict(color='red', width=2), name="Median"))
+                fig.update_layout(template="plotly_white", height=200, margin=dict(l=0,r=0,t=0,b=0), xaxis=dict(visible=False), yaxis=dict(visible=False))
+                plot(fig)
+        interpret(t("interp_forecast"))
+
+# --- TAB 9 ---
+BT_CLOUD = 2000   # Số danh mục ngẫu nhiên chạy cùng lúc (một phép nhân ma trận mỗi kỳ tái cân bằng)
+BT_LABELS = ["Portfolio", "Equal"]   # Nhãn cố định trong memo (không phụ thuộc ngôn ngữ), dịch khi hiển thị
+if tab_open(tab9):
+    with tab9, TRACE.span("tab.backtest"):
+        import plotly.express as px
+        import plotly.graph_objects as go
+        st.markdown(f"### 🧪 {t('chart_backtest')}")
+        st.caption(t("bt_weights"))
+        w_cols = st.columns(len(sel_funds))
+        weights = tuple(w_cols[i].number_input(f, min_value=0.0, max_value=100.0, value=round(100 / len(sel_funds), 1), step=5.0, key=f"bt_w_{f}")
+                        for i, f in enumerate(sel_funds))
+        c1, c2, c3 = st.columns(3)
+        reb = c1.selectbox(t("bt_rebalance"), [None] + list(backtest.FREQS), index=1, key="bt_reb", format_func=lambda k: t("bt_none") if k is None else k)
+        dca = c2.number_input(t("bt_dca"), min_value=0.0, value=0.0, step=10.0, key="bt_dca")
+        use_fees = c3.checkbox(t("bt_fees"), value=True, key="bt_fees")
+        bt_opts = (reb, dca, use_fees)
+        bt_kw = dict(rebalance=reb, contribution=dca, contribution_freq='M')
+        fees = backtest.fee_vector(sel_funds, df_profile) if use_fees else None
+
+        def run_backtest():
+            value, ret, table = backtest.backtest(df_view, [weights, [1] * len(sel_funds)], BT_LABELS, bench_ret, fees=fees, **bt_kw)
+            b_value, b_ret, b_table = backtest.backtest(df_sel[[bench_ticker]], [[1]], [bench_ticker], bench_ret, **bt_kw)
+            return value.join(b_value), ret.join(b_ret), pd.concat([table, b_table])
+
+        if sum(weights) <= 0:
+            st.warning(t("bt_weights"))
+        else:
+            value, ret, table = memo("backtest", run_backtest, weights, bt_opts)
+            bt_names = dict(zip(BT_LABELS, [t("bt_portfolio"), t("bt_equal")]))
+            c_a, c_b = st.columns([2, 1])
+            with c_a:
+                value_plot = memo("backtest_plot", lambda: downsample(value, 'lttb', column_width([2, 1])), weights, bt_opts)
+                fig = chart_layout(px.line(value_plot.rename(columns=bt_names), height=420), y_title="Value")
+                plot(fig)
+            with c_b:
+                dd = memo("backtest_dd", lambda: downsample(calculate_drawdown(pd.DataFrame(backtest.nav(ret.to_numpy()), index=ret.index, columns=ret.columns)) * 100, 'minmax', column_width([2, 1], 1)),
+                          weights, bt_opts)
+                plot(chart_layout(px.area(dd.rename(columns=bt_names), height=420), y_title="Drawdown (%)"))
+            table = table.rename(index=bt_names)
+            st.dataframe(table[backtest.VALUE_COLUMNS + ["Ann. Return", "Volatility", "Max Drawdown", "Sharpe Ratio", "Beta", "Alpha"]], use_container_width=True)
+            if len(sel_funds) > 1:
+                st.markdown(f"##### 🎲 {t('chart_cloud')}")
+                cloud = memo("backtest_cloud", lambda: backtest.run_batch(df_view, backtest.random_weights(BT_CLOUD, len(sel_funds), seed=0), fees=fees, **bt_kw), bt_opts)
+                fig = px.scatter(x=cloud["Volatility"] * 100, y=cloud["Ann. Return"] * 100, color=cloud["Sharpe Ratio"], opacity=0.5,
+                                 color_continuous_scale="Viridis", labels={"color": "Sharpe"})
+                mine = table.iloc[:2]
+                fig.add_trace(go.Scatter(x=mine["Volatility"] * 100, y=mine["Ann. Return"] * 100, text=mine.index, mode="markers+text",
+                                         textposition="top center", marker=dict(color="#D32F2F", size=14, symbol="star"), showlegend=False))
+                plot(chart_layout(fig, x_title=f"{t('metric_vol')} (%)", y_title=f"{t('metric_ret')} (%)"))
+        interpret(t("interp_backtest"))
+# ==========================================
+# 6. DIAGNOSTICS (ẩn: mở bằng ?diag=1 hoặc khi đặt FUNDS_TRACE)
+# ==========================================
+DIAG_HISTORY = 50
+run_summary = TRACE.finish({"preset": t_range, "tickers": len(sel_funds)})
+diag_runs = st.session_state.setdefault("diag_runs", [])
+diag_runs.append(run_summary)
+del diag_runs[:-DIAG_HISTORY]
+
+if st.query_params.get("diag") == "1" or instrument.MODES - {"off"}:
+    with st.sidebar.expander("🩺 Diagnostics", expanded=True):
+        st.caption(f"Rerun: **{run_summary['seconds'] * 1000:.0f} ms** · run `{run_summary['run']}`")
+        st.dataframe(pd.DataFrame(TRACE.stages()).set_index("Stage").round(1), use_container_width=True)
+        m = MEMO.stats()
+        c1, c2 = st.columns(2)
+        c1.metric("Memo hit rate", f"{m['hit_rate']:.0%}", help=f"{m['hits']} hit / {m['misses']} miss / {m['evictions']} evicted")
+        c2.metric("Memo size", f"{m['bytes'] / 2**20:.1f} MB", help=f"{m['items']} items")
+        if run_summary["counters"]:
+            st.write(" · ".join(f"{k}: **{v}**" for k, v in sorted(run_summary["counters"].items())))
+        mem = [f"RSS peak {run_summary['peak_rss_mb']:.0f} MB"] if run_summary["peak_rss_mb"] else []
+        if run_summary["peak_mb"] is not None:
+            mem.append(f"tracemalloc peak {run_summary['peak_mb']:.1f} MB")
+        st.caption(" · ".join(mem) or "FUNDS_TRACE=memory để đo bộ nhớ")
+        secs = [r["seconds"] * 1000 for r in diag_runs]
+        st.caption(f"Phiên này: {len(secs)} rerun, p50 {np.percentile(secs, 50):.0f} ms, max {max(secs):.0f} ms")
+        if TRACE.profile_text:
+            st.code(TRACE.profile_text, language=None)
@@ -0,0 +1,192 @@
+import argparse
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+import snapshot
+import storage
+from cube import BENCH, PRESETS, preset_start
+from metrics import RISK_COLUMNS, REGRESSION_COLUMNS, TRADING_DAYS, regression_matrix, risk_metrics_matrix
+
+# Backtest danh mục ETF: P vector tỷ trọng chạy cùng lúc, mỗi đoạn giữa hai lần tái cân bằng / nạp tiền
+# là một phép nhân ma trận (phiên x mã) @ (mã x danh mục), không lặp Python theo ngày hay theo danh mục.
+FREQS = {'M': 'Tháng', 'Q': 'Quý', 'Y': 'Năm'}   # Kỳ tái cân bằng / nạp tiền (pandas Period)
+INITIAL = 100.0
+CHUNK = 2000   # Số danh mục mỗi lượt trong run_batch (giới hạn bộ nhớ ma trận phiên x danh mục)
+VALUE_COLUMNS = ["Final Value", "Invested", "Total Return"]
+BACKTEST_COLUMNS = VALUE_COLUMNS + RISK_COLUMNS + REGRESSION_COLUMNS
+
+
+def period_ends(index, freq):
+    """Vị trí phiên cuối của mỗi kỳ (M / Q / Y) trong index, không tính phiên cuối của cả chuỗi"""
+    if freq is None or len(index) < 2:
+        return np.array([], dtype=int)
+    keys = pd.DatetimeIndex(index).to_period(freq).asi8
+    return np.flatnonzero(keys[1:] != keys[:-1])
+
+
+def fee_vector(tickers, df_profile):
+    """Phí quản lý năm (%) theo cột Fee của funds_profile.csv; mã không có phí (chỉ số) = 0"""
+    if df_profile is None or 'Fee' not in df_profile:
+        return np.zeros(len(tickers))
+    return df_profile['Fee'].reindex(list(tickers)).fillna(0.0).to_numpy(dtype=np.float64)
+
+
+def price_matrix(prices, fees=None):
+    """Ma trận giá (phiên x mã) sạch cho mô phỏng.
+
+    Trước ngày niêm yết giá được giữ bằng giá đầu tiên (phần tỷ trọng đó đứng yên như tiền mặt);
+    fees (% năm) được trừ dần mỗi phiên như phí quản lý quỹ.
+    """
+    X = prices.ffill().bfill().to_numpy(dtype=np.float64)
+    X[:, np.isnan(X).all(axis=0)] = 1.0
+    if fees is not None:
+        daily = np.asarray(fees, dtype=np.float64) / 100 / TRADING_DAYS
+        X = X * (1.0 - daily) ** np.arange(len(X))[:, None]
+    return X
+
+
+def normalize(weights, n):
+    W = np.atleast_2d(np.asarray(weights, dtype=np.float64))
+    if W.shape[1] != n:
+        raise ValueError(f"weights phải có {n} cột (một cột mỗi mã), nhận {W.shape[1]}")
+    total = W.sum(axis=1, keepdims=True)
+    if (total <= 0).any():
+        raise ValueError("Mỗi danh mục phải có tổng tỷ trọng dương")
+    return W / total
+
+
+def simulate(prices, weights, rebalance='M', contribution=0.0, contribution_freq='M', fees=None, initial=INITIAL):
+    """Giá trị tài sản của P danh mục qua từng phiên.
+
+    prices: DataFrame (phiên x N mã). weights: mảng (P x N), mỗi dòng được chuẩn hóa về tổng 1.
+    rebalance: 'M' / 'Q' / 'Y' / None (mua và giữ). contribution: tiền nạp thêm (DCA) cuối mỗi kỳ
+    contribution_freq, mua theo tỷ trọng mục tiêu. fees: phí năm (%) từng mã.
+    Trả về (value: mảng phiên x P, flows: tiền nạp theo phiên).
+    """
+    X = price_matrix(prices, fees)
+    W = normalize(weights, X.shape[1])
+    T = len(X)
+    reb = set(period_ends(prices.index, rebalance).tolist())
+    dca = set(period_ends(prices.index, contribution_freq).tolist()) if contribution else set()
+    flows = np.zeros(T)
+    flows[sorted(dca)] = contribution
+    value = np.empty((T, len(W)))
+    if not T:
+        return value, flows
+
+    H = initial * W   # Giá trị đang nắm giữ theo từng mã (P x N) tại đầu đoạn
+    start = 0
+    for end in sorted(reb | dca) + [T - 1]:
+        G = X[start:end + 1] / X[start]        # Tăng trưởng từng mã trong đoạn
+        value[start:end + 1] = G @ H.T
+        if end == T - 1:
+            break
+        H = H * G[-1]
+        if end in reb:
+            H = H.sum(axis=1, keepdims=True) * W
+        if end in dca:
+            H = H + contribution * W
+        value[end] = H.sum(axis=1)   # Giá trị cuối phiên đã gồm tiền nạp
+        start = end
+    return value, flows
+
+
+def twr_returns(value, flows):
+    """Lợi nhuận ngày theo thời gian (loại bỏ dòng tiền nạp), dòng đầu NaN như pct_change"""
+    R = np.full(value.shape, np.nan)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        R[1:] = (value[1:] - flows[1:, None]) / value[:-1] - 1
+    return R
+
+
+def nav(returns):
+    """Chỉ số tài sản bắt đầu từ 1 theo lợi nhuận TWR (dùng cho Drawdown)"""
+    return np.cumprod(1.0 + np.nan_to_num(returns), axis=0)
+
+
+def summarize(value, flows, returns, index, labels, bench_ret=None, initial=INITIAL):
+    """Bảng danh mục x chỉ số: giá trị cuối, tiền đã bỏ vào, Risk (metrics.py) và Regression nếu có benchmark"""
+    invested = initial + flows.sum()
+    table = pd.DataFrame({"Final Value": value[-1], "Invested": invested, "Total Return": value[-1] / invested - 1},
+                         index=labels)
+    table = table.join(pd.DataFrame(risk_metrics_matrix(returns), index=labels)[RISK_COLUMNS])
+    if bench_ret is not None:
+        table = table.join(regression_matrix(pd.DataFrame(returns, index=index, columns=labels), bench_ret))
+    return table
+
+
+def backtest(prices, weights, labels=None, bench_ret=None, **kwargs):
+    """Một hoặc vài danh mục: (giá trị theo phiên, lợi nhuận TWR theo phiên, bảng chỉ số) dạng DataFrame"""
+    value, flows = simulate(prices, weights, **kwargs)
+    labels = list(labels) if labels is not None else [f"P{i}" for i in range(value.shape[1])]
+    returns = twr_returns(value, flows)
+    table = summarize(value, flows, returns, prices.index, labels, bench_ret, kwargs.get('initial', INITIAL))
+    return (pd.DataFrame(value, index=prices.index, columns=labels),
+            pd.DataFrame(returns, index=prices.index, columns=labels), table)
+
+
+def run_batch(prices, weights, bench_ret=None, chunk=CHUNK, **kwargs):
+    """Bảng chỉ số cho hàng nghìn danh mục (từng lượt `chunk` danh mục để giới hạn bộ nhớ)"""
+    W = np.atleast_2d(np.asarray(weights, dtype=np.float64))
+    tables = []
+    for lo in range(0, len(W), chunk):
+        value, flows = simulate(prices, W[lo:lo + chunk], **kwargs)
+        labels = pd.RangeIndex(lo, lo + len(value[0]), name='Portfolio')
+        tables.append(summarize(value, flows, twr_returns(value, flows), prices.index, labels, bench_ret,
+                                kwargs.get('initial', INITIAL)))
+    return pd.concat(tables)
+
+
+def random_weights(n_portfolios, n_assets, seed=None):
+    """Tỷ trọng ngẫu nhiên phân bố đều trên simplex (Dirichlet(1, ..., 1))"""
+    return np.random.default_rng(seed).dirichlet(np.ones(n_assets), n_portfolios)
+
+
+def preset_batch(store, tickers, weights, presets=PRESETS, bench=BENCH, **kwargs):
+    """Chạy run_batch trên mọi khung thời gian; trả về DataFrame MultiIndex (Preset, Portfolio)"""
+    end_d, first_d = store.last_date(), store.first_date()
+    bench = bench if bench in store else None
+    cols = list(dict.fromkeys(list(tickers) + ([bench] if bench else [])))
+    prices = store.wide(cols)
+    out = {}
+    for preset in presets:
+        window = prices.loc[preset_start(preset, end_d, first_d):end_d]
+        bench_ret = window[bench].pct_change() if bench else None
+        out[preset] = run_batch(window[list(tickers)], weights, bench_ret, **kwargs)
+    return pd.concat(out, names=['Preset', 'Portfolio'])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Backtest hàng loạt danh mục ETF trên mọi khung thời gian")
+    parser.add_argument('weights', help="CSV tỷ trọng: mỗi dòng một danh mục, mỗi cột một mã")
+    parser.add_argument('--out', default=os.path.join('reports', 'backtest.csv'))
+    parser.add_argument('--rebalance', choices=list(FREQS) + ['none'], default='M')
+    parser.add_argument('--dca', type=float, default=0.0, help="Tiền nạp thêm mỗi kỳ --dca-freq")
+    parser.add_argument('--dca-freq', choices=list(FREQS), default='M')
+    parser.add_argument('--no-fees', action='store_true', help="Không trừ phí quản lý (cột Fee)")
+    parser.add_argument('--presets', nargs='+', choices=PRESETS, default=PRESETS)
+    parser.add_argument('--bench', default=BENCH)
+    args = parser.parse_args()
+
+    store = storage.open_store(snapshot.resolve('ticks'))
+    if store is None:
+        parser.error("Chưa có dữ liệu, hãy chạy update_data.py trước")
+    df_w = pd.read_csv(args.weights)
+    missing = [c for c in df_w.columns if c not in store]
+    if missing:
+        parser.error(f"Mã không có dữ liệu: {', '.join(missing)}")
+    profile_path = snapshot.resolve('profile')
+    df_profile = pd.read_csv(profile_path, index_col='Ticker') if os.path.exists(profile_path) else None
+    t0 = time.perf_counter()
+    table = preset_batch(store, list(df_w.columns), df_w.to_numpy(), args.presets, args.bench,
+                         rebalance=None if args.rebalance == 'none' else args.rebalance,
+                         contribution=args.dca, contribution_freq=args.dca_freq,
+                         fees=None if args.no_fees else fee_vector(df_w.columns, df_profile))
+    seconds = time.perf_counter() - t0
+    os.makedirs(os.path.dirname(args.out) or '.', exist_ok=True)
+    table.to_csv(args.out)
+    n = len(df_w) * len(args.presets)
+    print(f"💾 Đã backtest {len(df_w)} danh mục x {len(args.presets)} preset ({seconds:.2f}s, {n / seconds:,.0f} danh mục/s) -> {args.out}")
@@ -0,0 +1,72 @@
+"""Tốc độ backtest danh mục (danh mục/giây): vòng lặp từng danh mục từng phiên vs engine ma trận của backtest.py.
+
+Chạy: python -m benchmarks.bench_backtest [--portfolios 1 100 1000 10000] [--tickers 20]
+"""
+import argparse
+import time
+
+import numpy as np
+
+import backtest
+from benchmarks.synthetic import make_universe
+
+
+def loop_backtest(prices, weights, rebalance, contribution, contribution_freq, fees):
+    """Cách làm thông thường: mỗi danh mục một vòng lặp theo phiên, giữ số chứng chỉ quỹ nắm giữ"""
+    X = backtest.price_matrix(prices, fees)
+    W = backtest.normalize(weights, X.shape[1])
+    reb = set(backtest.period_ends(prices.index, rebalance).tolist())
+    dca = set(backtest.period_ends(prices.index, contribution_freq).tolist()) if contribution else set()
+    out = np.empty((len(X), len(W)))
+    for p, w in enumerate(W):
+        units = backtest.INITIAL * w / X[0]
+        for t in range(len(X)):
+            total = units @ X[t]
+            if t in reb:
+                units = total * w / X[t]
+            if t in dca:
+                units = units + contribution * w / X[t]
+                total += contribution
+            out[t, p] = total
+    return out
+
+
+def best_of(fn, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        out = fn()
+        best = min(best, time.perf_counter() - t0)
+    return best, out
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--portfolios', type=int, nargs='+', default=[1, 100, 1000, 10000])
+    parser.add_argument('--tickers', type=int, default=20)
+    parser.add_argument('--years', type=float, default=12)
+    parser.add_argument('--rebalance', default='M')
+    parser.add_argument('--dca', type=float, default=5.0)
+    parser.add_argument('--loop-max', type=int, default=100, help="Số danh mục tối đa chạy bằng vòng lặp (chậm)")
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    df_close, _ = make_universe(n_tickers=args.tickers, years=args.years)
+    fees = np.full(args.tickers, 0.65)
+    kwargs = dict(rebalance=args.rebalance, contribution=args.dca, contribution_freq='M', fees=fees)
+    print(f"{len(df_close)} phiên x {args.tickers} mã, rebalance={args.rebalance}, DCA={args.dca}")
+    print(f"{'Portf.':>7} {'loop/s':>10} {'matrix/s':>12} {'batch/s':>12} {'speedup':>8} {'max |diff|':>11}")
+    for n in args.portfolios:
+        W = backtest.random_weights(n, args.tickers, seed=n)
+        t_vec, (value, _) = best_of(lambda: backtest.simulate(df_close, W, **kwargs), args.repeat)
+        t_batch, _ = best_of(lambda: backtest.run_batch(df_close, W, df_close.iloc[:, 0].pct_change(), **kwargs), args.repeat)
+        k = min(n, args.loop_max)
+        t_loop, ref = best_of(lambda: loop_backtest(df_close, W[:k], **kwargs), 1)
+        diff = np.max(np.abs(value[:, :k] - ref) / ref)
+        print(f"{n:>7} {k / t_loop:>10,.0f} {n / t_vec:>12,.0f} {n / t_batch:>12,.0f} "
+              f"{(t_loop / k) / (t_vec / n):>7.0f}x {diff:>11.2e}")
+    print("matrix = chỉ mô phỏng giá trị; batch = mô phỏng + Risk/Regression metrics (run_batch)")
+
+
+if __name__ == "__main__":
+    main()
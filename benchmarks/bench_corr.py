@@ -0,0 +1,72 @@
+"""Tương quan: pandas DataFrame.corr() vs engine tổng tích chéo (correlation.py), cập nhật tiến dần
+một phiên cho mọi preset (cube.preset_correlations) vs tính lại, rolling / EW và thứ tự phân cụm.
+
+Chạy: python -m benchmarks.bench_corr [--tickers 50 500] [--years 12]
+"""
+import argparse
+import sys
+import time
+
+import numpy as np
+
+import correlation
+from benchmarks.synthetic import make_universe
+from cube import PRESETS, preset_correlations
+from metrics import calculate_returns
+from storage import TickStore
+
+
+def timed(fn):
+    t0 = time.perf_counter()
+    out = fn()
+    return time.perf_counter() - t0, out
+
+
+def max_diff(a, b):
+    a, b = np.asarray(a, dtype=np.float64), np.asarray(b, dtype=np.float64)
+    same_nan = bool((np.isnan(a) == np.isnan(b)).all())
+    both = ~np.isnan(a) & ~np.isnan(b)
+    return (np.abs(a[both] - b[both]).max() if both.any() else 0.0), same_nan
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--tickers', type=int, nargs='+', default=[50, 500])
+    parser.add_argument('--years', type=float, default=12)
+    parser.add_argument('--days', type=int, default=1, help="Số phiên mới khi cập nhật tiến dần")
+    parser.add_argument('--tol', type=float, default=1e-9)
+    args = parser.parse_args()
+
+    correlation.cluster_order(np.eye(3) * 0.5 + 0.5)   # import scipy trước khi đo
+    ok = True
+    for n in args.tickers:
+        # full_history=False: các quỹ ra mắt lệch ngày nhau -> nhiều NaN đầu chuỗi
+        df_close, df_vol = make_universe(n, years=args.years, seed=n, full_history=False)
+        ret = calculate_returns(df_close.astype(np.float64))
+        print(f"🔗 {n} mã x {len(ret)} phiên")
+
+        t_pd, ref = timed(ret.corr)
+        t_mm, got = timed(lambda: correlation.pairwise_corr(ret))
+        diff, same_nan = max_diff(got, ref)
+        ok &= same_nan and diff <= args.tol
+        print(f"   pandas corr {t_pd * 1000:8.1f} ms | tổng tích chéo {t_mm * 1000:8.1f} ms | max |diff| {diff:.1e}, NaN khớp: {same_nan}")
+
+        full = TickStore.from_wide(df_close, df_vol)
+        head = TickStore.from_wide(df_close.iloc[:-args.days], df_vol.iloc[:-args.days])
+        _, state = preset_correlations(head)
+        t_inc, (inc, _) = timed(lambda: preset_correlations(full, state))
+        t_all, (rebuilt, _) = timed(lambda: preset_correlations(full))
+        diff, same_nan = max_diff(inc, rebuilt)
+        ok &= same_nan and diff <= args.tol
+        print(f"   {len(PRESETS)} preset: +{args.days} phiên tiến dần {t_inc * 1000:8.1f} ms | tính lại {t_all * 1000:8.1f} ms "
+              f"| max |diff| {diff:.1e}")
+
+        t_roll, _ = timed(lambda: correlation.rolling_corr(ret.iloc[-252:], 63))
+        t_ew, _ = timed(lambda: correlation.ewm_corr(ret, 63))
+        t_cl, order = timed(lambda: correlation.cluster_order(ref))
+        print(f"   rolling 63 (252 lần push) {t_roll * 1000:8.1f} ms | EW {t_ew * 1000:8.1f} ms | phân cụm {t_cl * 1000:8.1f} ms")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
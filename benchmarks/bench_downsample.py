@@ -0,0 +1,40 @@
+"""Số điểm / dung lượng JSON Plotly trước và sau khi rút gọn (LTTB cho đường, min/max cho drawdown),
+kèm kiểm tra đỉnh và đáy drawdown được giữ nguyên.
+
+Chạy: python -m benchmarks.bench_downsample [--funds 3 10 30] [--years 12] [--width 1000]
+"""
+import argparse
+import time
+
+import plotly.express as px
+
+from benchmarks.synthetic import make_universe
+from downsample import FULL_WIDTH, downsample
+from metrics import calculate_drawdown
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--funds', type=int, nargs='+', default=[3, 10, 30])
+    parser.add_argument('--years', type=float, default=12)
+    parser.add_argument('--width', type=int, default=FULL_WIDTH, help='Bề rộng chart (px)')
+    args = parser.parse_args()
+
+    print(f"{'Funds':>5} {'Chart':>9} {'rows':>6} {'-> rows':>8} {'JSON KB':>9} {'-> KB':>8} {'ms':>7} {'extremes':>9}")
+    for n in args.funds:
+        df_close, _ = make_universe(n, years=args.years, seed=n, full_history=False)
+        norm = (df_close / df_close.bfill().iloc[0] - 1) * 100
+        dd = calculate_drawdown(df_close) * 100
+        for name, frame, method, plot in [('line', norm, 'lttb', px.line), ('drawdown', dd, 'minmax', px.area)]:
+            t0 = time.perf_counter()
+            small = downsample(frame, method, args.width)
+            ms = (time.perf_counter() - t0) * 1000
+            kb_full = len(plot(frame).to_json()) / 1024
+            kb_small = len(plot(small).to_json()) / 1024
+            # LTTB giữ hình dạng chứ không cam kết giữ cực trị, chỉ kiểm tra với min/max
+            kept = str(bool((small.min() == frame.min()).all() and (small.max() == frame.max()).all())) if method == 'minmax' else '-'
+            print(f"{n:>5} {name:>9} {len(frame):>6} {len(small):>8} {kb_full:>9.0f} {kb_small:>8.0f} {ms:>7.1f} {kept:>9}")
+
+
+if __name__ == '__main__':
+    main()
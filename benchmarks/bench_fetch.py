@@ -0,0 +1,51 @@
+"""So sánh tải tuần tự (kiểu cũ) với engine song song trên server giả lập.
+
+Chạy: python -m benchmarks.bench_fetch
+"""
+import argparse
+import time
+
+import requests
+
+import fetcher
+from benchmarks.standin_server import StandinServer
+from update_data import MASTER_DATA, START_TIMESTAMP
+
+
+def serial_baseline(url, symbols, end_ts):
+    for s in symbols:
+        r = requests.get(url, params={'resolution': 'D', 'symbol': s, 'from': START_TIMESTAMP, 'to': end_ts},
+                         headers=fetcher.HEADERS, timeout=20)
+        fetcher.parse_dchart(r.json())
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--latency', type=float, default=0.2)
+    parser.add_argument('--workers', type=int, default=fetcher.MAX_WORKERS)
+    parser.add_argument('--rate', type=float, default=fetcher.RATE_PER_SEC)
+    parser.add_argument('--fail-first', type=int, default=1, help="Số lỗi 503 đầu tiên mỗi mã (test retry)")
+    args = parser.parse_args()
+
+    symbols = [m['Ticker'] for m in MASTER_DATA]
+    end_ts = int(time.time())
+
+    with StandinServer(latency=args.latency) as srv:
+        t0 = time.perf_counter()
+        serial_baseline(srv.url, symbols, end_ts)
+        t_serial = time.perf_counter() - t0
+
+    with StandinServer(latency=args.latency, fail_first=args.fail_first) as srv:
+        t0 = time.perf_counter()
+        frames, stats = fetcher.fetch_all(symbols, START_TIMESTAMP, end_ts, workers=args.workers,
+                                          rate=args.rate, backoff=0.05, base_url=srv.url)
+        t_pool = time.perf_counter() - t0
+
+    print(stats.round(3).to_string())
+    print(f"\nTuần tự (không sleep): {t_serial:.2f}s | Kiểu cũ ước tính (+1s/mã): {t_serial + len(symbols):.2f}s")
+    print(f"Engine song song ({args.workers} luồng, {args.rate}/s, lỗi 503 đầu tiên={args.fail_first}): {t_pool:.2f}s")
+    print(f"Thành công: {sum(not df.empty for df in frames.values())}/{len(symbols)}")
+
+
+if __name__ == "__main__":
+    main()
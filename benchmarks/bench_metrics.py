@@ -0,0 +1,76 @@
+"""Tốc độ tính Risk Metrics và Beta/Alpha/Bull-Bear: vòng lặp từng quỹ (cách cũ trong app.py)
+vs engine ma trận của metrics.py.
+
+Chạy: python -m benchmarks.bench_metrics [--sizes 20 200 2000]
+"""
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+import metrics
+from benchmarks.synthetic import make_universe
+
+
+def legacy_risk_metrics(daily_ret, risk_free_rate=0.0):
+    """Bản per-Series cũ của app.py (giữ lại để so sánh tốc độ và kết quả)"""
+    ann_ret = daily_ret.mean() * metrics.TRADING_DAYS
+    ann_vol = daily_ret.std() * np.sqrt(metrics.TRADING_DAYS)
+    neg_ret = daily_ret[daily_ret < 0]
+    downside_dev = neg_ret.std() * np.sqrt(metrics.TRADING_DAYS)
+    sharpe = (ann_ret - risk_free_rate) / ann_vol if ann_vol != 0 else 0
+    sortino = (ann_ret - risk_free_rate) / downside_dev if downside_dev != 0 else 0
+    cum_ret = (1 + daily_ret).cumprod()
+    max_dd = ((cum_ret - cum_ret.cummax()) / cum_ret.cummax()).min()
+    calmar = ann_ret / abs(max_dd) if max_dd != 0 else 0
+    return pd.Series({"Ann. Return": ann_ret, "Volatility": ann_vol, "Max Drawdown": max_dd,
+                      "Sharpe Ratio": sharpe, "Sortino Ratio": sortino, "Calmar Ratio": calmar})
+
+
+def legacy_beta_bull_bear(asset_ret, bench_ret):
+    """Bản cũ: concat + dropna + np.cov cho từng quỹ"""
+    df = pd.concat([asset_ret.rename("A"), bench_ret.rename("B")], axis=1).dropna()
+    cov = np.cov(df["A"], df["B"])[0][1]
+    var = np.var(df["B"], ddof=1)
+    beta = cov / var if var != 0 else 0
+    alpha = (df["A"].mean() - beta * df["B"].mean()) * metrics.TRADING_DAYS
+    bull = df[df["B"] > 0]["A"].mean() * metrics.TRADING_DAYS * 100
+    bear = df[df["B"] < 0]["A"].mean() * metrics.TRADING_DAYS * 100
+    return pd.Series({"Beta": beta, "Alpha": alpha, "Bull": bull, "Bear": bear})
+
+
+def best_of(fn, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        out = fn()
+        best = min(best, time.perf_counter() - t0)
+    return best, out
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', type=int, nargs='+', default=[20, 200, 2000])
+    parser.add_argument('--years', type=float, default=12)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'Funds':>6} {'loop ms':>10} {'matrix ms':>10} {'speedup':>8} {'max |diff|':>11}")
+    for n in args.sizes:
+        df_close, _ = make_universe(n_tickers=n, years=args.years)
+        daily_ret = df_close.pct_change(fill_method=None)
+        t_loop, ref = best_of(lambda: pd.DataFrame({f: legacy_risk_metrics(daily_ret[f]) for f in daily_ret}).T, args.repeat)
+        t_vec, new = best_of(lambda: metrics.calculate_risk_metrics(daily_ret), args.repeat)
+        diff = np.nanmax(np.abs(new[ref.columns].to_numpy() - ref.to_numpy(dtype=float)))
+        print(f"{n:>6} {t_loop * 1000:>10.1f} {t_vec * 1000:>10.1f} {t_loop / t_vec:>7.1f}x {diff:>11.2e}  risk")
+
+        bench = daily_ret.iloc[:, 0]
+        t_loop, ref = best_of(lambda: pd.DataFrame({f: legacy_beta_bull_bear(daily_ret[f], bench) for f in daily_ret}).T, args.repeat)
+        t_vec, new = best_of(lambda: metrics.regression_matrix(daily_ret, bench), args.repeat)
+        diff = np.nanmax(np.abs(new[ref.columns].to_numpy() - ref.to_numpy(dtype=float)))
+        print(f"{n:>6} {t_loop * 1000:>10.1f} {t_vec * 1000:>10.1f} {t_loop / t_vec:>7.1f}x {diff:>11.2e}  beta/bull-bear")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""Tốc độ và bộ nhớ Monte Carlo: vòng lặp theo ngày với toàn bộ ma trận đường (cách cũ trong app.py)
+vs engine vector hóa theo lô của simulation.py.
+
+Chạy: python -m benchmarks.bench_montecarlo [--paths 1000 10000 100000 1000000]
+"""
+import argparse
+import time
+import tracemalloc
+
+import numpy as np
+
+import simulation
+from benchmarks.synthetic import make_universe
+
+
+def legacy_monte_carlo(price_series, days=30, simulations=1000):
+    """Bản cũ của app.py (giữ lại để so sánh)"""
+    returns = price_series.pct_change().dropna()
+    last_price = price_series.iloc[-1]
+    daily_returns = np.random.normal(returns.mean(), returns.std(), (days, simulations))
+    price_paths = np.zeros_like(daily_returns)
+    price_paths[0] = last_price
+    for t in range(1, days):
+        price_paths[t] = price_paths[t-1] * (1 + daily_returns[t])
+    final_prices = price_paths[-1]
+    return price_paths, np.mean(final_prices > last_price) * 100, np.median(final_prices)
+
+
+def measure(fn):
+    """(giây, đỉnh bộ nhớ MB)"""
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    fn()
+    seconds = time.perf_counter() - t0
+    peak = tracemalloc.get_traced_memory()[1] / 1e6
+    tracemalloc.stop()
+    return seconds, peak
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--paths', type=int, nargs='+', default=[1_000, 10_000, 100_000, 1_000_000])
+    parser.add_argument('--days', type=int, default=30)
+    parser.add_argument('--method', choices=simulation.METHODS, default='gbm')
+    parser.add_argument('--legacy-max', type=int, default=1_000_000, help='Bỏ qua bản cũ khi số đường lớn hơn')
+    args = parser.parse_args()
+
+    df_close, _ = make_universe(1, years=2, seed=7)
+    prices = df_close.iloc[:, 0]
+
+    # Cùng seed -> cùng kết quả
+    a = simulation.monte_carlo(prices, args.days, 5_000, args.method, seed=1)['bands']
+    b = simulation.monte_carlo(prices, args.days, 5_000, args.method, seed=1)['bands']
+    print(f"🎲 Tái lập với seed: {'OK' if a.equals(b) else 'KHÁC'}")
+
+    print(f"{'Paths':>10} {'loop s':>8} {'loop MB':>9} {'engine s':>9} {'engine MB':>10} {'paths/s':>12}")
+    for n in args.paths:
+        if n <= args.legacy_max:
+            old_s, old_mb = measure(lambda: legacy_monte_carlo(prices, args.days, n))
+        else:
+            old_s = old_mb = float('nan')
+        new_s, new_mb = measure(lambda: simulation.monte_carlo(prices, args.days, n, args.method, antithetic=True, seed=42))
+        print(f"{n:>10,} {old_s:>8.3f} {old_mb:>9.1f} {new_s:>9.3f} {new_mb:>10.1f} {n / new_s:>12,.0f}")
+
+
+if __name__ == '__main__':
+    main()
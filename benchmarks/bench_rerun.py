@@ -0,0 +1,79 @@
+"""p95 độ trễ một lần rerun dashboard: có metric cube vs tính trực tiếp.
+
+Dữ liệu thật (funds_data.csv) được chuyển sang TickStore trong thư mục tạm; mỗi chế độ chạy
+trong một tiến trình riêng. Đo cả rerun đầy đủ qua streamlit AppTest lẫn riêng phần tính toán.
+Chạy: python -m benchmarks.bench_rerun [--runs 35]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def child(runs, use_cube):
+    import cube
+    import storage
+    from metrics import calculate_returns, calculate_risk_metrics, regression_matrix
+
+    store = storage.open_store()
+    metric_cube = cube.load_cube() if use_cube else None
+    sel, bench = ['VNINDEX', 'E1VFVN30', 'FUEVFVND'], 'VNINDEX'
+    end_d = store.last_date()
+
+    # 1. Riêng phần tính toán của app (sau khi đã có store)
+    compute = []
+    for i in range(runs):
+        preset = cube.PRESETS[i % len(cube.PRESETS)]
+        t0 = time.perf_counter()
+        df_sel = store.wide(sel, cube.preset_start(preset, end_d, store.first_date()), end_d)
+        daily_ret = calculate_returns(df_sel[sel])
+        if cube.lookup(metric_cube, preset, sel, store.version, bench) is None:
+            calculate_risk_metrics(daily_ret), regression_matrix(daily_ret, daily_ret[bench]), daily_ret.corr()
+        compute.append(time.perf_counter() - t0)
+
+    # 2. Rerun đầy đủ qua AppTest (đổi preset mỗi lần)
+    from streamlit.testing.v1 import AppTest
+    at = AppTest.from_file(os.path.join(ROOT, 'app.py'), default_timeout=120)
+    at.run()
+    full = []
+    for i in range(runs):
+        t0 = time.perf_counter()
+        t_range = [s for s in at.select_slider if list(s.options) == cube.PRESETS][0]
+        t_range.set_value(cube.PRESETS[i % len(cube.PRESETS)]).run()
+        full.append(time.perf_counter() - t0)
+    print(json.dumps({'compute': compute, 'full': full}))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--runs', type=int, default=35)
+    parser.add_argument('--child', choices=['cube', 'live'])
+    args = parser.parse_args()
+    if args.child:
+        child(args.runs, args.child == 'cube')
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ, FUNDS_DATA_DIR=tmp)
+        prep = ("import storage, cube, update_data;"
+                "s = update_data.open_tick_store(); cube.refresh(s)")
+        subprocess.run([sys.executable, '-c', prep], cwd=ROOT, env=env, check=True, capture_output=True)
+        print(f"{'Mode':>6} {'compute p50 ms':>15} {'compute p95 ms':>15} {'rerun p50 ms':>13} {'rerun p95 ms':>13}")
+        for mode in ['live', 'cube']:
+            out = subprocess.run([sys.executable, '-m', 'benchmarks.bench_rerun', '--child', mode, '--runs', str(args.runs)],
+                                 cwd=ROOT, env=env, check=True, capture_output=True, text=True)
+            res = json.loads(out.stdout.strip().splitlines()[-1])
+            c, f = np.array(res['compute']) * 1000, np.array(res['full']) * 1000
+            print(f"{mode:>6} {np.percentile(c, 50):>15.2f} {np.percentile(c, 95):>15.2f} "
+                  f"{np.percentile(f, 50):>13.1f} {np.percentile(f, 95):>13.1f}")
+
+
+if __name__ == "__main__":
+    main()
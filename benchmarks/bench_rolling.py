@@ -0,0 +1,93 @@
+"""Thống kê trượt: kiểm tra tương đương số học của rolling.py với pandas, và so thời gian
+cập nhật tiến dần một phiên (trạng thái checkpoint) với tính lại toàn bộ lịch sử.
+
+Chạy: python -m benchmarks.bench_rolling [--tickers 20 200] [--tol 1e-9]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+import metrics
+import rolling
+import storage
+from benchmarks.synthetic import make_universe
+
+
+def max_rel_diff(a, b):
+    """(sai số tương đối lớn nhất, vị trí NaN có khớp không)"""
+    a, b = np.asarray(a, dtype=np.float64), np.asarray(b, dtype=np.float64)
+    same_nan = bool((np.isnan(a) == np.isnan(b)).all())
+    both = ~np.isnan(a) & ~np.isnan(b)
+    diff = np.abs(a[both] - b[both]) / np.maximum(1.0, np.abs(b[both]))
+    return (diff.max() if diff.size else 0.0), same_nan
+
+
+def check_equivalence(df_close, tol):
+    """So từng hàm của rolling.py với bản pandas tương ứng"""
+    px = df_close.astype(np.float64)
+    ret = px.pct_change()
+    bench = ret.iloc[:, 0]
+    cases = {
+        'MA50': (rolling.rolling_mean(px, 50), px.rolling(50).mean()),
+        'MA200': (rolling.rolling_mean(px, 200), px.rolling(200).mean()),
+        'Std63': (rolling.rolling_std(ret, 63), ret.rolling(63).std()),
+        'TE': (rolling.tracking_error(ret, bench), ret.sub(bench, axis=0).rolling(63).std() * np.sqrt(metrics.TRADING_DAYS) * 100),
+        'Beta': (rolling.rolling_beta(ret, bench),
+                 pd.DataFrame({c: metrics.calculate_rolling_beta(ret[c], bench) for c in ret})),
+    }
+    ok = True
+    for name, (got, ref) in cases.items():
+        diff, same_nan = max_rel_diff(got, ref)
+        passed = same_nan and diff <= tol
+        ok &= passed
+        print(f"   {'✅' if passed else '❌'} {name:<6} max rel diff {diff:.2e}, NaN khớp: {same_nan}")
+    return ok
+
+
+def check_incremental(df_close, df_vol, days, tol):
+    """Dựng cache trên lịch sử thiếu `days` phiên cuối, rồi cập nhật tiến dần; so với dựng lại toàn bộ"""
+    pairs = {t: df_close.columns[0] for t in df_close.columns[1:]}   # Mọi quỹ so với mã đầu tiên
+    full = storage.TickStore.from_wide(df_close, df_vol)
+    head = storage.TickStore.from_wide(df_close.iloc[:-days], df_vol.iloc[:-days])
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'rolling.npz')
+        rolling.save_rolling(rolling.build(head, pairs), path)
+        t0 = time.perf_counter()
+        inc = rolling.refresh(full, path=path)
+        t_inc = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    ref = rolling.build(full, pairs)
+    t_full = time.perf_counter() - t0
+    ok = True
+    for k in rolling.OUTPUTS + rolling.PAIR_OUTPUTS:
+        diff, same_nan = max_rel_diff(inc[k], ref[k])
+        ok &= same_nan and diff <= tol
+    print(f"   {'✅' if ok else '❌'} +{days} phiên: tiến dần {t_inc * 1000:.1f} ms (gồm đọc/ghi checkpoint) "
+          f"vs tính lại {t_full * 1000:.1f} ms")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--tickers', type=int, nargs='+', default=[20, 200])
+    parser.add_argument('--years', type=float, default=12)
+    parser.add_argument('--tol', type=float, default=1e-9)
+    args = parser.parse_args()
+
+    ok = True
+    for n in args.tickers:
+        df_close, df_vol = make_universe(n, years=args.years, seed=n)
+        print(f"📐 {n} mã x {len(df_close)} phiên")
+        ok &= check_equivalence(df_close, args.tol)
+        ok &= check_incremental(df_close, df_vol, 1, args.tol)
+        ok &= check_incremental(df_close, df_vol, 5, args.tol)
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+"""Khởi động nguội của dashboard: thời gian import từng module (python -X importtime)
+và thời gian tới lúc vẽ tiêu đề / biểu đồ đầu tiên / xong lượt chạy đầu, chỉ tab đang mở (lazy)
+so với vẽ cả 8 tab (như Streamlit cũ không hỗ trợ tab lazy).
+
+Mỗi phép đo chạy trong một tiến trình mới để cache import không ảnh hưởng.
+Chạy: python -m benchmarks.bench_startup [--repeat 3]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MODULES = ['numpy', 'pandas', 'streamlit', 'plotly.graph_objects', 'plotly.express', 'statsmodels.tsa.holtwinters',
+           'storage', 'metrics', 'cube', 'memo', 'simulation', 'forecast', 'rolling', 'volume', 'downsample']
+
+
+def import_time(module):
+    """Thời gian import tích lũy (ms) của module trong một tiến trình mới"""
+    out = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                         cwd=ROOT, capture_output=True, text=True)
+    if out.returncode != 0:
+        return float('nan')
+    cumulative = 0
+    for line in out.stderr.splitlines():
+        parts = line.split('|')
+        if len(parts) == 3 and parts[2].strip() == module:
+            cumulative = int(parts[1])
+    return cumulative / 1000
+
+
+def child(eager):
+    t_start = time.perf_counter()
+    import streamlit as st
+    from streamlit.testing.v1 import AppTest
+    marks = {'import': time.perf_counter() - t_start}
+
+    def mark(name, fn):
+        def wrapper(*args, **kwargs):
+            marks.setdefault(name, time.perf_counter() - t_start)
+            return fn(*args, **kwargs)
+        return wrapper
+
+    st.title = mark('title', st.title)
+    st.plotly_chart = mark('first_chart', st.plotly_chart)
+    if eager:
+        # Giả lập Streamlit không có tab lazy: mọi tab đều được tính và vẽ
+        tabs = st.tabs
+        st.tabs = lambda labels, **kwargs: tabs(labels)
+    at = AppTest.from_file(os.path.join(ROOT, 'app.py'), default_timeout=300)
+    at.run()
+    marks['done'] = time.perf_counter() - t_start
+    marks['charts'] = len(at.get('plotly_chart'))
+    marks['heavy'] = sorted(m for m in ('statsmodels', 'plotly.express') if m in sys.modules)
+    print(json.dumps(marks))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--child', choices=['lazy', 'eager'])
+    args = parser.parse_args()
+    if args.child:
+        child(args.child == 'eager')
+        return
+
+    print("⏱️ Import (ms, tích lũy, tiến trình mới)")
+    for module in MODULES:
+        print(f"   {module:<30} {np.median([import_time(module) for _ in range(args.repeat)]):>8.1f}")
+
+    print(f"\n{'Mode':>6} {'import s':>9} {'title s':>8} {'1st chart s':>12} {'done s':>7} {'charts':>7}  heavy modules loaded")
+    for mode in ['eager', 'lazy']:
+        runs = []
+        for _ in range(args.repeat):
+            out = subprocess.run([sys.executable, '-m', 'benchmarks.bench_startup', '--child', mode],
+                                 cwd=ROOT, check=True, capture_output=True, text=True)
+            runs.append(json.loads(out.stdout.strip().splitlines()[-1]))
+        med = {k: np.median([r.get(k, np.nan) for r in runs]) for k in ('import', 'title', 'first_chart', 'done')}
+        print(f"{mode:>6} {med['import']:>9.2f} {med['title']:>8.2f} {med['first_chart']:>12.2f} {med['done']:>7.2f} "
+              f"{runs[-1]['charts']:>7}  {', '.join(runs[-1]['heavy']) or '-'}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,64 @@
+"""Benchmark cold-load & RSS: CSV (parse_dates) vs NumPy memory-map (vs Parquet nếu có pyarrow).
+
+Mỗi phép đo chạy trong một tiến trình Python mới để đo đúng cold load.
+Chạy: python -m benchmarks.bench_storage [--sizes 20 200 2000]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+import storage
+from benchmarks.synthetic import make_universe
+
+CHILD = r"""
+import json, sys, time
+def rss_kb():
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith('VmRSS'):
+                return int(line.split()[1])
+import storage
+backend, data_dir = sys.argv[1], sys.argv[2]
+before = rss_kb()
+t0 = time.perf_counter()
+tables = storage.BACKENDS[backend][1](data_dir)
+df = tables['close']
+# Truy cập như app: ngày cuối, dòng cuối và một lát cắt 1 năm của 3 cột
+df.index.max(); df.iloc[-1].sum(); df.iloc[-252:, :3].mean()
+elapsed = time.perf_counter() - t0
+print(json.dumps({'seconds': elapsed, 'rss_mb': (rss_kb() - before) / 1024}))
+"""
+
+
+def measure(backend, data_dir, repeat):
+    runs = []
+    for _ in range(repeat):
+        out = subprocess.run([sys.executable, '-c', CHILD, backend, data_dir], capture_output=True, text=True,
+                             cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))), check=True)
+        runs.append(json.loads(out.stdout))
+    return min(r['seconds'] for r in runs), min(r['rss_mb'] for r in runs)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', type=int, nargs='+', default=[20, 200, 2000])
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    backends = ['csv', 'npy'] + (['parquet'] if storage.HAS_ARROW else [])
+    print(f"{'Tickers':>8} {'Backend':>8} {'Disk MB':>8} {'Load ms':>9} {'RSS MB':>8}")
+    for n in args.sizes:
+        df_close, df_vol = make_universe(n_tickers=n)
+        for backend in backends:
+            with tempfile.TemporaryDirectory() as tmp:
+                storage.BACKENDS[backend][0]({'close': df_close, 'volume': df_vol.astype('int64')}, tmp)
+                disk = sum(os.path.getsize(os.path.join(tmp, f)) for f in os.listdir(tmp)) / 1e6
+                sec, rss = measure(backend, tmp, args.repeat)
+            print(f"{n:>8} {backend:>8} {disk:>8.2f} {sec * 1000:>9.1f} {rss:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
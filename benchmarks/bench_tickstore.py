@@ -0,0 +1,54 @@
+"""Chi phí materialise bảng wide từ TickStore theo lựa chọn, so với đọc cả ma trận wide.
+
+Chạy: python -m benchmarks.bench_tickstore [--universe 20 200 2000]
+"""
+import argparse
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+import storage
+from benchmarks.synthetic import make_universe
+
+
+def timeit(fn, repeat=5):
+    best = float('inf')
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        out = fn()
+        best = min(best, time.perf_counter() - t0)
+    return best, out
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--universe', type=int, nargs='+', default=[20, 200, 2000])
+    args = parser.parse_args()
+
+    print(f"{'Universe':>8} {'Select':>6} {'Range':>5} {'wide ms':>8} {'MB':>7} {'full-matrix ms':>15} {'MB':>7}")
+    for n in args.universe:
+        df_close, df_vol = make_universe(n_tickers=n)
+        with tempfile.TemporaryDirectory() as tmp:
+            store = storage.TickStore(tmp)
+            for ticker in df_close.columns:
+                store.write(ticker, storage._to_records(pd.DataFrame({'Close': df_close[ticker], 'Volume': df_vol[ticker]})))
+            store.save_manifest(list(df_close.columns))
+            storage.BACKENDS['npy'][0]({'close': df_close, 'volume': df_vol.astype('int64')}, tmp)
+
+            end = store.last_date()
+            for k, years in [(3, 1), (10, 5)]:
+                sel = list(df_close.columns[-k:])
+                start = end - pd.DateOffset(years=years)
+                fresh = storage.TickStore(tmp)
+                t_wide, view = timeit(lambda: fresh.wide(sel, start, end))
+                # Cách cũ: nạp cả ma trận wide (float64 như read_csv) rồi cắt
+                t_full, full = timeit(lambda: pd.DataFrame(np.load(f"{tmp}/close.npy").astype('f8'),
+                                                           index=df_close.index, columns=df_close.columns).loc[start:end, sel])
+                print(f"{n:>8} {k:>6} {years:>4}Y {t_wide * 1000:>8.2f} {view.memory_usage().sum() / 1e6:>7.3f} "
+                      f"{t_full * 1000:>15.2f} {df_close.memory_usage().sum() / 1e6:>7.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""Server HTTP giả lập dchart-api, trả về JSON {t, c, v} để test/benchmark mà không cần mạng"""
+import json
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+
+DAY = 86400
+
+
+def synthetic_history(symbol, start_ts, end_ts):
+    """Chuỗi giá ngày làm việc, cố định theo symbol (seed = crc32 của mã)"""
+    rng = np.random.default_rng(zlib.crc32(symbol.encode()))
+    start_ts = max(int(start_ts), 1388534400)
+    days = np.arange(start_ts // DAY, int(end_ts) // DAY + 1)
+    days = days[(days + 3) % 7 < 5]  # Bỏ thứ 7, chủ nhật (1970-01-01 là thứ 5)
+    # Giá sinh từ mốc 2014 để đoạn chồng lấn giữa các lần gọi luôn trùng nhau
+    origin = 1388534400 // DAY
+    all_days = np.arange(origin, int(end_ts) // DAY + 1)
+    all_days = all_days[(all_days + 3) % 7 < 5]
+    closes = 10 * np.exp(np.cumsum(rng.normal(0.0003, 0.012, len(all_days))))
+    vols = rng.integers(1_000, 500_000, len(all_days))
+    mask = np.isin(all_days, days)
+    return {
+        't': (all_days[mask] * DAY).tolist(),
+        'c': np.round(closes[mask], 2).tolist(),
+        'v': vols[mask].tolist(),
+        's': 'ok',
+    }
+
+
+class StandinServer:
+    """Chạy server trong một luồng nền. Dùng như context manager.
+
+    latency: giây trễ mỗi request; fail_first: số lần đầu mỗi mã trả về 503.
+    errors: {mã: mã HTTP} luôn trả về lỗi đó cho mã tương ứng (vd. 404 cho mã không tồn tại).
+    port: cố định cổng (0 = cổng ngẫu nhiên) để URL, và do đó khóa của HTTP cache, giữ nguyên giữa các lần chạy.
+    """
+
+    def __init__(self, latency=0.05, fail_first=0, histories=None, port=0, errors=None):
+        self.latency = latency
+        self.fail_first = fail_first
+        self.errors = errors or {}
+        self.histories = histories or {}
+        self.hits = {}
+        self.not_modified = 0   # Số lần trả 304 (request có If-None-Match khớp)
+        self.lock = threading.Lock()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                q = parse_qs(urlparse(self.path).query)
+                symbol = q.get('symbol', [''])[0]
+                with server.lock:
+                    server.hits[symbol] = server.hits.get(symbol, 0) + 1
+                    n = server.hits[symbol]
+                time.sleep(server.latency)
+                if n <= server.fail_first:
+                    self._send(503, b'{}')
+                    return
+                if symbol in server.errors:
+                    self._send(server.errors[symbol], b'{}')
+                    return
+                start_ts = int(q.get('from', [0])[0])
+                end_ts = int(q.get('to', [time.time()])[0])
+                if symbol in server.histories:
+                    data = server.histories[symbol](start_ts, end_ts)
+                else:
+                    data = synthetic_history(symbol, start_ts, end_ts)
+                body = json.dumps(data).encode()
+                etag = f'"{zlib.crc32(body):08x}"'
+                if self.headers.get('If-None-Match') == etag:
+                    with server.lock:
+                        server.not_modified += 1
+                    self._send(304, b'', etag)
+                    return
+                self._send(200, body, etag)
+
+            def _send(self, code, body, etag=None):
+                self.send_response(code)
+                if etag:
+                    self.send_header('ETag', etag)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', port), Handler)
+        self.url = f"http://127.0.0.1:{self.httpd.server_address[1]}/dchart/history"
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
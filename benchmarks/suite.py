@@ -0,0 +1,285 @@
+"""Bộ benchmark đầy đủ + kiểm tra hồi quy hiệu năng.
+
+Sinh vũ trụ quỹ giả lập (số mã x số năm, ngày ra mắt so le), đo mọi hàm phân tích, các đường
+đọc/ghi dữ liệu và một lần cập nhật + rerun dashboard đầu-cuối, rồi ghi kết quả ra JSON để so sánh
+giữa các lần chạy.
+
+Chạy:   python -m benchmarks.suite [--tickers 50 --years 12] [--out benchmarks/results/x.json]
+So sánh: python -m benchmarks.suite --baseline base.json [--threshold 0.25]   (exit 1 nếu chậm đi)
+        python -m benchmarks.suite --compare base.json new.json
+"""
+import argparse
+import json
+import os
+import platform
+import re
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+import backtest
+import correlation
+import cube
+import downsample
+import forecast
+import metrics
+import report
+import rolling
+import simulation
+import storage
+import tracking
+import validate
+import volume
+from benchmarks.synthetic import make_universe
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(ROOT, 'benchmarks', 'results')
+THRESHOLD = 0.25   # Chậm hơn baseline quá 25% (trung vị) thì tính là hồi quy
+MIN_DELTA = 0.002  # ... và chênh lệch tuyệt đối trên 2 ms (tránh nhiễu ở các case rất nhanh)
+
+
+def timeit(fn, repeat, warmup=1):
+    """Thời gian (giây) của fn(): trung vị, p95, min trên `repeat` lần sau `warmup` lần chạy nóng"""
+    for _ in range(warmup):
+        fn()
+    runs = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        runs.append(time.perf_counter() - t0)
+    runs = np.array(runs)
+    return {'median': float(np.median(runs)), 'p95': float(np.percentile(runs, 95)),
+            'min': float(runs.min()), 'runs': len(runs)}
+
+
+def synthetic_profile(tickers):
+    """Benchmark riêng: 5 mã đầu đóng vai chỉ số, mã cuối khai báo một chỉ số không có dữ liệu"""
+    return pd.DataFrame({'Benchmark': [None] * 5 + [tickers[i % 5] for i in range(5, len(tickers) - 1)] + ['MISSING']}, index=tickers)
+
+
+def analytics_cases(store):
+    """(tên, hàm, số lần lặp tối đa) cho từng hàm phân tích trên toàn bộ vũ trụ"""
+    tickers = store.tickers
+    bench = tickers[0]   # Mã đầu tiên có lịch sử đầy đủ (như VNINDEX)
+    prices = store.wide(tickers)
+    ret = metrics.calculate_returns(prices)
+    one = prices[bench]
+    recent = ret.tail(252)
+    corr = correlation.pairwise_corr(ret)
+    weights = backtest.random_weights(1000, len(tickers), seed=0)
+    profile = synthetic_profile(tickers)
+    pairs = tracking.benchmark_pairs(tickers, profile)
+    return [
+        ('metrics.calculate_returns', lambda: metrics.calculate_returns(prices), None),
+        ('metrics.calculate_cumulative_returns', lambda: metrics.calculate_cumulative_returns(prices), None),
+        ('metrics.calculate_drawdown', lambda: metrics.calculate_drawdown(prices), None),
+        ('metrics.calculate_max_drawdown', lambda: metrics.calculate_max_drawdown(prices), None),
+        ('metrics.calculate_risk_metrics', lambda: metrics.calculate_risk_metrics(ret), None),
+        ('metrics.regression_matrix', lambda: metrics.regression_matrix(ret, ret[bench]), None),
+        ('metrics.calculate_rolling_beta', lambda: metrics.calculate_rolling_beta(ret[tickers[1]], ret[bench]), None),
+        ('metrics.calculate_monthly_heatmap', lambda: metrics.calculate_monthly_heatmap(ret[bench]), None),
+        ('cube.window_metrics', lambda: cube.window_metrics(ret, ret[bench]), None),
+        ('cube.build_cube', lambda: cube.build_cube(store, bench), 3),
+        ('report.preset_report', lambda: report.preset_report('Max', prices, bench), 3),
+        ('correlation.pairwise_corr', lambda: correlation.pairwise_corr(ret), None),
+        ('correlation.rolling_corr', lambda: correlation.rolling_corr(recent, 63), None),
+        ('correlation.ewm_corr', lambda: correlation.ewm_corr(recent, 63), None),
+        ('correlation.cluster_order', lambda: correlation.cluster_order(corr), None),
+        ('rolling.build', lambda: rolling.build(store, pairs), 3),
+        ('rolling.tracking_error', lambda: rolling.tracking_error(ret, ret[bench]), None),
+        ('simulation.monte_carlo', lambda: simulation.monte_carlo(one, 30, 10_000, antithetic=True, seed=0), None),
+        ('downsample.lttb', lambda: downsample.downsample(prices, 'lttb'), None),
+        ('downsample.minmax', lambda: downsample.downsample(metrics.calculate_drawdown(prices), 'minmax'), None),
+        ('volume.build_volume', lambda: volume.build_volume(store), 3),
+        ('forecast.fit_one', lambda: forecast.fit_one(bench, forecast.train_window(store, bench)), 3),
+        ('tracking.build_tracking', lambda: tracking.build_tracking(store, profile), 3),
+        ('validate.validate', lambda: validate.validate(store, df_profile=profile), 3),
+        ('backtest.run_batch_1000', lambda: backtest.run_batch(prices, weights, ret[bench], contribution=10.0), 3),
+    ]
+
+
+def load_cases(store, df_close, df_vol, tmp):
+    """Đọc/ghi bảng wide theo từng backend, TickStore trên đĩa và các cache tính sẵn"""
+    cases = []
+    backends = ['csv', 'npy'] + (['parquet'] if storage.HAS_ARROW else [])
+    tables = {'close': df_close, 'volume': df_vol}
+    for backend in backends:
+        # Gọi thẳng hàm của backend: save_tables/load_tables dạng csv luôn dùng thư mục hiện tại
+        save_fn, load_fn = storage.BACKENDS[backend]
+        data_dir = os.path.join(tmp, backend)
+        os.makedirs(data_dir)
+        save = lambda f=save_fn, d=data_dir: f(tables, d)
+        save()
+        cases.append((f'storage.save[{backend}]', save, 3))
+        cases.append((f'storage.load[{backend}]', lambda f=load_fn, d=data_dir: f(d), None))
+
+    tick_dir = os.path.join(tmp, 'ticks')
+    disk = storage.TickStore(tick_dir)
+    for t in store.tickers:
+        disk.write(t, np.array(store.read(t)))
+    disk.save_manifest(store.tickers)
+    sel = store.tickers[:3]
+    cases += [
+        ('TickStore.open', lambda: storage.TickStore(tick_dir), None),
+        ('TickStore.wide[all]', lambda: storage.TickStore(tick_dir).wide(disk.tickers), None),
+        ('TickStore.wide[3 x 1Y]', lambda: disk.wide(sel, disk.last_date() - pd.DateOffset(years=1)), None),
+        ('TickStore.long', lambda: disk.long(), None),
+    ]
+
+    caches = [('cube', cube.build_cube(store), cube.save_cube, cube.load_cube),
+              ('rolling', rolling.build(store, tracking.benchmark_pairs(store.tickers, synthetic_profile(store.tickers))), rolling.save_rolling, rolling.load_rolling),
+              ('volume', volume.build_volume(store), volume.save_volume, volume.load_volume)]
+    for name, obj, save, load in caches:
+        path = os.path.join(tmp, f'{name}.npz')
+        save(obj, path)
+        cases.append((f'{name}.save', lambda o=obj, s=save, p=path: s(o, p), None))
+        cases.append((f'{name}.load', lambda l=load, p=path: l(p), None))
+    return cases
+
+
+E2E_CHILD = r"""
+import json, os, sys, time
+from benchmarks.standin_server import StandinServer
+root, runs = sys.argv[1], int(sys.argv[2])
+out = {}
+with StandinServer(latency=0.0) as srv:
+    os.environ['DCHART_API_URL'] = srv.url
+    import update_data
+    t0 = time.perf_counter(); update_data.update_csv(rate=1000); out['update.full'] = [time.perf_counter() - t0]
+    t0 = time.perf_counter(); update_data.update_csv(rate=1000); out['update.incremental'] = [time.perf_counter() - t0]
+import cube
+from streamlit.testing.v1 import AppTest
+at = AppTest.from_file(os.path.join(root, 'app.py'), default_timeout=300)
+t0 = time.perf_counter(); at.run(); out['app.cold_run'] = [time.perf_counter() - t0]
+assert not at.exception, at.exception
+out['app.rerun'] = []
+for i in range(runs):
+    t0 = time.perf_counter()
+    t_range = [s for s in at.select_slider if list(s.options) == cube.PRESETS][0]
+    t_range.set_value(cube.PRESETS[i % len(cube.PRESETS)]).run()
+    out['app.rerun'].append(time.perf_counter() - t0)
+print(json.dumps(out))
+"""
+
+
+def end_to_end(runs):
+    """Cập nhật đầy đủ + tăng dần qua server giả lập, rồi rerun dashboard; chạy trong tiến trình riêng
+    với thư mục làm việc tạm để không đụng tới dữ liệu / funds_profile.csv thật"""
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ, FUNDS_DATA_DIR=os.path.join(tmp, 'data'),
+                   PYTHONPATH=os.pathsep.join(filter(None, [ROOT, os.environ.get('PYTHONPATH')])))
+        out = subprocess.run([sys.executable, '-c', E2E_CHILD, ROOT, str(runs)], cwd=tmp, env=env,
+                             capture_output=True, text=True)
+    if out.returncode:
+        print(f"⚠️ Bỏ qua e2e: {out.stderr.strip().splitlines()[-1] if out.stderr.strip() else out.returncode}")
+        return {}
+    res = json.loads(out.stdout.strip().splitlines()[-1])
+    results = {}
+    for name, values in res.items():
+        v = np.array(values)
+        results[f'e2e.{name}'] = {'median': float(np.median(v)), 'p95': float(np.percentile(v, 95)),
+                                  'min': float(v.min()), 'runs': len(v)}
+    return results
+
+
+def environment():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                                text=True).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {'python': platform.python_version(), 'numpy': np.__version__, 'pandas': pd.__version__,
+            'platform': platform.platform(), 'cpus': os.cpu_count(), 'commit': commit}
+
+
+def run_suite(tickers=50, years=12, seed=0, repeat=7, only=None, e2e=True, e2e_runs=15):
+    """Chạy toàn bộ case, trả về dict kết quả (meta + results theo tên case)"""
+    df_close, df_vol = make_universe(n_tickers=tickers, years=years, seed=seed)
+    df_vol = df_vol.astype('int64')
+    store = storage.TickStore.from_wide(df_close, df_vol)
+    pattern = re.compile(only) if only else None
+    results = {}
+
+    def run(group, cases):
+        for name, fn, cap in cases:
+            key = f'{group}.{name}'
+            if pattern and not pattern.search(key):
+                continue
+            results[key] = timeit(fn, min(repeat, cap or repeat))
+            print(f"   {key:<48} {results[key]['median'] * 1000:>10.2f} ms")
+
+    print(f"🧪 Vũ trụ giả lập: {tickers} mã x {len(df_close)} phiên (seed={seed})")
+    run('analytics', analytics_cases(store))
+    with tempfile.TemporaryDirectory() as tmp:
+        run('load', load_cases(store, df_close, df_vol, tmp))
+    if e2e and (pattern is None or pattern.search('e2e')):
+        for key, res in end_to_end(e2e_runs).items():
+            results[key] = res
+            print(f"   {key:<48} {res['median'] * 1000:>10.2f} ms")
+
+    meta = {'timestamp': datetime.now().isoformat(timespec='seconds'), 'tickers': tickers, 'years': years,
+            'sessions': len(df_close), 'seed': seed, 'repeat': repeat, **environment()}
+    return {'meta': meta, 'results': results}
+
+
+def compare(base, new, threshold=THRESHOLD, min_delta=MIN_DELTA):
+    """In bảng so sánh trung vị; trả về danh sách case bị hồi quy"""
+    keys = ('tickers', 'years', 'seed')
+    if any(base['meta'].get(k) != new['meta'].get(k) for k in keys):
+        print(f"⚠️ Kích thước khác nhau: {[base['meta'].get(k) for k in keys]} vs {[new['meta'].get(k) for k in keys]}")
+    regressions = []
+    print(f"{'Case':<56} {'Base ms':>10} {'New ms':>10} {'Ratio':>7}")
+    for key in sorted(set(base['results']) & set(new['results'])):
+        b, n = base['results'][key]['median'], new['results'][key]['median']
+        ratio = n / b if b > 0 else np.inf
+        slow = ratio > 1 + threshold and n - b > min_delta
+        if slow:
+            regressions.append(key)
+        print(f"{key:<56} {b * 1000:>10.2f} {n * 1000:>10.2f} {ratio:>7.2f}{'  ❌' if slow else ''}")
+    for key in sorted(set(base['results']) ^ set(new['results'])):
+        print(f"   (chỉ có ở một bên: {key})")
+    return regressions
+
+
+def _load(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark mọi hàm phân tích + đường tải dữ liệu, kiểm tra hồi quy")
+    parser.add_argument('--tickers', type=int, default=50)
+    parser.add_argument('--years', type=int, default=12)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=7)
+    parser.add_argument('--only', help="Regex lọc tên case (vd. 'analytics.correlation')")
+    parser.add_argument('--no-e2e', action='store_true', help="Bỏ qua cập nhật + rerun dashboard đầu-cuối")
+    parser.add_argument('--e2e-runs', type=int, default=15)
+    parser.add_argument('--out', help="File JSON kết quả (mặc định benchmarks/results/<thời điểm>.json)")
+    parser.add_argument('--baseline', help="So với kết quả cũ; exit 1 nếu có hồi quy")
+    parser.add_argument('--compare', nargs=2, metavar=('BASE', 'NEW'), help="Chỉ so sánh hai file kết quả")
+    parser.add_argument('--threshold', type=float, default=THRESHOLD, help="Tỷ lệ chậm đi cho phép (0.25 = 25%%)")
+    args = parser.parse_args()
+
+    if args.compare:
+        regressions = compare(_load(args.compare[0]), _load(args.compare[1]), args.threshold)
+    else:
+        res = run_suite(args.tickers, args.years, args.seed, args.repeat, args.only, not args.no_e2e, args.e2e_runs)
+        out = args.out or os.path.join(RESULTS_DIR, f"{datetime.now():%Y%m%d-%H%M%S}.json")
+        os.makedirs(os.path.dirname(out) or '.', exist_ok=True)
+        with open(out, 'w') as f:
+            json.dump(res, f, indent=1)
+        print(f"💾 Đã ghi {len(res['results'])} kết quả vào {out}")
+        regressions = compare(_load(args.baseline), res, args.threshold) if args.baseline else []
+    if regressions:
+        print(f"❌ {len(regressions)} case chậm hơn baseline quá {args.threshold:.0%}: {', '.join(regressions)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,30 @@
+"""Sinh vũ trụ quỹ giả lập (giá + khối lượng) giống cấu trúc funds_data.csv"""
+import numpy as np
+import pandas as pd
+
+
+def make_universe(n_tickers=20, years=12, seed=0, end='2026-10-16', full_history=0.3):
+    """Trả về (df_close, df_vol) với ngày ra mắt so le như dữ liệu thật.
+
+    full_history: tỷ lệ mã có dữ liệu từ đầu kỳ (như các chỉ số); còn lại ra mắt ngẫu nhiên.
+    """
+    rng = np.random.default_rng(seed)
+    index = pd.bdate_range(end=end, periods=int(years * 252), name='Date')
+    T = len(index)
+    columns = [f"SYN{i:04d}" for i in range(n_tickers)]
+
+    mu = rng.normal(0.0003, 0.0002, n_tickers)
+    sigma = rng.uniform(0.008, 0.02, n_tickers)
+    rets = rng.standard_normal((T, n_tickers)) * sigma + mu
+    close = 10 * np.exp(np.cumsum(rets, axis=0))
+    volume = rng.integers(0, 2_000_000, (T, n_tickers)).astype(float)
+
+    launch = rng.integers(0, int(T * 0.9), n_tickers)
+    launch[: int(n_tickers * full_history)] = 0
+    before = np.arange(T)[:, None] < launch[None, :]
+    close[before] = np.nan
+    volume[before] = 0
+
+    df_close = pd.DataFrame(close, index=index, columns=columns)
+    df_vol = pd.DataFrame(volume, index=index, columns=columns)
+    return df_close, df_vol
@@ -0,0 +1,136 @@
+from collections import deque
+
+import numpy as np
+import pandas as pd
+
+# Tương quan pairwise-complete dựa trên tổng tích chéo cộng dồn:
+# với mỗi cặp (i, j) chỉ tính các ngày cả hai mã đều có dữ liệu, giống pandas DataFrame.corr().
+SUMS = ('cnt', 'sx', 'sxx', 'sxy')
+
+
+def _masked(X):
+    X = np.asarray(X, dtype=np.float64)
+    if X.ndim == 1:
+        X = X[None, :]
+    M = ~np.isnan(X)
+    return np.where(M, X, 0.0), M.astype(np.float64)
+
+
+def corr_from_sums(cnt, sx, sxx, sxy, min_periods=2):
+    """Ma trận tương quan từ các tổng: cnt = số ngày chung, sx[i, j] = tổng x_i trên các ngày chung với j..."""
+    sy, syy = sx.T, sxx.T
+    with np.errstate(divide='ignore', invalid='ignore'):
+        cov = sxy - sx * sy / cnt
+        vx = sxx - sx * sx / cnt
+        vy = syy - sy * sy / cnt
+        corr = cov / np.sqrt(vx * vy)
+    corr[(cnt < min_periods) | ~(vx > 0) | ~(vy > 0)] = np.nan
+    np.clip(corr, -1.0, 1.0, out=corr)
+    diag = np.diag(corr).copy()
+    np.fill_diagonal(corr, np.where(np.isnan(diag), np.nan, 1.0))
+    return corr
+
+
+class RunningCorr:
+    """Tổng tích chéo cộng dồn cho N mã: thêm/bớt một ngày tốn O(N^2), không quét lại lịch sử.
+
+    window: giữ N ngày gần nhất (rolling); halflife: trọng số giảm dần theo số ngày (EW).
+    Không truyền gì thì cửa sổ do người gọi quản lý qua add()/remove() (vd. theo preset lịch).
+    """
+
+    def __init__(self, n, window=None, halflife=None):
+        self.n = n
+        self.window = window
+        self.decay = 0.5 ** (1.0 / halflife) if halflife else 1.0
+        self.rows = deque()
+        for name in SUMS:
+            setattr(self, name, np.zeros((n, n)))
+
+    def add(self, X, sign=1.0):
+        """Cộng (sign=-1: trừ) một hoặc nhiều ngày lợi nhuận (ma trận ngày x mã) bằng phép nhân ma trận"""
+        Xz, M = _masked(X)
+        if not len(Xz):
+            return
+        self.cnt += sign * (M.T @ M)
+        self.sx += sign * (Xz.T @ M)
+        self.sxx += sign * ((Xz * Xz).T @ M)
+        self.sxy += sign * (Xz.T @ Xz)
+
+    def remove(self, X):
+        self.add(X, -1.0)
+
+    def push(self, x):
+        """Thêm một ngày mới (rolling / EW)"""
+        if self.decay != 1.0:
+            for name in SUMS:
+                getattr(self, name)[...] *= self.decay
+        self.add(x)
+        if self.window:
+            self.rows.append(np.asarray(x, dtype=np.float64))
+            if len(self.rows) > self.window:
+                self.remove(self.rows.popleft())
+
+    def corr(self, min_periods=2):
+        # EW: cnt là tổng trọng số, chỉ đòi hỏi phương sai dương
+        return corr_from_sums(self.cnt, self.sx, self.sxx, self.sxy, min_periods if self.decay == 1.0 else 0)
+
+    def state(self):
+        return {name: getattr(self, name) for name in SUMS}
+
+    @classmethod
+    def from_state(cls, state):
+        obj = cls(len(state['cnt']))
+        for name in SUMS:
+            setattr(obj, name, np.array(state[name], dtype=np.float64))
+        return obj
+
+
+def pairwise_corr(returns, min_periods=2):
+    """Tương đương returns.corr() (Pearson, pairwise-complete) nhưng bằng 4 phép nhân ma trận"""
+    rc = RunningCorr(returns.shape[1])
+    rc.add(returns.to_numpy())
+    return pd.DataFrame(rc.corr(min_periods), index=returns.columns, columns=returns.columns)
+
+
+def rolling_corr(returns, window):
+    """Ma trận tương quan của `window` ngày cuối, tính tiến dần từng ngày"""
+    rc = RunningCorr(returns.shape[1], window=window)
+    for row in returns.to_numpy():
+        rc.push(row)
+    return pd.DataFrame(rc.corr(), index=returns.columns, columns=returns.columns)
+
+
+def ewm_corr(returns, halflife):
+    """Tương quan có trọng số mũ (ngày gần có trọng số lớn hơn, nửa đời = halflife phiên)"""
+    n = len(returns)
+    w = 0.5 ** (np.arange(n)[::-1] / halflife)
+    Xz, M = _masked(returns.to_numpy())
+    Xw, Mw = Xz * w[:, None], M * w[:, None]
+    corr = corr_from_sums(Mw.T @ M, Xw.T @ M, (Xw * Xz).T @ M, Xw.T @ Xz, min_periods=0)
+    return pd.DataFrame(corr, index=returns.columns, columns=returns.columns)
+
+
+def cluster_order(corr):
+    """Thứ tự mã theo phân cụm phân cấp (average linkage, khoảng cách sqrt((1 - rho) / 2)) để heatmap gom khối.
+
+    Không có scipy thì sắp theo vector riêng chính của ma trận tương quan.
+    """
+    C = np.nan_to_num(np.asarray(corr, dtype=np.float64), nan=0.0)
+    np.fill_diagonal(C, 1.0)
+    if len(C) < 3:
+        return np.arange(len(C))
+    try:
+        from scipy.cluster.hierarchy import leaves_list, linkage
+        from scipy.spatial.distance import squareform
+    except ImportError:
+        return np.argsort(np.linalg.eigh(C)[1][:, -1])
+    D = np.sqrt(np.clip((1.0 - C) / 2.0, 0.0, 1.0))
+    np.fill_diagonal(D, 0.0)
+    return leaves_list(linkage(squareform((D + D.T) / 2, checks=False), method='average'))
+
+
+def reorder(corr, order=None):
+    """DataFrame tương quan sắp theo thứ tự phân cụm"""
+    order = cluster_order(corr) if order is None else order
+    labels = corr.index[order]
+    return corr.loc[labels, labels]
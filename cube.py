@@ -0,0 +1,168 @@
+import os
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+import snapshot
+import storage
+from correlation import RunningCorr
+from metrics import RISK_COLUMNS, REGRESSION_COLUMNS, TRADING_DAYS, calculate_returns, calculate_risk_metrics, regression_matrix
+
+# Các mốc thời gian cố định của thanh trượt t_range trong app.py
+PRESETS = ["3M", "6M", "YTD", "1Y", "3Y", "5Y", "Max"]
+CUBE_PATH = os.path.join(storage.DATA_DIR, 'cube.npz')
+CORR_STATE_PATH = os.path.join(storage.DATA_DIR, 'corr_state.npz')
+BENCH = 'VNINDEX'
+CUBE_COLUMNS = RISK_COLUMNS + REGRESSION_COLUMNS + ["Tracking Error"]
+
+
+def preset_start(preset, end_d, first_d):
+    """Ngày bắt đầu của một preset (giống thanh trượt trong sidebar)"""
+    return {
+        "3M": end_d - timedelta(days=90), "6M": end_d - timedelta(days=180),
+        "1Y": end_d - timedelta(days=365), "3Y": end_d - timedelta(days=365*3),
+        "5Y": end_d - timedelta(days=365*5), "YTD": datetime(end_d.year, 1, 1),
+        "Max": first_d
+    }[preset]
+
+
+def window_metrics(daily_ret, bench_ret):
+    """Bảng quỹ x chỉ số (Risk + Regression + Tracking Error năm) cho một cửa sổ"""
+    risk = calculate_risk_metrics(daily_ret)
+    reg = regression_matrix(daily_ret, bench_ret)
+    te = daily_ret.sub(bench_ret, axis=0).std() * np.sqrt(TRADING_DAYS) * 100
+    return pd.concat([risk, reg, te.rename("Tracking Error")], axis=1)[CUBE_COLUMNS]
+
+
+def _first_session(store, tickers, start):
+    """Phiên đầu tiên (của bất kỳ mã nào) từ start trở đi: dòng đầu của store.wide(tickers, start)"""
+    firsts = [rec['date'][0] for rec in (store.read(t, start) for t in tickers) if len(rec)]
+    return pd.Timestamp(min(firsts))
+
+
+def _returns_between(store, tickers, after, upto):
+    """Lợi nhuận các phiên trong (after, upto], after phải là một phiên trong lịch"""
+    if upto <= after:
+        return np.empty((0, len(tickers)))
+    # Như calculate_returns (pct_change) trên bảng đã ffill, nhưng không qua pandas cho từng cột
+    prices = store.wide(tickers, after, upto).to_numpy(dtype=np.float64)
+    return prices[1:] / prices[:-1] - 1
+
+
+def preset_correlations(store, state=None):
+    """Ma trận tương quan pairwise-complete theo từng preset, kèm trạng thái tổng tích chéo.
+
+    Có state của lần trước thì chỉ cộng các phiên mới và trừ các phiên rơi khỏi cửa sổ (O(N^2) mỗi phiên)
+    thay vì tính lại trên toàn bộ T phiên.
+    """
+    tickers, end_d, first_d = store.tickers, store.last_date(), store.first_date()
+    reuse = state is not None and state['tickers'] == tickers and state['end'] <= end_d
+    new_state = {'tickers': tickers, 'end': end_d, 'lo': {}, 'sums': {}}
+    corr = np.full((len(PRESETS), len(tickers), len(tickers)), np.nan)
+    for i, preset in enumerate(PRESETS):
+        # Cửa sổ của preset là các phiên trong (lo, end_d], giống calculate_returns(store.wide(...)) bỏ dòng NaN đầu
+        lo = _first_session(store, tickers, preset_start(preset, end_d, first_d))
+        if reuse and preset in state['lo'] and lo >= state['lo'][preset]:
+            old_lo, old_end = state['lo'][preset], state['end']
+            rc = state['sums'][preset]
+            rc.remove(_returns_between(store, tickers, old_lo, min(lo, old_end)))
+            rc.add(_returns_between(store, tickers, max(lo, old_end), end_d))
+        else:
+            rc = RunningCorr(len(tickers))
+            rc.add(_returns_between(store, tickers, lo, end_d))
+        new_state['lo'][preset], new_state['sums'][preset] = lo, rc
+        corr[i] = rc.corr()
+    return corr, new_state
+
+
+def save_corr_state(state, path=CORR_STATE_PATH):
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    arrays = {f"{p}__{k}": v for p, rc in state['sums'].items() for k, v in rc.state().items()}
+    lo = np.array([np.datetime64(state['lo'][p], 'ns') for p in state['sums']])
+    tmp = path + '.tmp.npz'
+    np.savez(tmp, tickers=np.array(state['tickers']), end=np.datetime64(state['end'], 'ns'),
+             presets=np.array(list(state['sums'])), lo=lo, **arrays)
+    os.replace(tmp, path)
+
+
+def load_corr_state(path=CORR_STATE_PATH):
+    if not os.path.exists(path):
+        return None
+    with np.load(path) as z:
+        presets = z['presets'].tolist()
+        return {
+            'tickers': z['tickers'].tolist(), 'end': pd.Timestamp(z['end'][()]),
+            'lo': {p: pd.Timestamp(d) for p, d in zip(presets, z['lo'])},
+            'sums': {p: RunningCorr.from_state({k: z[f"{p}__{k}"] for k in ('cnt', 'sx', 'sxx', 'sxy')}) for p in presets},
+        }
+
+
+def build_cube(store, bench=BENCH, corr_state=None):
+    """Tính sẵn mọi mã x preset x chỉ số, kèm ma trận tương quan theo từng preset"""
+    tickers = store.tickers
+    bench = bench if bench in tickers else tickers[0]
+    end_d, first_d = store.last_date(), store.first_date()
+    values = np.full((len(PRESETS), len(tickers), len(CUBE_COLUMNS)), np.nan)
+    for i, preset in enumerate(PRESETS):
+        prices = store.wide(tickers, preset_start(preset, end_d, first_d), end_d)
+        daily_ret = calculate_returns(prices)
+        values[i] = window_metrics(daily_ret, daily_ret[bench]).to_numpy(dtype=float)
+    corr, corr_state = preset_correlations(store, corr_state)
+    return {
+        'version': store.version, 'bench': bench,
+        'presets': PRESETS, 'tickers': tickers, 'columns': CUBE_COLUMNS,
+        'values': values, 'corr': corr, 'corr_state': corr_state,
+    }
+
+
+def save_cube(cube, path=CUBE_PATH):
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp = path + '.tmp.npz'
+    np.savez(tmp, values=cube['values'], corr=cube['corr'],
+             presets=np.array(cube['presets']), tickers=np.array(cube['tickers']),
+             columns=np.array(cube['columns']), version=np.array(cube['version']), bench=np.array(cube['bench']))
+    os.replace(tmp, path)
+
+
+def load_cube(path=CUBE_PATH):
+    """Đọc cube đã lưu (None nếu chưa có)"""
+    if not os.path.exists(path):
+        return None
+    with np.load(path) as z:
+        return {
+            'version': str(z['version']), 'bench': str(z['bench']),
+            'presets': z['presets'].tolist(), 'tickers': z['tickers'].tolist(), 'columns': z['columns'].tolist(),
+            'values': z['values'], 'corr': z['corr'],
+        }
+
+
+def lookup(cube, preset, tickers, version, bench=BENCH):
+    """(bảng chỉ số, ma trận tương quan) cho lựa chọn; None nếu cube cũ / không phủ lựa chọn này"""
+    if cube is None or cube['version'] != version or cube['bench'] != bench or preset not in cube['presets']:
+        return None
+    pos = {t: i for i, t in enumerate(cube['tickers'])}
+    if any(t not in pos for t in tickers):
+        return None
+    i, idx = cube['presets'].index(preset), [pos[t] for t in tickers]
+    table = pd.DataFrame(cube['values'][i][idx], index=tickers, columns=cube['columns'])
+    table["Obs"] = table["Obs"].astype(int)
+    corr = pd.DataFrame(cube['corr'][i][np.ix_(idx, idx)], index=tickers, columns=tickers)
+    return table, corr
+
+
+def refresh(store, path=CUBE_PATH, rebuild=False):
+    """Dựng lại cube sau mỗi lần cập nhật dữ liệu (tương quan cập nhật tiến dần trừ khi rebuild=True)"""
+    t0 = time.perf_counter()
+    state_path = os.path.join(os.path.dirname(path), os.path.basename(CORR_STATE_PATH))
+    cube = build_cube(store, corr_state=None if rebuild else load_corr_state(state_path))
+    save_cube(cube, path)
+    save_corr_state(cube['corr_state'], state_path)
+    print(f"🧊 Đã tính sẵn metric cube: {len(cube['tickers'])} mã x {len(PRESETS)} preset ({time.perf_counter() - t0:.2f}s)")
+    return cube
+
+
+if __name__ == "__main__":
+    with snapshot.update() as snap:
+        snap.version = refresh(snap.open_store(), snap.path('cube'))['version']
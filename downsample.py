@@ -0,0 +1,98 @@
+import numpy as np
+import pandas as pd
+
+# Bề rộng (px) ước lượng của một chart full-width (layout="wide"); mỗi pixel ngang giữ ~1 điểm,
+# chart nằm trong st.columns nhận bề rộng nhỏ hơn qua column_width()
+FULL_WIDTH = 1000
+# Mỗi chuỗi luôn được giữ ít nhất chừng này điểm "chính" của riêng nó
+MIN_PER_SERIES = 100
+
+
+def lttb_indices(values, n_out):
+    """Largest-Triangle-Three-Buckets cho mọi cột cùng lúc (trục x = vị trí dòng).
+
+    values: ma trận (dòng x cột). Trả về chỉ số dòng đã chọn (hợp của mọi cột, đã sắp xếp),
+    luôn gồm dòng đầu, dòng cuối và điểm hợp lệ đầu/cuối của từng cột.
+    """
+    Y = np.asarray(values, dtype=np.float64)
+    if Y.ndim == 1:
+        Y = Y[:, None]
+    n = len(Y)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    cols = np.arange(Y.shape[1])
+    every = (n - 2) / (n_out - 2)
+    edges = (np.floor(np.arange(n_out - 1) * every) + 1).astype(int)
+    edges[-1] = n - 1
+    picked = np.empty((n_out, Y.shape[1]), dtype=int)
+    picked[0], picked[-1] = 0, n - 1
+    a = np.zeros(Y.shape[1], dtype=int)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        for i in range(n_out - 2):
+            lo, hi = edges[i], edges[i + 1]
+            nxt_hi = edges[i + 2] if i + 2 < len(edges) else n
+            # Đỉnh thứ ba: trung bình bucket kế tiếp (bucket cuối dùng điểm cuối)
+            avg_x = (hi + nxt_hi - 1) / 2
+            nxt = Y[hi:nxt_hi]
+            avg_y = np.nansum(nxt, axis=0) / (~np.isnan(nxt)).sum(axis=0)
+            xa, ya = a.astype(np.float64), Y[a, cols]
+            xs = np.arange(lo, hi, dtype=np.float64)[:, None]
+            area = np.abs((xa - avg_x) * (Y[lo:hi] - ya) - (xa - xs) * (avg_y - ya))
+            a = lo + np.argmax(np.nan_to_num(area, nan=-1.0), axis=0)
+            picked[i + 1] = a
+    return np.union1d(picked.ravel(), _valid_ends(Y))
+
+
+def minmax_indices(values, n_buckets):
+    """Giữ dòng min và max của từng bucket cho mọi cột: đỉnh và đáy (vd. Max Drawdown) giữ nguyên chính xác"""
+    Y = np.asarray(values, dtype=np.float64)
+    if Y.ndim == 1:
+        Y = Y[:, None]
+    n = len(Y)
+    if 2 * n_buckets >= n or n_buckets < 1:
+        return np.arange(n)
+    size = -(-n // n_buckets)
+    pad = np.full((size * n_buckets - n, Y.shape[1]), np.nan)
+    B = np.vstack([Y, pad]).reshape(n_buckets, size, Y.shape[1])
+    empty = np.isnan(B).all(axis=1)
+    filled_lo = np.where(np.isnan(B), np.inf, B)
+    filled_hi = np.where(np.isnan(B), -np.inf, B)
+    base = (np.arange(n_buckets) * size)[:, None]
+    lo = (base + filled_lo.argmin(axis=1))[~empty]
+    hi = (base + filled_hi.argmax(axis=1))[~empty]
+    return np.union1d(np.concatenate([lo, hi, [0, n - 1]]), _valid_ends(Y))
+
+
+def _valid_ends(Y):
+    """Điểm hợp lệ đầu / cuối của từng cột (quỹ niêm yết sau ngày bắt đầu)"""
+    valid = ~np.isnan(Y)
+    has = valid.any(axis=0)
+    first = valid.argmax(axis=0)[has]
+    last = (len(Y) - 1 - valid[::-1].argmax(axis=0))[has]
+    return np.concatenate([first, last])
+
+
+def column_width(spec=1, i=0, width=FULL_WIDTH):
+    """Bề rộng (px) của cột thứ i trong st.columns(spec); spec là số cột hoặc danh sách tỷ lệ như Streamlit"""
+    ratios = [1] * spec if isinstance(spec, int) else list(spec)
+    return int(width * ratios[i] / sum(ratios))
+
+
+def downsample(obj, method='lttb', width=FULL_WIDTH):
+    """Rút gọn Series/DataFrame theo thời gian trước khi vẽ; trả nguyên vẹn nếu đã đủ nhỏ.
+
+    method: 'lttb' cho đường giá / lợi nhuận, 'minmax' cho drawdown và khối lượng.
+    width: bề rộng chart (px), quyết định số điểm giữ lại (~1 điểm mỗi pixel).
+    Các cột dùng chung một tập dòng (hợp các điểm đã chọn của từng cột) để Plotly vẽ liền nét.
+    """
+    points = max(int(width), 3)
+    if obj is None or len(obj) <= points:
+        return obj
+    n_cols = 1 if isinstance(obj, pd.Series) else max(obj.shape[1], 1)
+    if method == 'lttb':
+        idx = lttb_indices(obj.to_numpy(), max(points // n_cols, MIN_PER_SERIES))
+    elif method == 'minmax':
+        idx = minmax_indices(obj.to_numpy(), max(points // (2 * n_cols), MIN_PER_SERIES // 2))
+    else:
+        raise ValueError(f"method không hợp lệ: {method}")
+    return obj.iloc[idx]
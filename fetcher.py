@@ -0,0 +1,229 @@
+import json
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import pandas as pd
+import requests
+from requests.adapters import HTTPAdapter
+
+# API dchart của VNDIRECT (có thể trỏ sang server giả lập khi test)
+DCHART_URL = os.environ.get('DCHART_API_URL', 'https://dchart-api.vndirect.com.vn/dchart/history')
+HEADERS = {
+    'User-Agent': 'Mozilla/5.0',
+    'Referer': 'https://dchart.vndirect.com.vn/'
+}
+
+# Cấu hình mặc định của engine tải
+MAX_WORKERS = 4        # Số luồng tải song song
+RATE_PER_SEC = 4.0     # Số request tối đa mỗi giây (token bucket)
+BURST = 4              # Số request được phép dồn một lúc
+MAX_RETRIES = 3        # Số lần thử lại khi lỗi mạng / 429 / 5xx
+BACKOFF_BASE = 0.5     # Giây, nhân đôi sau mỗi lần thử lại (có jitter)
+TIMEOUT = 20
+START_DEFAULT = 1388534400  # 2014-01-01, dùng khi không có mốc riêng cho mã
+
+RETRY_STATUS = {429, 500, 502, 503, 504}
+STAT_COLUMNS = ['Ticker', 'Attempts', 'Wait', 'Seconds', 'Rows', 'Bytes', 'Cache', 'Error']
+DAY = 86400
+
+
+def day_end(ts):
+    """Cuối ngày UTC chứa ts: mốc 'to' ổn định trong ngày để request lặp lại trúng cache"""
+    return (int(ts) // DAY + 1) * DAY - 1
+
+
+class TokenBucket:
+    """Bộ giới hạn tốc độ dạng token bucket, an toàn đa luồng"""
+
+    def __init__(self, rate=RATE_PER_SEC, burst=BURST):
+        self.rate = float(rate)
+        self.capacity = float(max(burst, 1))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """Chờ đến khi có token, trả về số giây đã phải chờ"""
+        if self.rate <= 0:
+            return 0.0
+        waited = 0.0
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return waited
+                delay = (1 - self.tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+
+def make_session(pool_size=MAX_WORKERS):
+    """Một Session dùng chung, giữ kết nối keep-alive cho mọi luồng"""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    session.headers.update(HEADERS)
+    return session
+
+
+def parse_dchart(data):
+    """Chuyển JSON {t, c, v} của dchart thành DataFrame Close/Volume theo ngày"""
+    if not data or 't' not in data or 'c' not in data:
+        return pd.DataFrame()
+    df = pd.DataFrame({
+        'Date': pd.to_datetime(data['t'], unit='s'),
+        'Close': data['c'],
+        'Volume': data.get('v', 0)
+    })
+    df['Date'] = df['Date'].dt.normalize()
+    # Loại bỏ các giá trị 0 hoặc NaN
+    df = df[df['Close'] > 0]
+    return df.set_index('Date')
+
+
+def _from_cache(cache, entry, stat, kind, t0):
+    """Dựng DataFrame từ body đã lưu; kind: 'hits' / 'revalidated' / 'stale' (bộ đếm của HttpCache)"""
+    df = parse_dchart(json.loads(cache.read(entry)))
+    cache.count(kind)
+    if kind != 'stale':
+        cache.count('bytes_saved', entry['size'])
+    stat.update(Rows=len(df), Cache={'hits': 'hit', 'revalidated': '304', 'stale': 'stale'}[kind],
+                Seconds=time.perf_counter() - t0)
+    return df, stat
+
+
+def fetch_one(session, symbol, start_ts, end_ts, limiter=None, retries=MAX_RETRIES,
+              backoff=BACKOFF_BASE, timeout=TIMEOUT, base_url=DCHART_URL, cache=None):
+    """Tải một mã, thử lại với backoff có jitter. Trả về (DataFrame, thống kê).
+
+    cache (httpcache.HttpCache): entry còn hạn thì không gọi mạng; quá hạn thì hỏi lại có điều kiện (304 -> dùng
+    bản đã lưu); hết lượt thử mà vẫn lỗi mạng / lỗi tạm thời (RETRY_STATUS) thì dùng bản cũ trong cache thay vì trả về
+    bảng rỗng. Lỗi 4xx khác (vd. 404 mã không còn tồn tại) được giữ nguyên trong stat['Error'].
+    """
+    params = {'resolution': 'D', 'symbol': symbol, 'from': start_ts, 'to': end_ts}
+    stat = {'Ticker': symbol, 'Attempts': 0, 'Wait': 0.0, 'Seconds': 0.0, 'Rows': 0, 'Bytes': 0, 'Cache': None, 'Error': None}
+    t0 = time.perf_counter()
+    entry = cache.lookup(base_url, params) if cache is not None else None
+    if entry is not None and (entry['fresh'] or cache.offline):
+        return _from_cache(cache, entry, stat, 'hits', t0)
+    if cache is not None and cache.offline:
+        stat['Error'] = "offline: không có trong cache"
+        return pd.DataFrame(), stat
+    headers = cache.conditional_headers(entry) if cache is not None else {}
+    transient = False   # Lỗi cuối cùng là lỗi mạng / RETRY_STATUS (mới được dùng bản cũ trong cache)
+    for attempt in range(retries + 1):
+        stat['Attempts'] = attempt + 1
+        if limiter is not None:
+            stat['Wait'] += limiter.acquire()
+        try:
+            response = session.get(base_url, params=params, timeout=timeout, headers=headers or None)
+            stat['Bytes'] += len(response.content)
+            if response.status_code == 304 and entry is not None:
+                cache.touch(entry)
+                return _from_cache(cache, entry, stat, 'revalidated', t0)
+            if response.status_code == 200:
+                df = parse_dchart(response.json())
+                if cache is not None:
+                    cache.store(base_url, params, response.content, response.headers)
+                    cache.count('misses')
+                    cache.count('bytes_fetched', len(response.content))
+                    stat['Cache'] = 'miss'
+                stat['Rows'] = len(df)
+                stat['Error'] = None
+                stat['Seconds'] = time.perf_counter() - t0
+                return df, stat
+            stat['Error'] = f"HTTP {response.status_code}"
+            transient = response.status_code in RETRY_STATUS
+            if not transient:
+                break
+        except (requests.RequestException, ValueError) as e:
+            stat['Error'] = f"{type(e).__name__}: {e}"
+            transient = True
+        if attempt < retries:
+            # Full jitter: ngủ ngẫu nhiên trong [0, backoff * 2^attempt]
+            time.sleep(random.uniform(0, backoff * (2 ** attempt)))
+    if entry is not None and transient:
+        print(f"⚠️ {symbol}: {stat['Error']}, dùng phản hồi đã lưu lúc {time.strftime('%Y-%m-%d %H:%M', time.localtime(entry['fetched']))}")
+        stat['Error'] = None
+        return _from_cache(cache, entry, stat, 'stale', t0)
+    stat['Seconds'] = time.perf_counter() - t0
+    return pd.DataFrame(), stat
+
+
+def fetch_all(symbols, start_ts, end_ts=None, workers=MAX_WORKERS, rate=RATE_PER_SEC, burst=BURST,
+              retries=MAX_RETRIES, backoff=BACKOFF_BASE, timeout=TIMEOUT, base_url=DCHART_URL, session=None,
+              progress=None, cache=None):
+    """Tải song song nhiều mã qua một pool luồng giới hạn và một Session dùng chung.
+
+    start_ts có thể là một số (chung cho mọi mã) hoặc dict Ticker -> timestamp.
+    progress: hàm gọi với dict thống kê của từng mã ngay khi mã đó tải xong.
+    cache: httpcache.HttpCache dùng chung cho mọi luồng (xem fetch_one).
+    Trả về (dict Ticker -> DataFrame, DataFrame thống kê thời gian từng mã).
+    """
+    end_ts = end_ts or day_end(time.time())
+    starts = start_ts if isinstance(start_ts, dict) else {s: start_ts for s in symbols}
+    limiter = TokenBucket(rate, burst)
+    own_session = session is None
+    session = session or make_session(workers)
+    results, stats = {}, []
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+            futures = {
+                pool.submit(fetch_one, session, s, starts.get(s, START_DEFAULT), end_ts, limiter,
+                            retries, backoff, timeout, base_url, cache): s
+                for s in symbols
+            }
+            for fut in as_completed(futures):
+                df, stat = fut.result()
+                results[futures[fut]] = df
+                stats.append(stat)
+                if progress is not None:
+                    progress(stat)
+                if stat['Error']:
+                    print(f"❌ Lỗi tải {stat['Ticker']}: {stat['Error']}")
+                else:
+                    src = f", cache {stat['Cache']}" if stat['Cache'] not in (None, 'miss') else ""
+                    print(f"   -> {stat['Ticker']}: {stat['Rows']} dòng ({stat['Seconds']:.2f}s{src})")
+    finally:
+        if own_session:
+            session.close()
+
+    df_stats = pd.DataFrame(stats, columns=STAT_COLUMNS)
+    return results, df_stats.set_index('Ticker').reindex(list(symbols))
+
+
+def replay_all(symbols, cache, base_url=DCHART_URL, progress=None):
+    """Chế độ offline: dựng lại bảng của từng mã chỉ từ các phản hồi đã lưu (không gọi mạng).
+
+    Mọi phản hồi đã lưu của một mã (lịch sử đầy đủ + các lần incremental) được ghép theo thời điểm tải,
+    phản hồi mới hơn thắng khi trùng ngày. Cùng đầu ra với fetch_all.
+    """
+    results, stats = {}, []
+    for symbol in symbols:
+        t0 = time.perf_counter()
+        stat = {'Ticker': symbol, 'Attempts': 0, 'Wait': 0.0, 'Seconds': 0.0, 'Rows': 0, 'Bytes': 0, 'Cache': 'replay', 'Error': None}
+        responses = cache.replay(base_url, {'symbol': symbol, 'resolution': 'D'})
+        frames = [f for f in (parse_dchart(json.loads(body)) for _, body in responses) if not f.empty]
+        if frames:
+            df = pd.concat(frames)
+            df = df[~df.index.duplicated(keep='last')].sort_index()
+            cache.count('hits', len(responses))
+            cache.count('bytes_saved', sum(entry['size'] for entry, _ in responses))
+        else:
+            df = pd.DataFrame()
+            cache.count('misses')
+            stat['Error'] = "offline: không có trong cache"
+        results[symbol] = df
+        stat.update(Rows=len(df), Seconds=time.perf_counter() - t0)
+        stats.append(stat)
+        if progress is not None:
+            progress(stat)
+    df_stats = pd.DataFrame(stats, columns=STAT_COLUMNS)
+    return results, df_stats.set_index('Ticker').reindex(list(symbols))
@@ -0,0 +1,163 @@
+import argparse
+import os
+import time
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+import snapshot
+import storage
+
+# Dự báo ETS tính sẵn cho mọi mã sau mỗi lần cập nhật dữ liệu
+FORECAST_PATH = os.path.join(storage.DATA_DIR, 'forecasts.npz')
+HORIZON = 30
+TRAIN_YEARS = 2
+PARAMS = ['smoothing_level', 'smoothing_trend', 'damping_trend', 'initial_level', 'initial_trend']
+
+
+def _ets_model():
+    """Import statsmodels khi thật sự cần fit (import mất ~1s); None nếu chưa cài"""
+    try:
+        from statsmodels.tsa.holtwinters import ExponentialSmoothing
+    except ImportError:
+        return None
+    return ExponentialSmoothing
+
+
+def train_window(store, ticker, end_d=None):
+    """Chuỗi giá huấn luyện: TRAIN_YEARS năm gần nhất tính đến end_d"""
+    end_d = end_d or store.last_date()
+    return store.wide([ticker], end_d - pd.DateOffset(years=TRAIN_YEARS), end_d)[ticker]
+
+
+def fit_one(ticker, price_series, days=HORIZON):
+    """Fit ETS (trend cộng, tắt dần) cho một mã.
+
+    Trả về dict: Forecast (Series theo ngày làm việc), Params, Model ('damped' / 'simple' / 'naive'),
+    Seconds, Error. Mô hình dự phòng được ghi lại thay vì thay thế âm thầm.
+    """
+    t0 = time.perf_counter()
+    ts = price_series.dropna().asfreq('B').ffill()
+    out = {'Ticker': ticker, 'Params': dict.fromkeys(PARAMS, np.nan), 'Model': 'naive', 'Error': None}
+    ExponentialSmoothing = _ets_model()
+    if len(ts) < 10 or ExponentialSmoothing is None:
+        out['Error'] = "statsmodels chưa cài" if ExponentialSmoothing is None else "Không đủ dữ liệu"
+    else:
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            try:
+                fit = ExponentialSmoothing(ts, trend='add', damped_trend=True, seasonal=None).fit()
+                out['Model'] = 'damped'
+            except Exception as e:
+                out['Error'] = f"{type(e).__name__}: {e}"
+                try:
+                    fit = ExponentialSmoothing(ts).fit()
+                    out['Model'] = 'simple'
+                except Exception as e2:
+                    out['Error'] += f" | {type(e2).__name__}: {e2}"
+        if out['Model'] != 'naive':
+            out['Forecast'] = fit.forecast(days)
+            out['Params'].update({k: float(v) for k, v in fit.params.items() if k in PARAMS and np.isscalar(v)})
+    if out['Model'] == 'naive':
+        last = ts.iloc[-1] if len(ts) else np.nan
+        idx = pd.bdate_range(ts.index[-1] + pd.offsets.BDay(), periods=days) if len(ts) else pd.RangeIndex(days)
+        out['Forecast'] = pd.Series(last, index=idx)
+    out['Seconds'] = time.perf_counter() - t0
+    return out
+
+
+def _fit_task(args):
+    """Hàm chạy trong process con (phải ở cấp module để pickle được)"""
+    ticker, values, index, days = args
+    return fit_one(ticker, pd.Series(values, index=pd.DatetimeIndex(index)), days)
+
+
+def run_batch(store, tickers=None, jobs=None, days=HORIZON):
+    """Fit song song mọi mã qua ProcessPoolExecutor (jobs=1 chạy tuần tự).
+
+    Trả về dict kết quả đã gom, sẵn sàng cho save_forecasts.
+    """
+    tickers = list(tickers or store.tickers)
+    end_d = store.last_date()
+    tasks = []
+    for tk in tickers:
+        s = train_window(store, tk, end_d)
+        tasks.append((tk, s.to_numpy(dtype=float), s.index.to_numpy(), days))
+    jobs = jobs or os.cpu_count() or 1
+    if jobs > 1 and len(tasks) > 1:
+        with ProcessPoolExecutor(max_workers=min(jobs, len(tasks))) as pool:
+            results = list(pool.map(_fit_task, tasks, chunksize=max(1, len(tasks) // (jobs * 4))))
+    else:
+        results = [_fit_task(task) for task in tasks]
+
+    fc = np.full((len(tickers), days), np.nan)
+    start = np.full(len(tickers), np.datetime64('NaT'), dtype='M8[ns]')
+    for i, r in enumerate(results):
+        fc[i] = r['Forecast'].to_numpy(dtype=float)
+        if isinstance(r['Forecast'].index, pd.DatetimeIndex):
+            start[i] = r['Forecast'].index[0].to_datetime64()
+    stats = pd.DataFrame([{'Ticker': r['Ticker'], 'Model': r['Model'], 'Seconds': r['Seconds'],
+                           'Error': r['Error'], **r['Params']} for r in results]).set_index('Ticker')
+    return {'version': store.version, 'end': np.datetime64(end_d, 'ns'), 'tickers': tickers,
+            'start': start, 'values': fc, 'stats': stats}
+
+
+def save_forecasts(fc, path=FORECAST_PATH):
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    stats = fc['stats']
+    tmp = path + '.tmp.npz'
+    np.savez(tmp, values=fc['values'], start=fc['start'], end=np.array(fc['end']),
+             tickers=np.array(fc['tickers']), version=np.array(fc['version']),
+             models=stats['Model'].to_numpy(dtype=str), seconds=stats['Seconds'].to_numpy(dtype=float),
+             errors=stats['Error'].fillna('').to_numpy(dtype=str), params=stats[PARAMS].to_numpy(dtype=float))
+    os.replace(tmp, path)
+
+
+def load_forecasts(path=FORECAST_PATH):
+    """Đọc dự báo đã lưu (None nếu chưa có)"""
+    if not os.path.exists(path):
+        return None
+    with np.load(path) as z:
+        tickers = z['tickers'].tolist()
+        stats = pd.DataFrame(z['params'], index=pd.Index(tickers, name='Ticker'), columns=PARAMS)
+        stats.insert(0, 'Error', [e or None for e in z['errors'].tolist()])
+        stats.insert(0, 'Seconds', z['seconds'])
+        stats.insert(0, 'Model', z['models'])
+        return {'version': str(z['version']), 'end': z['end'][()], 'tickers': tickers,
+                'start': z['start'], 'values': z['values'], 'stats': stats}
+
+
+def lookup(fc, ticker, version, end_d, days=HORIZON):
+    """Series dự báo đã tính sẵn; None nếu cache cũ, khác ngày cuối hoặc không có mã"""
+    if fc is None or fc['version'] != version or ticker not in fc['tickers']:
+        return None
+    if pd.Timestamp(fc['end']) != pd.Timestamp(end_d) or fc['values'].shape[1] < days:
+        return None
+    i = fc['tickers'].index(ticker)
+    if np.isnat(fc['start'][i]):
+        return None
+    return pd.Series(fc['values'][i, :days], index=pd.bdate_range(fc['start'][i], periods=days), name=ticker)
+
+
+def refresh(store, jobs=None, path=FORECAST_PATH):
+    """Fit lại toàn bộ sau mỗi lần cập nhật dữ liệu"""
+    t0 = time.perf_counter()
+    fc = run_batch(store, jobs=jobs)
+    save_forecasts(fc, path)
+    stats = fc['stats']
+    print(f"🔮 Đã dự báo ETS {len(stats)} mã ({time.perf_counter() - t0:.2f}s, "
+          f"fit trung bình {stats['Seconds'].mean():.2f}s)")
+    for tk, row in stats[stats['Error'].notna()].iterrows():
+        print(f"⚠️ {tk}: dùng mô hình {row['Model']} ({row['Error']})")
+    return fc
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fit ETS cho mọi mã và lưu dự báo")
+    parser.add_argument('--jobs', type=int, default=None, help='Số process song song (mặc định: số CPU)')
+    args = parser.parse_args()
+    # Ghi vào snapshot mới: dashboard chỉ thấy dự báo khi đã ghi xong
+    with snapshot.update() as snap:
+        snap.version = refresh(snap.open_store(), jobs=args.jobs, path=snap.path('forecasts'))['version']
@@ -0,0 +1,216 @@
+import hashlib
+import json
+import os
+import threading
+import time
+import uuid
+
+import storage
+
+# Cache trên đĩa cho phản hồi thô của API (dchart). Nội dung lưu theo địa chỉ nội dung (sha256 của body),
+# mỗi request (url + tham số) là một file metadata nhỏ trỏ tới blob:
+#   data/http_cache/keys/<sha256 request>.json   {url, params, blob, fetched, used, size, etag, last_modified}
+#   data/http_cache/blobs/<2 ký tự>/<sha256 body>
+# Body trùng nhau (vd. hai lần tải cùng lịch sử) chỉ lưu một lần.
+CACHE_DIR = os.environ.get('FUNDS_HTTP_CACHE', os.path.join(storage.DATA_DIR, 'http_cache'))
+TTL = 3600                        # Giây: quá hạn thì hỏi lại server (có If-None-Match / If-Modified-Since nếu có)
+MAX_AGE = 30 * 86400              # Giây: entry không được dùng lâu hơn thì bị xóa khi evict()
+MAX_BYTES = 256 * 1024 * 1024     # Tổng dung lượng blob tối đa; vượt thì xóa entry dùng lâu nhất trước
+MODES = ('on', 'off', 'offline', 'refresh')
+# on: dùng entry còn hạn, quá hạn thì hỏi lại server; refresh: luôn hỏi lại server (vẫn ghi cache, vẫn dùng
+# entry cũ khi server lỗi); offline: chỉ đọc cache, không bao giờ gọi mạng; off: không dùng cache
+# Tham số thay đổi theo mỗi lần tải (mốc cuối); các entry chỉ khác nhau ở đây thuộc cùng một nhóm request
+VOLATILE_PARAMS = ('to',)
+
+
+def request_key(url, params):
+    """Khóa ổn định của một request (không phụ thuộc thứ tự tham số)"""
+    raw = json.dumps([url, sorted((str(k), str(v)) for k, v in params.items())])
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+def _write_atomic(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.{uuid.uuid4().hex[:8]}.tmp"   # Tên tạm riêng cho từng luồng
+    with open(tmp, 'wb') as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+class HttpCache:
+    """Cache phản hồi HTTP dùng chung giữa các luồng tải; đếm hit / miss / byte tiết kiệm cho báo cáo"""
+
+    def __init__(self, root=CACHE_DIR, ttl=TTL, mode='on', max_age=MAX_AGE, max_bytes=MAX_BYTES, pinned=None):
+        """pinned: bộ lọc tham số (như replay) của các request không được evict, vd. {'from': <mốc lịch sử đầy đủ>};
+        mỗi nhóm request chỉ giữ entry mới nhất"""
+        if mode not in MODES:
+            raise ValueError(f"mode phải là một trong {MODES}")
+        self.root = root
+        self.ttl = ttl
+        self.mode = mode
+        self.max_age = max_age
+        self.max_bytes = max_bytes
+        self.pinned = {k: str(v) for k, v in (pinned or {}).items()}
+        self.lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0, 'revalidated': 0, 'stale': 0, 'stored': 0,
+                      'bytes_saved': 0, 'bytes_fetched': 0, 'evicted': 0}
+
+    @property
+    def offline(self):
+        return self.mode == 'offline'
+
+    def count(self, name, n=1):
+        with self.lock:
+            self.stats[name] += n
+
+    def _key_path(self, key):
+        return os.path.join(self.root, 'keys', key + '.json')
+
+    def _blob_path(self, digest):
+        return os.path.join(self.root, 'blobs', digest[:2], digest)
+
+    def lookup(self, url, params):
+        """Entry của request (dict metadata) hoặc None; entry['fresh'] cho biết còn trong TTL hay không"""
+        if self.mode == 'off':
+            return None
+        try:
+            with open(self._key_path(request_key(url, params))) as f:
+                entry = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+        if not os.path.exists(self._blob_path(entry['blob'])):
+            return None
+        entry['fresh'] = self.mode != 'refresh' and time.time() - entry['fetched'] < self.ttl
+        return entry
+
+    def read(self, entry):
+        """Body đã lưu của entry; cập nhật thời điểm dùng (cho evict LRU)"""
+        with open(self._blob_path(entry['blob']), 'rb') as f:
+            body = f.read()
+        self._save_entry(dict(entry, used=time.time()))
+        return body
+
+    def conditional_headers(self, entry):
+        """Header hỏi lại server: 304 nếu nội dung chưa đổi"""
+        headers = {}
+        if entry and entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+        if entry and entry.get('last_modified'):
+            headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+
+    def store(self, url, params, body, headers=None):
+        """Lưu body (theo sha256, không ghi lại nếu đã có) và entry của request"""
+        if self.mode == 'off':
+            return None
+        digest = hashlib.sha256(body).hexdigest()
+        if not os.path.exists(self._blob_path(digest)):
+            _write_atomic(self._blob_path(digest), body)
+            self.count('stored')
+        headers = headers or {}
+        now = time.time()
+        entry = {'key': request_key(url, params), 'url': url, 'params': {k: str(v) for k, v in params.items()},
+                 'blob': digest, 'size': len(body), 'fetched': now, 'used': now,
+                 'etag': headers.get('ETag'), 'last_modified': headers.get('Last-Modified')}
+        self._save_entry(entry)
+        return entry
+
+    def touch(self, entry):
+        """Server trả 304: nội dung không đổi, làm mới TTL"""
+        now = time.time()
+        self._save_entry(dict(entry, fetched=now, used=now))
+
+    def _save_entry(self, entry):
+        entry = {k: v for k, v in entry.items() if k != 'fresh'}
+        _write_atomic(self._key_path(entry['key']), json.dumps(entry).encode())
+
+    def entries(self):
+        """Mọi entry trong cache"""
+        folder = os.path.join(self.root, 'keys')
+        out = []
+        if not os.path.isdir(folder):
+            return out
+        for name in os.listdir(folder):
+            if name.endswith('.json'):
+                try:
+                    with open(os.path.join(folder, name)) as f:
+                        out.append(json.load(f))
+                except ValueError:  # File hỏng: bỏ qua, evict() sẽ dọn
+                    pass
+        return out
+
+    def replay(self, url, params_filter):
+        """(entry, body) của mọi request tới url có tham số khớp params_filter, cũ trước mới sau"""
+        picked = [e for e in self.entries()
+                  if e['url'] == url and all(e['params'].get(k) == str(v) for k, v in params_filter.items())]
+        out = []
+        for entry in sorted(picked, key=lambda e: e['fetched']):
+            path = self._blob_path(entry['blob'])
+            if os.path.exists(path):
+                with open(path, 'rb') as f:
+                    out.append((entry, f.read()))
+        return out
+
+    def pinned_keys(self, entries):
+        """Khóa của entry được ghim: entry mới nhất của mỗi nhóm request khớp self.pinned.
+
+        Lịch sử đầy đủ chỉ được tải một lần rồi các lần sau tải incremental nên không bao giờ được dùng lại;
+        không ghim thì evict() xóa nó sau MAX_AGE và chế độ offline không dựng lại được lịch sử cũ.
+        """
+        if not self.pinned:
+            return set()
+        latest = {}
+        for e in entries:
+            if all(e['params'].get(k) == v for k, v in self.pinned.items()):
+                group = (e['url'], tuple(sorted((k, v) for k, v in e['params'].items() if k not in VOLATILE_PARAMS)))
+                if group not in latest or e['fetched'] > latest[group]['fetched']:
+                    latest[group] = e
+        return {e['key'] for e in latest.values()}
+
+    def evict(self, now=None):
+        """Xóa entry quá MAX_AGE, rồi entry dùng lâu nhất cho tới khi tổng blob <= MAX_BYTES; dọn blob mồ côi.
+
+        Entry được ghim (pinned_keys) không bao giờ bị xóa nhưng vẫn tính vào MAX_BYTES.
+        """
+        now = now or time.time()
+        entries = sorted(self.entries(), key=lambda e: e.get('used', 0))
+        pinned = self.pinned_keys(entries)
+        removed = [e for e in entries if e['key'] not in pinned and now - e.get('used', 0) > self.max_age]
+        keep = [e for e in entries if e['key'] in pinned or now - e.get('used', 0) <= self.max_age]
+        sizes = {e['blob']: e['size'] for e in keep}
+        total = sum(sizes.values())
+        for e in [e for e in keep if e['key'] not in pinned]:
+            if total <= self.max_bytes:
+                break
+            keep.remove(e)
+            removed.append(e)
+            if all(k['blob'] != e['blob'] for k in keep):
+                total -= sizes.pop(e['blob'], 0)
+        for e in removed:
+            try:
+                os.remove(self._key_path(e['key']))
+            except FileNotFoundError:
+                pass
+        live = {e['blob'] for e in keep}
+        blob_root = os.path.join(self.root, 'blobs')
+        if os.path.isdir(blob_root):
+            for sub in os.listdir(blob_root):
+                for name in os.listdir(os.path.join(blob_root, sub)):
+                    if name not in live and not name.endswith('.tmp'):
+                        os.remove(os.path.join(blob_root, sub, name))
+        self.count('evicted', len(removed))
+        return len(removed)
+
+    def size(self):
+        """(số entry, tổng byte blob) hiện có"""
+        entries = self.entries()
+        return len(entries), sum({e['blob']: e['size'] for e in entries}.values())
+
+    def report(self):
+        s = self.stats
+        total = s['hits'] + s['misses'] + s['revalidated']
+        n, size = self.size()
+        return (f"🗄️ HTTP cache ({self.mode}): {s['hits']} hit, {s['revalidated']} 304, {s['misses']} miss"
+                + (f", {s['stale']} dùng bản cũ do lỗi mạng" if s['stale'] else "")
+                + f" / {total} request · tiết kiệm {s['bytes_saved'] / 1e6:.2f} MB, tải {s['bytes_fetched'] / 1e6:.2f} MB"
+                + f" · {n} entry, {size / 1e6:.1f} MB" + (f", đã xóa {s['evicted']}" if s['evicted'] else ""))
@@ -0,0 +1,171 @@
+import cProfile
+import io
+import json
+import os
+import pstats
+import time
+import tracemalloc
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Đo thời gian từng giai đoạn (span) của một lần rerun dashboard / một lần cập nhật dữ liệu.
+# FUNDS_TRACE: danh sách chế độ cách nhau bởi dấu phẩy
+#   profile -> bật cProfile, memory -> bật tracemalloc, off -> không ghi log JSONL
+MODES = {m.strip() for m in os.environ.get('FUNDS_TRACE', '').lower().split(',') if m.strip()}
+TRACE_DIR = os.environ.get('FUNDS_TRACE_DIR', 'logs')
+TRACE_LOG = os.path.join(TRACE_DIR, 'trace.jsonl')
+LOG_MAX_BYTES = 5 * 1024 * 1024   # Vượt quá thì đổi tên thành trace.jsonl.1 và ghi file mới
+PROFILE_TOP = 25                  # Số hàm hiển thị trong bảng cProfile
+
+
+def peak_rss_mb():
+    """Đỉnh RSS của tiến trình (MB); None nếu hệ điều hành không hỗ trợ"""
+    if resource is None:
+        return None
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # Linux: KB
+
+
+class Tracer:
+    """Ghi các span lồng nhau (tên, thời điểm bắt đầu, số giây, độ sâu) và bộ đếm hit/miss của một lần chạy.
+
+    Dùng:  tracer = Tracer('rerun').start(); with tracer.span('load'): ...; tracer.finish()
+    """
+
+    def __init__(self, kind, modes=None, log_path=TRACE_LOG, on_start=None):
+        self.kind = kind
+        self.on_start = on_start  # Gọi on_start(tên span) khi vào mỗi span cấp ngoài cùng (vd. báo tiến độ)
+        self.modes = MODES if modes is None else set(modes)
+        self.log_path = log_path
+        self.run_id = uuid.uuid4().hex[:12]
+        self.spans = []
+        self.counters = {}
+        self.stack = []
+        self.profiler = None
+        self.profile_text = None
+        self.own_tracemalloc = False
+        self.t0 = time.perf_counter()
+        self.seconds = None
+        self.peak_mb = None
+
+    def start(self):
+        self.t0 = time.perf_counter()
+        if 'memory' in self.modes:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                self.own_tracemalloc = True
+            tracemalloc.reset_peak()
+        if 'profile' in self.modes:
+            self.profiler = cProfile.Profile()
+            try:
+                self.profiler.enable()
+            except ValueError:  # Đã có profiler khác đang chạy (phiên song song)
+                self.profiler = None
+        return self
+
+    @contextmanager
+    def span(self, name, **attrs):
+        if self.on_start is not None and not self.stack:
+            self.on_start(name)
+        start = time.perf_counter()
+        self.stack.append(name)
+        try:
+            yield
+        finally:
+            self.stack.pop()
+            rec = {'name': name, 'parent': self.stack[-1] if self.stack else None, 'depth': len(self.stack),
+                   'start': start - self.t0, 'seconds': time.perf_counter() - start, **attrs}
+            if tracemalloc.is_tracing():
+                current, peak = tracemalloc.get_traced_memory()
+                rec['mem_mb'], rec['peak_mb'] = current / 2**20, peak / 2**20
+            self.spans.append(rec)
+
+    def call(self, name, fn, *args, **kwargs):
+        """fn(*args, **kwargs) bên trong một span"""
+        with self.span(name):
+            return fn(*args, **kwargs)
+
+    def count(self, name, n=1):
+        """Bộ đếm tự do, vd. 'cube.hit' / 'cube.miss'"""
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def finish(self, extra=None):
+        """Dừng đo, ghi log JSONL (trừ khi FUNDS_TRACE=off) và trả về bản tóm tắt của lần chạy"""
+        if self.seconds is not None:
+            return self.summary()
+        self.seconds = time.perf_counter() - self.t0
+        if self.profiler is not None:
+            self.profiler.disable()
+            out = io.StringIO()
+            pstats.Stats(self.profiler, stream=out).sort_stats('cumulative').print_stats(PROFILE_TOP)
+            self.profile_text = out.getvalue()
+            os.makedirs(TRACE_DIR, exist_ok=True)
+            self.profiler.dump_stats(os.path.join(TRACE_DIR, f'{self.kind}-{self.run_id}.prof'))
+        if tracemalloc.is_tracing():
+            self.peak_mb = tracemalloc.get_traced_memory()[1] / 2**20
+            if self.own_tracemalloc:
+                tracemalloc.stop()
+        summary = self.summary()
+        if extra:
+            summary.update(extra)
+        if 'off' not in self.modes:
+            self.export(summary)
+        return summary
+
+    def summary(self):
+        return {'type': 'run', 'kind': self.kind, 'run': self.run_id, 'time': datetime.now().isoformat(timespec='seconds'),
+                'seconds': self.seconds, 'peak_mb': self.peak_mb, 'peak_rss_mb': peak_rss_mb(),
+                'counters': dict(self.counters)}
+
+    def stages(self):
+        """Bảng theo tên span: số lần, tổng / lớn nhất (ms), sắp theo tổng giảm dần"""
+        table = {}
+        for s in self.spans:
+            row = table.setdefault(s['name'], {'Stage': s['name'], 'Depth': s['depth'], 'Calls': 0, 'Total ms': 0.0, 'Max ms': 0.0})
+            row['Calls'] += 1
+            row['Total ms'] += s['seconds'] * 1000
+            row['Max ms'] = max(row['Max ms'], s['seconds'] * 1000)
+        return sorted(table.values(), key=lambda r: -r['Total ms'])
+
+    def export(self, summary):
+        """Ghi mỗi span một dòng JSON (kèm dòng tóm tắt của lần chạy) vào TRACE_LOG"""
+        try:
+            os.makedirs(os.path.dirname(self.log_path) or '.', exist_ok=True)
+            if os.path.exists(self.log_path) and os.path.getsize(self.log_path) > LOG_MAX_BYTES:
+                os.replace(self.log_path, self.log_path + '.1')
+            with open(self.log_path, 'a') as f:
+                for s in self.spans:
+                    f.write(json.dumps({'type': 'span', 'kind': self.kind, 'run': self.run_id, **s}, default=str) + '\n')
+                f.write(json.dumps(summary, default=str) + '\n')
+        except OSError as e:
+            print(f"⚠️ Không ghi được trace log: {e}")
+
+    def report(self):
+        """Bảng text các giai đoạn (cho script dòng lệnh)"""
+        lines = [f"⏱️ {self.kind}: {self.seconds or time.perf_counter() - self.t0:.2f}s"]
+        for row in self.stages():
+            calls = '' if row['Calls'] == 1 else f" (x{row['Calls']})"
+            lines.append(f"   {row['Stage']:<28} {row['Total ms']:>10.1f} ms{calls}")
+        return '\n'.join(lines)
+
+
+def read_log(path=TRACE_LOG, kind=None, limit=None):
+    """Đọc lại log JSONL: (danh sách span, danh sách tóm tắt lần chạy)"""
+    spans, runs = [], []
+    if not os.path.exists(path):
+        return spans, runs
+    with open(path) as f:
+        for line in f:
+            rec = json.loads(line)
+            if kind and rec.get('kind') != kind:
+                continue
+            (runs if rec.get('type') == 'run' else spans).append(rec)
+    if limit:
+        keep = {r['run'] for r in runs[-limit:]}
+        spans, runs = [s for s in spans if s['run'] in keep], runs[-limit:]
+    return spans, runs
@@ -0,0 +1,87 @@
+import sys
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+# Giới hạn mặc định của bộ nhớ đệm tính toán dùng chung giữa các phiên
+MAX_ITEMS = 512
+MAX_BYTES = 256 * 1024 * 1024
+
+
+def sizeof(obj):
+    """Ước lượng dung lượng (byte) của kết quả tính toán"""
+    if isinstance(obj, (pd.DataFrame, pd.Series)):
+        usage = obj.memory_usage(index=True, deep=False)
+        return int(usage.sum() if isinstance(usage, pd.Series) else usage)
+    if isinstance(obj, np.ndarray):
+        return int(obj.nbytes)
+    if isinstance(obj, (tuple, list)):
+        return sys.getsizeof(obj) + sum(sizeof(o) for o in obj)
+    if isinstance(obj, dict):
+        return sys.getsizeof(obj) + sum(sizeof(v) for v in obj.values())
+    return sys.getsizeof(obj)
+
+
+class Memo:
+    """Bộ nhớ đệm LRU giới hạn theo số mục và tổng dung lượng, có đếm hit/miss.
+
+    Khóa nên chứa phiên bản dữ liệu (TickStore.version) để dữ liệu mới tự vô hiệu hóa kết quả cũ.
+    Kết quả được dùng chung giữa các phiên nên phải coi là chỉ đọc.
+    """
+
+    def __init__(self, max_items=MAX_ITEMS, max_bytes=MAX_BYTES):
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+        self.data = OrderedDict()
+        self.sizes = {}
+        self.bytes = 0
+        self.hits = self.misses = self.evictions = 0
+        self.lock = threading.RLock()
+
+    def get(self, key, compute):
+        """Trả kết quả đã lưu cho key, hoặc gọi compute() rồi lưu lại"""
+        with self.lock:
+            if key in self.data:
+                self.hits += 1
+                self.data.move_to_end(key)
+                return self.data[key]
+            self.misses += 1
+        value = compute()
+        self.put(key, value)
+        return value
+
+    def put(self, key, value):
+        size = sizeof(value)
+        with self.lock:
+            if key in self.data:
+                self.bytes -= self.sizes.pop(key)
+                del self.data[key]
+            if size > self.max_bytes:
+                return  # Quá lớn, không lưu
+            self.data[key] = value
+            self.sizes[key] = size
+            self.bytes += size
+            while len(self.data) > self.max_items or self.bytes > self.max_bytes:
+                old, _ = self.data.popitem(last=False)
+                self.bytes -= self.sizes.pop(old)
+                self.evictions += 1
+
+    def invalidate(self, version=None):
+        """Xóa toàn bộ, hoặc chỉ các khóa không chứa phiên bản dữ liệu hiện tại"""
+        with self.lock:
+            stale = [k for k in self.data if version is None or version not in k]
+            for k in stale:
+                self.bytes -= self.sizes.pop(k)
+                del self.data[k]
+            return len(stale)
+
+    def stats(self):
+        with self.lock:
+            total = self.hits + self.misses
+            return {
+                'items': len(self.data), 'bytes': self.bytes,
+                'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions,
+                'hit_rate': self.hits / total if total else 0.0,
+            }
@@ -20,39 +20,154 @@ def calculate_max_drawdown(df):
     dd = calculate_drawdown(df)
     return dd.min()
 
-def calculate_risk_metrics(daily_ret, risk_free_rate=0.0):
-    """Tính toán nhóm chỉ số Rủi ro & Hiệu suất (Risk Dimensions)"""
-    if daily_ret.empty: return pd.Series()
-    
-    # 1. Return
-    ann_ret = daily_ret.mean() * TRADING_DAYS
-    
-    # 2. Volatility
-    ann_vol = daily_ret.std() * np.sqrt(TRADING_DAYS)
-    
-    # 3. Downside Deviation (Rủi ro giảm giá)
-    neg_ret = daily_ret[daily_ret < 0]
-    downside_dev = neg_ret.std() * np.sqrt(TRADING_DAYS)
-    
-    # 4. Ratios
-    sharpe = (ann_ret - risk_free_rate) / ann_vol if ann_vol != 0 else 0
-    sortino = (ann_ret - risk_free_rate) / downside_dev if downside_dev != 0 else 0
-    
-    # 5. Max Drawdown (Tính xấp xỉ từ chuỗi return)
-    cum_ret = (1 + daily_ret).cumprod()
-    dd = calculate_max_drawdown(cum_ret)
-    
-    # 6. Calmar Ratio
-    calmar = ann_ret / abs(dd) if dd != 0 else 0
-    
-    return pd.Series({
+RISK_COLUMNS = ["Ann. Return", "Volatility", "Downside Deviation", "Max Drawdown",
+                "Sharpe Ratio", "Sortino Ratio", "Calmar Ratio"]
+
+def _safe_ratio(num, den):
+    """num / den, trả 0 khi den == 0 (giữ NaN nếu den là NaN)"""
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(den != 0, num / den, 0.0)
+
+def risk_metrics_matrix(returns, risk_free_rate=0.0):
+    """Tính toàn bộ nhóm chỉ số Rủi ro & Hiệu suất cho mọi cột trong một lượt NumPy.
+
+    returns: ma trận (ngày x quỹ), NaN = chưa niêm yết / không có dữ liệu (bỏ qua như pandas skipna).
+    Trả về dict tên chỉ số -> mảng theo cột.
+    """
+    R = np.asarray(returns, dtype=np.float64)
+    if R.ndim == 1:
+        R = R[:, None]
+    valid = ~np.isnan(R)
+    X = np.where(valid, R, 0.0)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        # 1. Return & 2. Volatility (ddof=1 như pandas)
+        n = valid.sum(axis=0)
+        mean = X.sum(axis=0) / n
+        var = (np.where(valid, R - mean, 0.0) ** 2).sum(axis=0) / (n - 1)
+
+        # 3. Downside Deviation: độ lệch chuẩn của các phiên giảm
+        neg = valid & (R < 0)
+        n_neg = neg.sum(axis=0)
+        neg_mean = np.where(neg, R, 0.0).sum(axis=0) / n_neg
+        neg_var = (np.where(neg, R - neg_mean, 0.0) ** 2).sum(axis=0) / (n_neg - 1)
+    var = np.where(n > 1, var, np.nan)
+    neg_var = np.where(n_neg > 1, neg_var, np.nan)
+
+    ann_ret = mean * TRADING_DAYS
+    ann_vol = np.sqrt(var) * np.sqrt(TRADING_DAYS)
+    downside_dev = np.sqrt(neg_var) * np.sqrt(TRADING_DAYS)
+
+    # 5. Max Drawdown trên chuỗi tài sản lũy kế (phiên NaN coi như lợi nhuận 0,
+    #    đỉnh chỉ tính từ phiên có dữ liệu đầu tiên như cumprod/cummax của pandas)
+    wealth = np.cumprod(1.0 + X, axis=0)
+    started = np.logical_or.accumulate(valid, axis=0)
+    peak = np.maximum.accumulate(np.where(started, wealth, -np.inf), axis=0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        dd = np.where(started, (wealth - peak) / peak, np.inf)
+    max_dd = dd.min(axis=0) if len(R) else np.full(R.shape[1], np.inf)
+    max_dd = np.where(n > 0, max_dd, np.nan)
+
+    # 4 & 6. Ratios
+    return {
         "Ann. Return": ann_ret,
         "Volatility": ann_vol,
-        "Max Drawdown": dd,
-        "Sharpe Ratio": sharpe,
-        "Sortino Ratio": sortino,
-        "Calmar Ratio": calmar
-    })
+        "Downside Deviation": downside_dev,
+        "Max Drawdown": max_dd,
+        "Sharpe Ratio": _safe_ratio(ann_ret - risk_free_rate, ann_vol),
+        "Sortino Ratio": _safe_ratio(ann_ret - risk_free_rate, downside_dev),
+        "Calmar Ratio": _safe_ratio(ann_ret, np.abs(max_dd)),
+    }
+
+def calculate_risk_metrics(daily_ret, risk_free_rate=0.0):
+    """Tính toán nhóm chỉ số Rủi ro & Hiệu suất (Risk Dimensions)
+
+    Series -> Series các chỉ số; DataFrame -> DataFrame (quỹ x chỉ số), tính vector hóa cho mọi cột.
+    """
+    if daily_ret.empty: return pd.Series(dtype=float) if isinstance(daily_ret, pd.Series) else pd.DataFrame(columns=RISK_COLUMNS)
+    res = risk_metrics_matrix(daily_ret.to_numpy(), risk_free_rate)
+    if isinstance(daily_ret, pd.Series):
+        return pd.Series({k: float(v[0]) for k, v in res.items()})
+    return pd.DataFrame(res, index=daily_ret.columns)[RISK_COLUMNS]
+
+REGRESSION_COLUMNS = ["Beta", "Alpha", "R2", "Upside Capture", "Downside Capture", "Bull", "Bear", "Obs"]
+
+def regression_matrix(returns, bench_returns):
+    """Beta/Alpha/R²/Capture/Bull-Bear cho mọi quỹ trong một lượt vector hóa.
+
+    returns: DataFrame (ngày x quỹ). bench_returns: Series (một benchmark chung)
+    hoặc DataFrame cùng cột với returns (benchmark riêng của từng quỹ).
+    Mỗi cặp quỹ/benchmark chỉ dùng các phiên cả hai đều có dữ liệu (pairwise-complete).
+    Alpha theo năm; Bull/Bear là lợi nhuận trung bình năm (%) khi benchmark tăng/giảm.
+    """
+    A = returns.to_numpy(dtype=np.float64)
+    if isinstance(bench_returns, pd.DataFrame):
+        B = bench_returns.reindex(index=returns.index, columns=returns.columns).to_numpy(dtype=np.float64)
+    else:
+        B = bench_returns.reindex(returns.index).to_numpy(dtype=np.float64)[:, None]
+    mask = ~np.isnan(A) & ~np.isnan(B)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        n = mask.sum(axis=0)
+        a = np.where(mask, A, 0.0)
+        b = np.where(mask, B, 0.0)
+        mean_a, mean_b = a.sum(axis=0) / n, b.sum(axis=0) / n
+        da = np.where(mask, A - mean_a, 0.0)
+        db = np.where(mask, B - mean_b, 0.0)
+        cov = (da * db).sum(axis=0) / (n - 1)
+        var_a = (da ** 2).sum(axis=0) / (n - 1)
+        var_b = (db ** 2).sum(axis=0) / (n - 1)
+        beta = _safe_ratio(cov, var_b)
+        alpha = (mean_a - beta * mean_b) * TRADING_DAYS
+        r2 = cov ** 2 / (var_a * var_b)
+
+        up, down = mask & (B > 0), mask & (B < 0)
+        a_up = np.where(up, A, 0.0).sum(axis=0) / up.sum(axis=0)
+        b_up = np.where(up, B, 0.0).sum(axis=0) / up.sum(axis=0)
+        a_down = np.where(down, A, 0.0).sum(axis=0) / down.sum(axis=0)
+        b_down = np.where(down, B, 0.0).sum(axis=0) / down.sum(axis=0)
+
+    res = pd.DataFrame({
+        "Beta": np.where(n > 1, beta, np.nan),
+        "Alpha": np.where(n > 1, alpha, np.nan),
+        "R2": np.where(n > 1, r2, np.nan),
+        "Upside Capture": a_up / b_up * 100,
+        "Downside Capture": a_down / b_down * 100,
+        "Bull": np.nan_to_num(a_up * TRADING_DAYS * 100),
+        "Bear": np.nan_to_num(a_down * TRADING_DAYS * 100),
+        "Obs": n,
+    }, index=returns.columns)
+    return res[REGRESSION_COLUMNS]
+
+def resolve_benchmarks(tickers, df_profile, available, default='VNINDEX'):
+    """Benchmark của từng mã theo cột Benchmark trong funds_profile.csv.
+
+    Dùng default khi mã không có benchmark hoặc benchmark chưa có dữ liệu giá;
+    default cũng chưa có dữ liệu thì dùng mã đầu tiên trong available.
+    """
+    available = list(available)
+    if default not in available:
+        default = available[0] if available else None
+    mapping = {}
+    for ticker in tickers:
+        own = df_profile['Benchmark'].get(ticker) if 'Benchmark' in df_profile else None
+        mapping[ticker] = own if isinstance(own, str) and own in available else default
+    return mapping
+
+def benchmark_matrix(prices_or_returns, mapping):
+    """DataFrame cùng cột với mapping, mỗi cột là chuỗi của benchmark tương ứng"""
+    return pd.DataFrame({t: prices_or_returns[b] for t, b in mapping.items()}, index=prices_or_returns.index)
+
+def calculate_beta_alpha(asset_ret, bench_ret):
+    """Beta & Alpha (năm) của một quỹ so với benchmark"""
+    res = regression_matrix(asset_ret.to_frame(), bench_ret).iloc[0]
+    if res["Obs"] == 0: return 0, 0
+    return res["Beta"], res["Alpha"]
+
+def calculate_bull_bear_stats(asset_ret, bench_ret):
+    """Lợi nhuận trung bình năm (%) của quỹ khi benchmark tăng / giảm"""
+    res = regression_matrix(asset_ret.to_frame(), bench_ret).iloc[0]
+    return res["Bull"], res["Bear"]
 
 def calculate_rolling_beta(asset_ret, market_ret, window=63):
     """Tính Beta trượt (Rolling Beta)"""
@@ -0,0 +1,233 @@
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from correlation import pairwise_corr
+from metrics import TRADING_DAYS
+
+# Tối ưu danh mục trên ma trận hiệp phương sai của daily_ret: đường biên hiệu quả, Min Variance,
+# Max Sharpe, Risk Parity. Mọi điểm trên đường biên được giải cùng lúc (một ma trận K x N nghiệm),
+# dùng lại một lần phân rã của Σ (trị riêng cho long-only, Cholesky cho không giới hạn).
+SHRINK = ('constant_corr', 'ledoit_wolf', 'none')
+PRIOR = 63          # Số phiên "giả" kéo tương quan / lợi nhuận của quỹ lịch sử ngắn về mức chung (constant_corr)
+MIN_OBS = 20        # Quỹ ít phiên hơn bị loại khỏi tối ưu
+MIN_FUNDS = 2       # Còn ít quỹ hơn sau khi loại thì không có đường biên
+N_POINTS = 40       # Số điểm trên đường biên
+MAX_ITER = 3000
+TOL = 1e-10
+RF = 0.0            # Lãi suất phi rủi ro (năm), giống risk_free_rate mặc định của metrics.py
+
+
+def _observed(returns):
+    R = returns.to_numpy(dtype=np.float64)
+    mask = ~np.isnan(R)
+    return R, mask, mask.sum(axis=0)
+
+
+def ledoit_wolf_intensity(Z):
+    """Hệ số co Ledoit-Wolf (2004) về ma trận đơn vị cho dữ liệu chuẩn hóa Z (phiên x mã, thiếu = 0)"""
+    T, N = Z.shape
+    S = Z.T @ Z / T
+    mu = np.trace(S) / N
+    delta = ((S - mu * np.eye(N)) ** 2).sum() / N
+    # sum_t ||z_t z_t' - S||² = sum_t ||z_t||⁴ - T ||S||²
+    beta = ((np.einsum('ij,ij->i', Z, Z) ** 2).sum() - T * (S ** 2).sum()) / (N * T ** 2)
+    return float(np.clip(min(beta, delta) / delta, 0.0, 1.0)) if delta > 0 else 1.0
+
+
+def nearest_psd(cov, floor=1e-10):
+    """Cắt trị riêng âm (ma trận pairwise-complete có thể không bán xác định dương)"""
+    vals, vecs = np.linalg.eigh((cov + cov.T) / 2)
+    vals = np.maximum(vals, floor * max(vals.max(), floor))
+    return (vecs * vals) @ vecs.T
+
+
+def estimate(returns, shrink='constant_corr', prior=PRIOR):
+    """Lợi nhuận kỳ vọng (năm) và hiệp phương sai (năm) từ lợi nhuận ngày có NaN (quỹ ra mắt so le).
+
+    Mỗi quỹ dùng độ lệch chuẩn / trung bình trên các phiên của chính nó, tương quan pairwise-complete.
+    shrink='constant_corr': mỗi cặp co về tương quan trung bình theo số phiên chung n_ij,
+    rho_ij = (n_ij rho_ij + prior rho_tb) / (n_ij + prior); lợi nhuận co về trung bình chung tương tự.
+    shrink='ledoit_wolf': co ma trận tương quan về ma trận đơn vị với hệ số Ledoit-Wolf.
+    Trả về (mu Series, cov DataFrame, info dict).
+    """
+    if shrink not in SHRINK:
+        raise ValueError(f"shrink phải là một trong {SHRINK}")
+    R, mask, n_obs = _observed(returns)
+    keep = n_obs >= MIN_OBS
+    cols = returns.columns[keep]
+    R, mask, n_obs = R[:, keep], mask[:, keep], n_obs[keep]
+    if not len(cols):
+        info = {'shrink': shrink, 'intensity': 0.0, 'rho_bar': np.nan, 'dropped': list(returns.columns),
+                'obs': pd.Series(n_obs, index=cols)}
+        return pd.Series(dtype=np.float64, index=cols), pd.DataFrame(index=cols, columns=cols, dtype=np.float64), info
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = np.nanmean(R, axis=0)
+        std = np.nanstd(R, axis=0, ddof=1)
+    corr = pairwise_corr(pd.DataFrame(R, columns=cols)).to_numpy()
+    pairs = mask.T.astype(np.float64) @ mask.astype(np.float64)   # Số phiên chung của từng cặp
+    corr = np.where(np.isnan(corr), 0.0, corr)
+    np.fill_diagonal(corr, 1.0)
+    off = ~np.eye(len(cols), dtype=bool)
+    rho_bar = corr[off].mean() if off.any() else 0.0
+    intensity = 0.0
+
+    if shrink == 'constant_corr':
+        corr = np.where(off, (pairs * corr + prior * rho_bar) / (pairs + prior), 1.0)
+        mean = (n_obs * mean + prior * mean.mean()) / (n_obs + prior)
+    elif shrink == 'ledoit_wolf':
+        Z = np.where(mask, (R - mean) / std, 0.0)
+        intensity = ledoit_wolf_intensity(Z)
+        corr = (1 - intensity) * corr + intensity * np.eye(len(cols))
+
+    cov = nearest_psd(corr * np.outer(std, std)) * TRADING_DAYS
+    info = {'shrink': shrink, 'intensity': intensity, 'rho_bar': rho_bar, 'dropped': list(returns.columns[~keep]),
+            'obs': pd.Series(n_obs, index=cols)}
+    return pd.Series(mean * TRADING_DAYS, index=cols), pd.DataFrame(cov, index=cols, columns=cols), info
+
+
+def project_simplex(V):
+    """Chiếu từng dòng của V lên {w >= 0, sum w = 1} (thuật toán sắp xếp, vector hóa theo dòng)"""
+    U = -np.sort(-V, axis=1)
+    css = np.cumsum(U, axis=1) - 1
+    k = np.arange(1, V.shape[1] + 1)
+    cond = U - css / k > 0
+    rho = V.shape[1] - 1 - np.argmax(cond[:, ::-1], axis=1)
+    theta = css[np.arange(len(V)), rho] / (rho + 1)
+    return np.maximum(V - theta[:, None], 0.0)
+
+
+def solve_long_only(mu, cov, lambdas, max_iter=MAX_ITER, tol=TOL):
+    """min w'Σw - λ μ'w trên simplex cho mọi λ cùng lúc (FISTA): mỗi vòng là một phép nhân (K x N) @ (N x N).
+
+    Bước 1/L với L = 2 λ_max(Σ) lấy từ một lần phân rã trị riêng.
+    """
+    lambdas = np.asarray(lambdas, dtype=np.float64)[:, None]
+    step = 1.0 / (2 * np.linalg.eigvalsh(cov)[-1])
+    W = np.full((len(lambdas), len(mu)), 1.0 / len(mu))
+    Y, t = W, 1.0
+    for _ in range(max_iter):
+        W_new = project_simplex(Y - step * (2 * Y @ cov - lambdas * mu))
+        t_new = (1 + np.sqrt(1 + 4 * t * t)) / 2
+        Y = W_new + (t - 1) / t_new * (W_new - W)
+        done = np.abs(W_new - W).max() < tol
+        W, t = W_new, t_new
+        if done:
+            break
+    return W
+
+
+def solve_unconstrained(mu, cov, n_points):
+    """Đường biên Markowitz dạng đóng (cho phép bán khống, sum w = 1) từ Min Variance tới lợi nhuận cao nhất.
+
+    Một lần Cholesky: Σ⁻¹[1 μ]; mọi điểm là tổ hợp tuyến tính của hai nghiệm đó.
+    """
+    from scipy.linalg import cho_factor, cho_solve
+    ones = np.ones(len(mu))
+    X = cho_solve(cho_factor(cov), np.column_stack([ones, mu]))   # N x 2
+    a, b, c = ones @ X[:, 0], ones @ X[:, 1], mu @ X[:, 1]
+    d = a * c - b * b
+    targets = np.linspace(b / a, max(mu.max(), b / a), n_points)
+    g, h = (c - b * targets) / d, (a * targets - b) / d
+    return g[:, None] * X[:, 0] + h[:, None] * X[:, 1]
+
+
+def risk_parity(cov, budget=None, max_iter=100, tol=1e-12):
+    """Đóng góp rủi ro bằng nhau (hoặc theo budget): Newton cho min ½y'Σy - b'log y, w = y / sum y"""
+    n = len(cov)
+    b = np.full(n, 1.0 / n) if budget is None else np.asarray(budget, dtype=np.float64) / np.sum(budget)
+    y = 1.0 / np.sqrt(np.diag(cov))
+    for _ in range(max_iter):
+        grad = cov @ y - b / y
+        step = np.linalg.solve(cov + np.diag(b / y ** 2), grad)
+        # Lùi bước để y luôn dương
+        alpha = 1.0
+        while np.any(y - alpha * step <= 0):
+            alpha /= 2
+        y = y - alpha * step
+        if np.abs(grad).max() < tol:
+            break
+    return y / y.sum()
+
+
+def portfolio_stats(W, mu, cov, rf=RF):
+    """Lợi nhuận, biến động (năm) và Sharpe của từng dòng tỷ trọng W (K x N)"""
+    W = np.atleast_2d(W)
+    ret = W @ mu
+    vol = np.sqrt(np.maximum(np.einsum('ij,jk,ik->i', W, cov, W), 0.0))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        sharpe = (ret - rf) / vol
+    return ret, vol, sharpe
+
+
+def frontier(mu, cov, n_points=N_POINTS, long_only=True):
+    """Các điểm trên đường biên hiệu quả: (bảng Return/Vol/Sharpe, ma trận tỷ trọng K x N)"""
+    mu_v, cov_v = np.asarray(mu, dtype=np.float64), np.asarray(cov, dtype=np.float64)
+    if long_only:
+        # λ = 0 là Min Variance; λ lớn dần tiến tới quỹ có lợi nhuận kỳ vọng cao nhất
+        spread = max(np.ptp(mu_v), 1e-12)
+        scale = 2 * np.trace(cov_v) / len(mu_v) / spread
+        lambdas = np.concatenate([[0.0], np.geomspace(1e-3, 1e3, n_points - 1) * scale])
+        W = solve_long_only(mu_v, cov_v, lambdas)
+    else:
+        W = solve_unconstrained(mu_v, cov_v, n_points)
+    ret, vol, sharpe = portfolio_stats(W, mu_v, cov_v)
+    order = np.argsort(vol)
+    table = pd.DataFrame({'Return': ret[order], 'Vol': vol[order], 'Sharpe': sharpe[order]})
+    return table, pd.DataFrame(W[order], columns=getattr(mu, 'index', None))
+
+
+def optimize(returns, shrink='constant_corr', n_points=N_POINTS, long_only=True):
+    """Đường biên và các danh mục đặc biệt cho lợi nhuận ngày `returns` (ngày x quỹ).
+
+    Trả về dict: mu, cov, info, frontier (Return/Vol/Sharpe), frontier_weights, portfolios
+    (Min Variance / Max Sharpe / Risk Parity x [Return, Vol, Sharpe, tỷ trọng từng quỹ]).
+    Max Sharpe lấy điểm có Sharpe cao nhất trên đường biên.
+    Còn ít hơn MIN_FUNDS quỹ đủ MIN_OBS phiên: frontier / portfolios rỗng (info['dropped'] liệt kê quỹ bị loại).
+    """
+    mu, cov, info = estimate(returns, shrink)
+    if len(mu) < MIN_FUNDS:
+        return {'mu': mu, 'cov': cov, 'info': info, 'frontier': pd.DataFrame(columns=['Return', 'Vol', 'Sharpe']),
+                'frontier_weights': pd.DataFrame(columns=mu.index),
+                'portfolios': pd.DataFrame(columns=['Return', 'Vol', 'Sharpe'] + list(mu.index))}
+    table, W = frontier(mu, cov, n_points, long_only)
+    special = {
+        'Min Variance': W.iloc[int(np.argmin(table['Vol']))].to_numpy(),
+        'Max Sharpe': W.iloc[int(np.nanargmax(table['Sharpe']))].to_numpy(),
+        'Risk Parity': risk_parity(cov.to_numpy()),
+    }
+    S = np.array(list(special.values()))
+    ret, vol, sharpe = portfolio_stats(S, mu.to_numpy(), cov.to_numpy())
+    portfolios = pd.DataFrame(S, index=list(special), columns=mu.index)
+    portfolios.insert(0, 'Sharpe', sharpe)
+    portfolios.insert(0, 'Vol', vol)
+    portfolios.insert(0, 'Return', ret)
+    return {'mu': mu, 'cov': cov, 'info': info, 'frontier': table, 'frontier_weights': W, 'portfolios': portfolios}
+
+
+if __name__ == "__main__":
+    import snapshot
+    import storage
+    from cube import PRESETS, preset_start
+
+    parser = argparse.ArgumentParser(description="Đường biên hiệu quả và danh mục tối ưu cho các quỹ đã chọn")
+    parser.add_argument('tickers', nargs='*', help="Mặc định: toàn bộ mã")
+    parser.add_argument('--preset', choices=PRESETS, default='3Y')
+    parser.add_argument('--shrink', choices=SHRINK, default='constant_corr')
+    parser.add_argument('--allow-short', action='store_true')
+    args = parser.parse_args()
+
+    store = storage.open_store(snapshot.resolve('ticks'))
+    if store is None:
+        parser.error("Chưa có dữ liệu, hãy chạy update_data.py trước")
+    tickers = args.tickers or list(store.tickers)
+    end_d = store.last_date()
+    prices = store.wide(tickers, preset_start(args.preset, end_d, store.first_date()), end_d)
+    res = optimize(prices.pct_change(), args.shrink, long_only=not args.allow_short)
+    if res['info']['dropped']:
+        print(f"⚠️ Bỏ qua (ít hơn {MIN_OBS} phiên): {', '.join(res['info']['dropped'])}")
+    if res['portfolios'].empty:
+        parser.exit(1, f"❌ Cần ít nhất {MIN_FUNDS} quỹ có đủ {MIN_OBS} phiên để tối ưu\n")
+    pd.set_option('display.width', 200)
+    print(res['portfolios'].round(3).T.to_string())
@@ -0,0 +1,161 @@
+import json
+import os
+import queue
+import subprocess
+import sys
+import threading
+import time
+import uuid
+
+import instrument
+
+# Cập nhật dữ liệu chạy nền: dashboard chỉ gửi yêu cầu rồi đọc tiến độ, không chờ tải xong
+PROGRESS_PATH = os.path.join(instrument.TRACE_DIR, 'refresh-progress.json')
+BUSY_EXIT = 75   # Mã thoát của update_data.py khi đang có tiến trình khác tạo snapshot (EX_TEMPFAIL)
+LOG_TAIL = 2000  # Số ký tự cuối của log hiển thị khi lỗi
+# Đường dẫn tuyệt đối tới script: dashboard có thể được chạy từ thư mục khác (dữ liệu vẫn theo thư mục làm việc)
+HERE = os.path.dirname(os.path.abspath(__file__))
+STEPS = [
+    ('update', [os.path.join(HERE, 'update_data.py'), '--no-wait']),
+    ('forecast', [os.path.join(HERE, 'forecast.py')]),
+]
+
+
+def write_json(obj, path):
+    """Ghi file tạm rồi os.replace: người đọc không bao giờ thấy JSON ghi dở"""
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp = path + '.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(obj, f, default=str)
+    os.replace(tmp, path)
+
+
+def read_progress(path=PROGRESS_PATH):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+class Progress:
+    """Tiến độ của update_data.py (chạy trong tiến trình con), ghi ra file JSON cho dashboard đọc"""
+
+    def __init__(self, path=PROGRESS_PATH, total=0, every=0.25):
+        self.path = path
+        self.every = every
+        self.last = 0.0
+        self.state = {'stage': 'start', 'total': total, 'done': 0, 'rows': 0, 'bytes': 0, 'errors': [],
+                      'started': time.time(), 'updated': time.time()}
+        self.lock = threading.Lock()
+        self.flush(force=True)
+
+    def stage(self, name):
+        with self.lock:
+            self.state['stage'] = name
+        self.flush(force=True)
+
+    def ticker(self, stat):
+        """Gọi từ luồng tải sau mỗi mã (fetcher.fetch_all(progress=...))"""
+        with self.lock:
+            self.state['done'] += 1
+            self.state['rows'] += int(stat.get('Rows') or 0)
+            self.state['bytes'] += int(stat.get('Bytes') or 0)
+            if stat.get('Error'):
+                self.state['errors'].append(f"{stat['Ticker']}: {stat['Error']}")
+        self.flush(force=self.state['done'] == self.state['total'])
+
+    def set_total(self, total):
+        with self.lock:
+            self.state['total'] = total
+        self.flush(force=True)
+
+    def flush(self, force=False):
+        now = time.time()
+        if not force and now - self.last < self.every:
+            return
+        with self.lock:
+            self.state['updated'] = now
+            state = dict(self.state, errors=list(self.state['errors']))
+        self.last = now
+        write_json(state, self.path)
+
+
+class RefreshWorker:
+    """Một luồng nền chạy lần lượt các job cập nhật (mỗi bước là một tiến trình con).
+
+    Single-flight: khi đã có job đang chờ / đang chạy, yêu cầu mới được gộp vào job đó.
+    Giữa các tiến trình (vd. cron chạy update_data.py cùng lúc) khóa snapshot quyết định; bị chiếm thì
+    job kết thúc với trạng thái 'rejected'.
+    """
+
+    def __init__(self, steps=STEPS, progress_path=PROGRESS_PATH, cwd=None):
+        self.steps = steps
+        self.progress_path = progress_path
+        self.cwd = cwd
+        self.lock = threading.Lock()
+        self.queue = queue.Queue()
+        self.current = None
+        self.history = []
+        self.thread = threading.Thread(target=self._loop, name='refresh-worker', daemon=True)
+        self.thread.start()
+
+    def submit(self):
+        """(job, coalesced): coalesced=True nghĩa là đã gộp vào job đang chờ / chạy"""
+        with self.lock:
+            if self.current is not None and self.current['state'] in ('queued', 'running'):
+                self.current['coalesced'] += 1
+                return dict(self.current), True
+            job = {'id': uuid.uuid4().hex[:8], 'state': 'queued', 'step': None, 'submitted': time.time(),
+                   'started': None, 'finished': None, 'coalesced': 0, 'error': None, 'log': None}
+            self.current = job
+            self.queue.put(job)
+            return dict(job), False
+
+    def status(self):
+        """Bản sao job gần nhất kèm tiến độ đọc từ file (None nếu chưa có job nào)"""
+        with self.lock:
+            if self.current is None:
+                return None
+            job = dict(self.current)
+        if job['state'] == 'running' and job['step'] == 'update':
+            job['progress'] = read_progress(self.progress_path)
+        return job
+
+    def _set(self, job, **fields):
+        with self.lock:
+            job.update(fields)
+
+    def _loop(self):
+        while True:
+            job = self.queue.get()
+            try:
+                self._run(job)
+            except Exception as e:  # Luồng nền không được chết
+                self._set(job, state='failed', error=f"{type(e).__name__}: {e}", finished=time.time())
+            with self.lock:
+                self.history = (self.history + [dict(job)])[-20:]
+
+    def _run(self, job):
+        self._set(job, state='running', started=time.time())
+        os.makedirs(instrument.TRACE_DIR, exist_ok=True)
+        log_path = os.path.join(instrument.TRACE_DIR, f"refresh-{job['id']}.log")
+        self._set(job, log=log_path)
+        for step, args in self.steps:
+            self._set(job, step=step)
+            cmd = [sys.executable] + args
+            if step == 'update':
+                cmd += ['--progress', self.progress_path]
+                if os.path.exists(self.progress_path):
+                    os.remove(self.progress_path)
+            with open(log_path, 'a') as log:
+                code = subprocess.call(cmd, stdout=log, stderr=subprocess.STDOUT, cwd=self.cwd)
+            if code == BUSY_EXIT:
+                self._set(job, state='rejected', error="Đang có tiến trình khác cập nhật dữ liệu", finished=time.time())
+                return
+            if code != 0:
+                with open(log_path) as f:
+                    tail = f.read()[-LOG_TAIL:]
+                self._set(job, state='failed', error=f"{step} exit {code}\n{tail}", finished=time.time())
+                return
+        self._set(job, state='done', finished=time.time())
@@ -0,0 +1,100 @@
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+import snapshot
+import storage
+from cube import BENCH, CUBE_COLUMNS, PRESETS, preset_start, window_metrics
+from metrics import calculate_returns
+
+# Báo cáo rủi ro hàng đêm: mọi mã x mọi preset, không cần khởi động Streamlit
+REPORT_DIR = 'reports'
+FORMATS = ('csv', 'parquet', 'json')
+
+
+def preset_report(preset, prices, bench):
+    """(preset, bảng mã x chỉ số, ma trận tương quan) cho một khung thời gian"""
+    daily_ret = calculate_returns(prices)
+    table = window_metrics(daily_ret, daily_ret[bench])
+    return preset, table, daily_ret.corr()
+
+
+def _preset_task(args):
+    """Hàm chạy trong process con (phải ở cấp module để pickle được)"""
+    t0 = time.perf_counter()
+    preset, table, corr = preset_report(*args)
+    return preset, table, corr, time.perf_counter() - t0
+
+
+def write_table(df, path, fmt):
+    if fmt == 'csv':
+        df.to_csv(path + '.csv')
+    elif fmt == 'parquet':
+        df.to_parquet(path + '.parquet')
+    else:
+        df.to_json(path + '.json', orient='split', date_format='iso', indent=1)
+
+
+def run_report(store, presets=PRESETS, bench=BENCH, jobs=1, out_dir=REPORT_DIR, formats=('csv',)):
+    """Tính toàn bộ bảng chỉ số và tương quan theo từng preset rồi ghi ra out_dir.
+
+    Dữ liệu giá được đọc một lần; mỗi preset là một lát cắt của cùng bảng wide.
+    Trả về dict thời gian (giây) của từng giai đoạn.
+    """
+    timings = {}
+    t0 = time.perf_counter()
+    tickers = store.tickers
+    bench = bench if bench in tickers else tickers[0]
+    prices = store.wide(tickers)
+    end_d, first_d = store.last_date(), store.first_date()
+    timings['load'] = time.perf_counter() - t0
+    print(f"📂 Đã đọc {len(tickers)} mã x {len(prices)} phiên ({timings['load']:.2f}s)")
+
+    tasks = [(p, prices.loc[preset_start(p, end_d, first_d):end_d], bench) for p in presets]
+    t0 = time.perf_counter()
+    if jobs > 1 and len(tasks) > 1:
+        with ProcessPoolExecutor(max_workers=min(jobs, len(tasks))) as pool:
+            results = list(pool.map(_preset_task, tasks))
+    else:
+        results = [_preset_task(task) for task in tasks]
+    timings['compute'] = time.perf_counter() - t0
+    for preset, _, _, seconds in results:
+        timings[f'compute.{preset}'] = seconds
+        print(f"   -> {preset}: {seconds:.2f}s")
+
+    t0 = time.perf_counter()
+    os.makedirs(out_dir, exist_ok=True)
+    table = pd.concat({preset: tbl for preset, tbl, _, _ in results}, names=['Preset', 'Ticker'])[CUBE_COLUMNS]
+    for fmt in formats:
+        write_table(table, os.path.join(out_dir, 'metrics'), fmt)
+        for preset, _, corr, _ in results:
+            write_table(corr, os.path.join(out_dir, f'corr_{preset}'), fmt)
+    timings['write'] = time.perf_counter() - t0
+
+    meta = {'version': store.version, 'bench': bench, 'end': str(end_d.date()), 'presets': list(presets),
+            'tickers': tickers, 'formats': list(formats), 'jobs': jobs, 'timings': timings}
+    with open(os.path.join(out_dir, 'report.json'), 'w') as f:
+        json.dump(meta, f, indent=1)
+    print(f"💾 Đã ghi báo cáo vào {out_dir}/ (load {timings['load']:.2f}s, compute {timings['compute']:.2f}s, "
+          f"write {timings['write']:.2f}s)")
+    return timings
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Xuất bảng rủi ro / beta / tracking error / tương quan cho mọi ETF x mọi preset")
+    parser.add_argument('--jobs', type=int, default=1, help="Số process song song (mỗi preset một tác vụ)")
+    parser.add_argument('--out', default=REPORT_DIR, help="Thư mục kết quả")
+    parser.add_argument('--format', nargs='+', choices=FORMATS, default=['csv'], help="Định dạng đầu ra")
+    parser.add_argument('--presets', nargs='+', choices=PRESETS, default=PRESETS)
+    parser.add_argument('--bench', default=BENCH, help="Mã benchmark cho Beta/Alpha/Tracking Error")
+    args = parser.parse_args()
+    if 'parquet' in args.format and not storage.HAS_ARROW:
+        parser.error("Định dạng parquet cần pyarrow")
+    store = storage.open_store(snapshot.resolve('ticks'))
+    if store is None:
+        parser.error("Chưa có dữ liệu, hãy chạy update_data.py trước")
+    run_report(store, args.presets, args.bench, args.jobs, args.out, args.format)
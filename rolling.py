@@ -0,0 +1,309 @@
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+import snapshot
+import storage
+from metrics import TRADING_DAYS
+
+# Thống kê trượt tính sẵn trên toàn bộ lịch sử, cập nhật tiến dần khi có phiên mới
+ROLLING_PATH = os.path.join(storage.DATA_DIR, 'rolling.npz')
+MA_WINDOWS = (50, 200)
+TE_WINDOW = 63
+# MA theo từng mã; TE / Beta / tương quan theo từng quỹ so với benchmark riêng của quỹ (tracking.benchmark_pairs)
+OUTPUTS = [f"MA{w}" for w in MA_WINDOWS]
+PAIR_OUTPUTS = ["TE", "Beta", "Corr"]
+
+
+class RollingMoments:
+    """Mean / var / cov trượt (cửa sổ cố định) cho n cột, mỗi tick cập nhật O(1) theo kiểu Welford thêm/bớt.
+
+    Giống pandas rolling(window) với min_periods=window: kết quả NaN nếu cửa sổ còn thiếu / chứa NaN.
+    paired=True theo dõi thêm chuỗi y để tính cov(x, y). Trạng thái lưu/khôi phục qua state()/from_state().
+    """
+
+    def __init__(self, window, n, paired=False):
+        self.window = int(window)
+        self.paired = paired
+        self.buf_x = np.full((self.window, n), np.nan)
+        self.buf_y = np.full((self.window, n), np.nan) if paired else None
+        self.pos = 0
+        self.count = np.zeros(n, dtype=np.int64)
+        self.mean_x = np.zeros(n)
+        self.m2_x = np.zeros(n)
+        self.mean_y = np.zeros(n)
+        self.m2_y = np.zeros(n)
+        self.c_xy = np.zeros(n)
+
+    def push(self, x, y=None):
+        """Đẩy một dòng mới vào cửa sổ, bỏ dòng cũ nhất"""
+        x = np.asarray(x, dtype=np.float64)
+        y = np.asarray(y, dtype=np.float64) if self.paired else None
+        old_x = self.buf_x[self.pos]
+        old_y = self.buf_y[self.pos] if self.paired else None
+        with np.errstate(invalid='ignore', divide='ignore'):
+            # Bớt điểm cũ: M2_{n-1} = M2_n - (x - m_{n-1})(x - m_n)
+            drop = ~np.isnan(old_x)
+            if self.paired:
+                drop &= ~np.isnan(old_y)
+            if drop.any():
+                n1 = self.count - drop
+                mx = np.where(drop & (n1 > 0), self.mean_x - (old_x - self.mean_x) / n1, self.mean_x)
+                self.m2_x = np.where(drop, self.m2_x - (old_x - mx) * (old_x - self.mean_x), self.m2_x)
+                if self.paired:
+                    my = np.where(drop & (n1 > 0), self.mean_y - (old_y - self.mean_y) / n1, self.mean_y)
+                    self.m2_y = np.where(drop, self.m2_y - (old_y - my) * (old_y - self.mean_y), self.m2_y)
+                    self.c_xy = np.where(drop, self.c_xy - (old_x - mx) * (old_y - self.mean_y), self.c_xy)
+                    self.mean_y = my
+                self.mean_x, self.count = mx, n1
+                self._reset(self.count == 0)
+
+            # Thêm điểm mới: M2_n = M2_{n-1} + (x - m_{n-1})(x - m_n)
+            add = ~np.isnan(x)
+            if self.paired:
+                add &= ~np.isnan(y)
+            if add.any():
+                n = self.count + add
+                dx = np.where(add, x - self.mean_x, 0.0)
+                mx = self.mean_x + np.where(add, dx / np.maximum(n, 1), 0.0)
+                self.m2_x = self.m2_x + np.where(add, dx * (x - mx), 0.0)
+                if self.paired:
+                    dy = np.where(add, y - self.mean_y, 0.0)
+                    my = self.mean_y + np.where(add, dy / np.maximum(n, 1), 0.0)
+                    self.m2_y = self.m2_y + np.where(add, dy * (y - my), 0.0)
+                    self.c_xy = self.c_xy + np.where(add, dx * (y - my), 0.0)
+                    self.mean_y = my
+                self.mean_x, self.count = mx, n
+
+        self.buf_x[self.pos] = np.where(np.isnan(x) | (np.isnan(y) if self.paired else False), np.nan, x)
+        if self.paired:
+            self.buf_y[self.pos] = np.where(np.isnan(x) | np.isnan(y), np.nan, y)
+        self.pos = (self.pos + 1) % self.window
+
+    def _reset(self, mask):
+        """Cửa sổ rỗng -> đưa tích lũy về 0 để không trôi số"""
+        if mask.any():
+            for name in ('mean_x', 'm2_x', 'mean_y', 'm2_y', 'c_xy'):
+                getattr(self, name)[mask] = 0.0
+
+    @property
+    def ready(self):
+        return self.count == self.window
+
+    @property
+    def mean(self):
+        return np.where(self.ready, self.mean_x, np.nan)
+
+    @property
+    def var(self):
+        return np.where(self.ready, np.maximum(self.m2_x, 0.0) / (self.window - 1), np.nan)
+
+    @property
+    def std(self):
+        return np.sqrt(self.var)
+
+    @property
+    def var_y(self):
+        return np.where(self.ready, np.maximum(self.m2_y, 0.0) / (self.window - 1), np.nan)
+
+    @property
+    def cov(self):
+        return np.where(self.ready, self.c_xy / (self.window - 1), np.nan)
+
+    def state(self):
+        """Trạng thái dạng dict mảng (để lưu checkpoint)"""
+        out = {'window': np.array(self.window), 'paired': np.array(self.paired), 'pos': np.array(self.pos),
+               'buf_x': self.buf_x, 'count': self.count, 'mean_x': self.mean_x, 'm2_x': self.m2_x,
+               'mean_y': self.mean_y, 'm2_y': self.m2_y, 'c_xy': self.c_xy}
+        if self.paired:
+            out['buf_y'] = self.buf_y
+        return out
+
+    @classmethod
+    def from_state(cls, state):
+        obj = cls(int(state['window']), len(state['count']), bool(state['paired']))
+        obj.pos = int(state['pos'])
+        for name in ('buf_x', 'buf_y', 'count', 'mean_x', 'm2_x', 'mean_y', 'm2_y', 'c_xy'):
+            if name in state:
+                setattr(obj, name, np.array(state[name]))
+        return obj
+
+
+def _run(x, window, y=None, field='mean'):
+    """Chạy engine qua toàn bộ ma trận x (ngày x cột), trả ma trận kết quả cùng kích thước"""
+    x = np.asarray(x, dtype=np.float64)
+    y = None if y is None else np.asarray(y, dtype=np.float64)
+    eng = RollingMoments(window, x.shape[1], paired=y is not None)
+    out = np.empty_like(x)
+    for i in range(len(x)):
+        eng.push(x[i], None if y is None else y[i])
+        out[i] = getattr(eng, field)
+    return out
+
+
+def _apply(obj, window, field, other=None):
+    frame = obj.to_frame() if isinstance(obj, pd.Series) else obj
+    y = None
+    if other is not None:
+        y = np.broadcast_to(np.asarray(other, dtype=np.float64).reshape(len(frame), -1), frame.shape)
+    out = pd.DataFrame(_run(frame.to_numpy(), window, y, field), index=frame.index, columns=frame.columns)
+    return out.iloc[:, 0].rename(obj.name) if isinstance(obj, pd.Series) else out
+
+
+def rolling_mean(obj, window):
+    """Tương đương obj.rolling(window).mean()"""
+    return _apply(obj, window, 'mean')
+
+
+def rolling_std(obj, window):
+    """Tương đương obj.rolling(window).std()"""
+    return _apply(obj, window, 'std')
+
+
+def rolling_cov(obj, other, window):
+    """Tương đương obj.rolling(window).cov(other), other là Series dùng chung cho mọi cột"""
+    return _apply(obj, window, 'cov', other)
+
+
+def tracking_error(asset_ret, bench_ret, window=TE_WINDOW):
+    """Tracking Error trượt năm hóa (%) so với một benchmark chung (theo benchmark riêng của từng quỹ: tracking.py)"""
+    return rolling_std(asset_ret.sub(bench_ret, axis=0), window) * np.sqrt(TRADING_DAYS) * 100
+
+
+def rolling_beta(asset_ret, market_ret, window=TE_WINDOW):
+    """Beta trượt, như metrics.calculate_rolling_beta"""
+    cov = rolling_cov(asset_ret, market_ret, window)
+    var = rolling_std(market_ret, window) ** 2
+    return cov / var if isinstance(cov, pd.Series) else cov.div(var, axis=0)
+
+
+# ------------------------------------------------------------------
+# Cache thống kê trượt theo toàn bộ lịch sử của TickStore
+# ------------------------------------------------------------------
+def _engines(n, m):
+    eng = {f"MA{w}": RollingMoments(w, n) for w in MA_WINDOWS}
+    eng["TE"] = RollingMoments(TE_WINDOW, m)                 # Chênh lệch lợi nhuận quỹ - benchmark
+    eng["Beta"] = RollingMoments(TE_WINDOW, m, paired=True)  # (quỹ, benchmark): Beta và tương quan
+    return eng
+
+
+def _advance(cache, prices):
+    """Đẩy các dòng giá mới qua mọi engine (O(1) mỗi mã mỗi phiên), nối kết quả vào cache"""
+    eng = cache['engines']
+    X = prices[cache['tickers']].to_numpy(dtype=np.float64)
+    # Lợi nhuận như calculate_returns (pct_change trên giá đã ffill), nối tiếp giá đóng cửa cuối đã lưu
+    prev = np.vstack([cache['last_close'][None, :], X[:-1]])
+    with np.errstate(invalid='ignore', divide='ignore'):
+        ret = X / prev - 1
+    f_idx = [cache['tickers'].index(f) for f in cache['funds']]
+    b_idx = [cache['tickers'].index(b) for b in cache['benchmarks']]
+    R, B = ret[:, f_idx], ret[:, b_idx]
+    rows = {k: np.empty_like(X) for k in OUTPUTS}
+    rows.update({k: np.empty_like(R) for k in PAIR_OUTPUTS})
+    for i, px in enumerate(X):
+        for k in OUTPUTS:
+            eng[k].push(px)
+            rows[k][i] = eng[k].mean
+        te, pair = eng["TE"], eng["Beta"]
+        te.push(R[i] - B[i])
+        pair.push(R[i], B[i])
+        rows["TE"][i] = te.std * np.sqrt(TRADING_DAYS) * 100
+        with np.errstate(invalid='ignore', divide='ignore'):
+            rows["Beta"][i] = pair.cov / pair.var_y
+            rows["Corr"][i] = pair.cov / np.sqrt(pair.var * pair.var_y)
+    cache['dates'] = np.concatenate([cache['dates'], prices.index.to_numpy(dtype='M8[ns]')])
+    if len(X):
+        cache['last_close'] = X[-1]
+    for k in OUTPUTS + PAIR_OUTPUTS:
+        cache[k] = np.vstack([cache[k], rows[k]])
+    return cache
+
+
+def build(store, pairs=None):
+    """Tính từ đầu toàn bộ lịch sử; pairs = {quỹ: benchmark đã dùng} cho TE / Beta / Corr"""
+    tickers = store.tickers
+    pairs = {f: b for f, b in (pairs or {}).items() if f in store and b in store}
+    n, m = len(tickers), len(pairs)
+    cache = {'version': store.version, 'tickers': tickers, 'funds': list(pairs), 'benchmarks': list(pairs.values()),
+             'engines': _engines(n, m), 'last_close': np.full(n, np.nan), 'dates': np.array([], dtype='M8[ns]'),
+             **{k: np.empty((0, n)) for k in OUTPUTS}, **{k: np.empty((0, m)) for k in PAIR_OUTPUTS}}
+    return _advance(cache, store.wide(tickers))
+
+
+def save_rolling(cache, path=ROLLING_PATH):
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    arrays = {f"{name}__{k}": v for name, eng in cache['engines'].items() for k, v in eng.state().items()}
+    arrays.update({k: cache[k] for k in OUTPUTS + PAIR_OUTPUTS})
+    tmp = path + '.tmp.npz'
+    np.savez(tmp, version=np.array(cache['version']), tickers=np.array(cache['tickers']),
+             funds=np.array(cache['funds'], dtype=str), benchmarks=np.array(cache['benchmarks'], dtype=str),
+             last_close=cache['last_close'], dates=cache['dates'], **arrays)
+    os.replace(tmp, path)
+
+
+def load_rolling(path=ROLLING_PATH):
+    """Đọc cache đã lưu (None nếu chưa có hoặc thiếu chỉ số / trạng thái, vd. file cũ)"""
+    if not os.path.exists(path):
+        return None
+    with np.load(path) as z:
+        if any(k not in z.files for k in OUTPUTS + PAIR_OUTPUTS + ['funds', 'benchmarks', 'last_close']):
+            return None
+        states = {}
+        for key in z.files:
+            name, _, field = key.partition('__')
+            if field:
+                states.setdefault(name, {})[field] = z[key]
+        return {'version': str(z['version']), 'tickers': z['tickers'].tolist(), 'funds': z['funds'].tolist(),
+                'benchmarks': z['benchmarks'].tolist(), 'last_close': z['last_close'], 'dates': z['dates'],
+                'engines': {name: RollingMoments.from_state(s) for name, s in states.items()},
+                **{k: z[k] for k in OUTPUTS + PAIR_OUTPUTS}}
+
+
+def lookup(cache, kind, tickers, version, start=None, end=None):
+    """Bảng ngày x mã của một chỉ số (MA50 / MA200, hoặc TE / Beta / Corr theo quỹ) trong [start, end]; None nếu cache cũ"""
+    if cache is None or cache['version'] != version:
+        return None
+    names = cache['funds'] if kind in PAIR_OUTPUTS else cache['tickers']
+    if any(t not in names for t in tickers):
+        return None
+    dates = cache['dates']
+    lo = 0 if start is None else np.searchsorted(dates, np.datetime64(pd.Timestamp(start), 'ns'))
+    hi = len(dates) if end is None else np.searchsorted(dates, np.datetime64(pd.Timestamp(end), 'ns'), side='right')
+    idx = [names.index(t) for t in tickers]
+    return pd.DataFrame(cache[kind][lo:hi, idx], index=pd.DatetimeIndex(dates[lo:hi], name='Date'), columns=list(tickers))
+
+
+def refresh(store, rebuild=False, path=ROLLING_PATH, pairs=None):
+    """Sau mỗi lần cập nhật: chỉ đẩy các phiên mới qua trạng thái đã lưu.
+
+    Tính lại từ đầu khi chưa có cache, danh sách mã / cặp quỹ-benchmark thay đổi hoặc dữ liệu cũ bị điều chỉnh
+    (rebuild=True). pairs=None giữ các cặp đã lưu.
+    """
+    t0 = time.perf_counter()
+    cache = None if rebuild else load_rolling(path)
+    if pairs is None:
+        pairs = dict(zip(cache['funds'], cache['benchmarks'])) if cache is not None else {}
+    pairs = {f: b for f, b in pairs.items() if f in store and b in store}
+    if (cache is None or cache['tickers'] != store.tickers or not len(cache['dates'])
+            or dict(zip(cache['funds'], cache['benchmarks'])) != pairs):
+        cache, mode = build(store, pairs), "tính lại toàn bộ"
+    else:
+        last = pd.Timestamp(cache['dates'][-1])
+        new = store.wide(cache['tickers'], start=last + pd.Timedelta(days=1))
+        cache = _advance(cache, new)
+        cache['version'] = store.version
+        mode = f"+{len(new)} phiên"
+    save_rolling(cache, path)
+    print(f"📐 Đã cập nhật thống kê trượt ({mode}, {time.perf_counter() - t0:.2f}s)")
+    return cache
+
+
+if __name__ == "__main__":
+    import tracking
+
+    with snapshot.update() as snap:
+        store = snap.open_store()
+        pairs = tracking.benchmark_pairs(store.tickers, pd.read_csv(snap.path('profile')))
+        snap.version = refresh(store, rebuild=True, path=snap.path('rolling'), pairs=pairs)['version']
@@ -0,0 +1,107 @@
+import numpy as np
+import pandas as pd
+
+# Số đường mô phỏng mỗi lô: giới hạn bộ nhớ ~ days x CHUNK x 8 byte
+CHUNK = 20_000
+# Dưới ngưỡng này (số phần tử days x paths, ~2.4 MB) giữ toàn bộ đường để tính phân vị chính xác,
+# vượt ngưỡng thì cộng dồn histogram theo ngày (bộ nhớ cố định, sai số < 1/BINS độ rộng dải)
+EXACT_LIMIT = 300_000
+BINS = 4096
+QUANTILES = (0.05, 0.25, 0.5, 0.75, 0.95)
+METHODS = ('gbm', 'bootstrap')
+MIN_PRICES = 3   # Cần ít nhất 2 lợi nhuận để ước lượng sigma (std ddof=1)
+
+
+def _draw(rng, method, log_ret, drift, sigma, days, n, antithetic):
+    """Ma trận lợi nhuận log (days x n) của một lô"""
+    half = (n + 1) // 2 if antithetic else n
+    if method == 'gbm':
+        z = rng.standard_normal((days, half))
+        if antithetic:
+            z = np.concatenate([z, -z], axis=1)
+        steps = drift + sigma * z
+    else:
+        steps = log_ret[rng.integers(0, len(log_ret), (days, half))]
+        if antithetic:
+            # Đối xứng quanh trung bình lịch sử
+            steps = np.concatenate([steps, 2 * drift - steps], axis=1)
+    return steps[:, :n]
+
+
+def _hist_quantiles(counts, edges, qs):
+    """Phân vị từ histogram (nội suy tuyến tính trong bin)"""
+    cdf = np.cumsum(counts) / counts.sum()
+    out = []
+    for q in qs:
+        b = min(np.searchsorted(cdf, q), len(counts) - 1)
+        prev = cdf[b - 1] if b > 0 else 0.0
+        frac = (q - prev) / (cdf[b] - prev) if cdf[b] > prev else 0.5
+        out.append(edges[b] + frac * (edges[b + 1] - edges[b]))
+    return np.array(out)
+
+
+def monte_carlo(price_series, days=30, paths=1000, method='gbm', antithetic=False, seed=None,
+                quantiles=QUANTILES, chunk=CHUNK):
+    """Mô phỏng Monte Carlo vector hóa, cộng dồn trong không gian log theo từng lô.
+
+    method: 'gbm' (phân phối chuẩn theo mu/sigma lịch sử) hoặc 'bootstrap' (lấy mẫu lại lợi nhuận lịch sử).
+    Chỉ trả về dải phân vị theo ngày cùng các thống kê giá cuối kỳ, không trả toàn bộ đường.
+    """
+    if method not in METHODS:
+        raise ValueError(f"method phải là một trong {METHODS}")
+    prices = price_series.dropna()
+    columns = [f"{q:.0%}" for q in quantiles]
+    if len(prices) < MIN_PRICES:   # Chưa đủ lợi nhuận để ước lượng / lấy mẫu lại
+        return {'bands': pd.DataFrame(columns=columns, index=pd.RangeIndex(0, name='Day'), dtype=float),
+                'prob_up': np.nan, 'median': np.nan, 'worst': np.nan, 'best': np.nan, 'paths': 0}
+    last_price = float(prices.iloc[-1])
+    log_ret = np.log(prices.astype(float)).diff().dropna().to_numpy()
+    # GBM: lợi nhuận log ~ N(drift, sigma) ước lượng từ lịch sử
+    drift, sigma = log_ret.mean(), log_ret.std(ddof=1)
+    rng = np.random.default_rng(seed)
+    qs = np.asarray(quantiles, dtype=float)
+    exact = paths * days <= EXACT_LIMIT
+
+    # Dải bin log cho từng ngày: trung bình ± 10 sigma (hoặc biên độ lịch sử lớn nhất cho bootstrap)
+    t = np.arange(1, days + 1)
+    spread = max(sigma, np.abs(log_ret - drift).max() / 4) if method == 'bootstrap' else sigma
+    center = drift * t
+    lo, hi = center - 10 * spread * np.sqrt(t), center + 10 * spread * np.sqrt(t)
+    counts = np.zeros((days, BINS), dtype=np.int64)
+    kept, n_up, done = [], 0, 0
+
+    while done < paths:
+        n = min(chunk, paths - done)
+        cum = np.cumsum(_draw(rng, method, log_ret, drift, sigma, days, n, antithetic), axis=0)
+        n_up += int((cum[-1] > 0).sum())
+        if exact:
+            kept.append(cum)
+        else:
+            idx = ((cum - lo[:, None]) / (hi - lo)[:, None] * BINS).astype(np.int64)
+            np.clip(idx, 0, BINS - 1, out=idx)
+            idx += (np.arange(days) * BINS)[:, None]
+            counts += np.bincount(idx.ravel(), minlength=days * BINS).reshape(days, BINS)
+        done += n
+
+    if exact:
+        band = np.quantile(np.concatenate(kept, axis=1), qs, axis=1).T
+    else:
+        band = np.array([_hist_quantiles(counts[d], np.linspace(lo[d], hi[d], BINS + 1), qs) for d in range(days)])
+
+    bands = pd.DataFrame(last_price * np.exp(np.vstack([np.zeros(len(qs)), band])),
+                         index=pd.RangeIndex(days + 1, name='Day'), columns=columns)
+    final = bands.iloc[-1]
+    return {
+        'bands': bands,
+        'prob_up': n_up / paths * 100,
+        'median': float(final.get('50%', np.nan)),
+        'worst': float(final.get('5%', np.nan)),
+        'best': float(final.get('95%', np.nan)),
+        'paths': paths,
+    }
+
+
+def run_monte_carlo(price_series, days=30, simulations=1000, method='gbm', antithetic=True, seed=42):
+    """Giao diện cho dashboard: (dải phân vị, xác suất tăng, trung vị, xấu nhất 5%, tốt nhất 95%)"""
+    res = monte_carlo(price_series, days=days, paths=simulations, method=method, antithetic=antithetic, seed=seed)
+    return res['bands'], res['prob_up'], res['median'], res['worst'], res['best']
@@ -0,0 +1,227 @@
+import json
+import os
+import shutil
+import threading
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
+
+import storage
+
+try:
+    import fcntl
+except ImportError:  # Windows: không khóa giữa các tiến trình
+    fcntl = None
+
+# Mỗi lần cập nhật ghi vào một thư mục snapshot mới rồi đổi con trỏ CURRENT (os.replace, nguyên tử).
+# Người đọc luôn thấy trọn vẹn snapshot cũ hoặc snapshot mới, không bao giờ thấy dữ liệu ghi dở.
+#   data/snapshots/<id>/ticks/*.npy, manifest.json, cube.npz, rolling.npz, ..., funds_profile.csv
+#   data/snapshots/CURRENT   (chứa <id>)
+SNAPSHOT_ROOT = os.path.join(storage.DATA_DIR, 'snapshots')
+POINTER = 'CURRENT'
+LOCK = '.lock'   # Khóa single-flight: mỗi lúc chỉ một tiến trình được tạo snapshot
+META = 'snapshot.json'
+KEEP = 3   # Giữ vài snapshot cũ cho các phiên đang đọc dở
+FILES = {
+    'ticks': 'ticks', 'profile': 'funds_profile.csv', 'cube': 'cube.npz', 'corr_state': 'corr_state.npz',
+    'rolling': 'rolling.npz', 'volume': 'volume.npz', 'forecasts': 'forecasts.npz', 'tracking': 'tracking.npz',
+    'quarantine': 'quarantine.csv',
+}
+# Vị trí cũ (trước khi có snapshot): đọc khi chưa có snapshot nào và làm gốc cho snapshot đầu tiên
+LEGACY = {name: ('funds_profile.csv' if name == 'profile' else
+                 storage.TICK_DIR if name == 'ticks' else os.path.join(storage.DATA_DIR, fname))
+          for name, fname in FILES.items()}
+
+
+def current_id(root=SNAPSHOT_ROOT):
+    """Id snapshot hiện tại (đọc một file vài byte); None nếu chưa có"""
+    try:
+        with open(os.path.join(root, POINTER)) as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def resolve(name, snap_id=None, root=SNAPSHOT_ROOT):
+    """Đường dẫn của bảng `name` trong snapshot (mặc định: hiện tại), hoặc vị trí cũ nếu chưa có snapshot"""
+    snap_id = snap_id or current_id(root)
+    if snap_id is None:
+        return LEGACY[name]
+    return os.path.join(root, snap_id, FILES[name])
+
+
+def signature(path):
+    """Chữ ký rẻ của một bảng (inode, kích thước, mtime).
+
+    Thư mục ticks được đọc lười (memory-map theo đường dẫn) nên chữ ký gồm cả đường dẫn:
+    TickStore luôn mở lại trên snapshot mới (chỉ đọc manifest), không giữ tham chiếu tới snapshot sắp bị xóa.
+    """
+    if os.path.isdir(path):
+        sig = signature(os.path.join(path, 'manifest.json'))
+        return sig and (path,) + sig
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return st.st_ino, st.st_size, st.st_mtime_ns
+
+
+def _link_or_copy(src, dst):
+    try:
+        os.link(src, dst)
+    except OSError:  # Khác ổ đĩa / hệ thống file không hỗ trợ hard link
+        shutil.copy2(src, dst)
+
+
+def _clone(src, dst):
+    """Sao chép file/thư mục bằng hard link: file không đổi dùng chung inode, không tốn dung lượng.
+
+    An toàn vì mọi thao tác ghi đều là ghi file tạm rồi os.replace (thay link, không sửa inode chung).
+    """
+    if os.path.isdir(src):
+        os.makedirs(dst, exist_ok=True)
+        for name in os.listdir(src):
+            if not name.startswith('.'):
+                _clone(os.path.join(src, name), os.path.join(dst, name))
+    elif os.path.exists(src):
+        _link_or_copy(src, dst)
+
+
+class Snapshot:
+    """Snapshot đang được ghi (thư mục staging); commit() mới công bố cho người đọc"""
+
+    def __init__(self, root=SNAPSHOT_ROOT):
+        self.root = root
+        self.base = current_id(root)
+        self.id = f"{datetime.now():%Y%m%d-%H%M%S}-{uuid.uuid4().hex[:6]}"
+        self.dir = os.path.join(root, f'.staging-{self.id}')
+        self.version = None
+        self.done = False
+        os.makedirs(self.dir)
+        for name in FILES:
+            _clone(resolve(name, self.base, root), self.path(name))
+
+    def path(self, name):
+        return os.path.join(self.dir, FILES[name])
+
+    def open_store(self):
+        return storage.open_store(self.path('ticks'))
+
+    def commit(self):
+        """Đổi tên staging thành snapshot chính thức rồi trỏ CURRENT sang nó"""
+        meta = {'id': self.id, 'base': self.base, 'created': datetime.now().isoformat(timespec='seconds'),
+                'version': self.version, 'files': {name: signature(self.path(name)) is not None for name in FILES}}
+        with open(os.path.join(self.dir, META), 'w') as f:
+            json.dump(meta, f, indent=1)
+        final = os.path.join(self.root, self.id)
+        os.replace(self.dir, final)
+        self.dir = final
+        tmp = os.path.join(self.root, f'.{POINTER}.tmp')
+        with open(tmp, 'w') as f:
+            f.write(self.id)
+        os.replace(tmp, os.path.join(self.root, POINTER))
+        self.done = True
+        prune(self.root)
+        return self.id
+
+    def abort(self):
+        shutil.rmtree(self.dir, ignore_errors=True)
+        self.done = True
+
+
+class Busy(RuntimeError):
+    """Đang có tiến trình khác tạo snapshot"""
+
+
+@contextmanager
+def locked(root=SNAPSHOT_ROOT, wait=True):
+    """Khóa file (flock) quanh toàn bộ quá trình tạo snapshot; wait=False thì báo Busy ngay nếu đang bận"""
+    os.makedirs(root, exist_ok=True)
+    with open(os.path.join(root, LOCK), 'a') as f:
+        if fcntl is not None:
+            try:
+                fcntl.flock(f, fcntl.LOCK_EX | (0 if wait else fcntl.LOCK_NB))
+            except BlockingIOError:
+                raise Busy("Đang có tiến trình khác cập nhật dữ liệu") from None
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+
+@contextmanager
+def update(root=SNAPSHOT_ROOT, wait=True):
+    """with snapshot.update() as snap: ghi vào snap.path(...); thành công thì commit, lỗi thì bỏ staging.
+
+    Hai lần cập nhật không bao giờ chạy chồng nhau (cùng gốc CURRENT thì lần sau sẽ ghi đè lần trước):
+    wait=True chờ lượt, wait=False báo Busy. Đặt snap.version (TickStore.version) để ghi vào snapshot.json;
+    gọi snap.abort() để hủy chủ động.
+    """
+    with locked(root, wait):
+        snap = Snapshot(root)
+        try:
+            yield snap
+        except BaseException:
+            snap.abort()
+            raise
+        if not snap.done:
+            snap.commit()
+
+
+def list_snapshots(root=SNAPSHOT_ROOT):
+    """Id các snapshot đã commit, cũ trước mới sau"""
+    if not os.path.isdir(root):
+        return []
+    return sorted(d for d in os.listdir(root) if not d.startswith('.') and os.path.isdir(os.path.join(root, d)))
+
+
+def prune(root=SNAPSHOT_ROOT, keep=KEEP):
+    """Xóa snapshot cũ (luôn giữ snapshot hiện tại) và staging bỏ dở"""
+    current = current_id(root)
+    others = [s for s in list_snapshots(root) if s != current]
+    old = others[:max(len(others) - (keep - 1), 0)]
+    for s in old:
+        shutil.rmtree(os.path.join(root, s), ignore_errors=True)
+    for d in os.listdir(root):
+        if d.startswith('.staging-'):
+            path = os.path.join(root, d)
+            # Staging của tiến trình khác có thể đang ghi: chỉ xóa cái đã bỏ dở hơn 1 giờ
+            if datetime.now().timestamp() - os.path.getmtime(path) > 3600:
+                shutil.rmtree(path, ignore_errors=True)
+    return old
+
+
+class Reader:
+    """Các bảng đã đọc của snapshot hiện tại, dùng chung giữa các phiên.
+
+    load() chỉ đọc con trỏ CURRENT; khi snapshot đổi thì chỉ đọc lại các bảng có chữ ký file khác
+    (file không đổi được hard link nên giữ nguyên inode). Mỗi lần trả về một dict mới, nên phiên đang
+    chạy vẫn giữ trọn bộ bảng cũ trong lúc phiên khác chuyển sang snapshot mới.
+    """
+
+    def __init__(self, loaders, root=SNAPSHOT_ROOT):
+        self.loaders = loaders
+        self.root = root
+        self.current = object()
+        self.sigs = {}
+        self.tables = {}
+        self.reloaded = []
+        self.lock = threading.Lock()
+
+    def load(self):
+        snap_id = current_id(self.root)
+        if snap_id == self.current:
+            return self.tables
+        with self.lock:
+            if snap_id != self.current:
+                tables, reloaded = dict(self.tables), []
+                for name, loader in self.loaders.items():
+                    path = resolve(name, snap_id, self.root)
+                    sig = signature(path)
+                    if name not in tables or sig is None or sig != self.sigs.get(name):
+                        tables[name] = loader(path)
+                        self.sigs[name] = sig
+                        reloaded.append(name)
+                self.tables, self.reloaded, self.current = tables, reloaded, snap_id
+        return self.tables
@@ -0,0 +1,332 @@
+import hashlib
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+# Thư mục lưu Fact Tables dạng nhị phân (cột liền kề, đọc bằng memory-map)
+DATA_DIR = os.environ.get('FUNDS_DATA_DIR', 'data')
+BACKEND = os.environ.get('FUNDS_STORAGE', 'npy')
+
+CSV_FILES = {'close': 'funds_data.csv', 'volume': 'funds_volume.csv'}
+DTYPES = {'close': np.float64, 'volume': np.int64}
+
+try:
+    import pyarrow  # noqa: F401
+    HAS_ARROW = True
+except ImportError:
+    HAS_ARROW = False
+
+
+# --- CSV (chỉ dùng để export / tương thích ngược) ---
+def _save_csv(tables, data_dir):
+    os.makedirs(data_dir, exist_ok=True)
+    for name, df in tables.items():
+        out = df.copy()
+        out.index.name = 'Date'
+        path = os.path.join(data_dir, CSV_FILES[name])
+        out.reset_index().to_csv(path + '.tmp', index=False)
+        os.replace(path + '.tmp', path)  # Người đọc không bao giờ thấy file ghi dở
+
+def _load_csv(data_dir, mmap=False):
+    tables = {}
+    for name, fname in CSV_FILES.items():
+        tables[name] = pd.read_csv(os.path.join(data_dir, fname), parse_dates=['Date'], index_col='Date')
+    return tables
+
+
+# --- NumPy memory-map: <name>.npy (ma trận Fortran-order) + dates.npy + tickers.json ---
+def _save_npy(tables, data_dir):
+    os.makedirs(data_dir, exist_ok=True)
+    first = next(iter(tables.values()))
+    np.save(os.path.join(data_dir, 'dates.npy'), first.index.values.astype('datetime64[ns]'))
+    with open(os.path.join(data_dir, 'tickers.json'), 'w') as f:
+        json.dump(list(first.columns), f)
+    for name, df in tables.items():
+        # Fortran-order: mỗi cột liền kề trên đĩa -> DataFrame dùng lại buffer, không copy
+        arr = np.asfortranarray(df.to_numpy(dtype=DTYPES[name]))
+        np.save(os.path.join(data_dir, f'{name}.npy'), arr)
+
+def _load_npy(data_dir, mmap=True):
+    mode = 'r' if mmap else None
+    index = pd.DatetimeIndex(np.load(os.path.join(data_dir, 'dates.npy')), name='Date')
+    with open(os.path.join(data_dir, 'tickers.json')) as f:
+        columns = json.load(f)
+    tables = {}
+    for name in DTYPES:
+        arr = np.load(os.path.join(data_dir, f'{name}.npy'), mmap_mode=mode)
+        tables[name] = pd.DataFrame(arr, index=index, columns=columns, copy=False)
+    return tables
+
+
+# --- Parquet (tùy chọn, cần pyarrow) ---
+def _save_parquet(tables, data_dir):
+    os.makedirs(data_dir, exist_ok=True)
+    for name, df in tables.items():
+        df.astype(DTYPES[name]).to_parquet(os.path.join(data_dir, f'{name}.parquet'))
+
+def _load_parquet(data_dir, mmap=True):
+    return {name: pd.read_parquet(os.path.join(data_dir, f'{name}.parquet'), memory_map=mmap) for name in DTYPES}
+
+
+BACKENDS = {
+    'npy': (_save_npy, _load_npy),
+    'parquet': (_save_parquet, _load_parquet),
+    'csv': (_save_csv, _load_csv),
+}
+
+
+def _resolve(backend):
+    if backend not in BACKENDS:
+        raise ValueError(f"Backend không hợp lệ: {backend} (chọn {', '.join(BACKENDS)})")
+    if backend == 'parquet' and not HAS_ARROW:
+        print("⚠️ Chưa cài pyarrow, dùng backend npy")
+        return 'npy'
+    return backend
+
+
+def save_tables(df_close, df_vol, backend=BACKEND, data_dir=DATA_DIR):
+    """Ghi bảng giá (float64) và khối lượng (int64) theo backend đã chọn"""
+    backend = _resolve(backend)
+    df_vol = df_vol.reindex(index=df_close.index, columns=df_close.columns).fillna(0)
+    target = '.' if backend == 'csv' else data_dir
+    BACKENDS[backend][0]({'close': df_close, 'volume': df_vol}, target)
+    return backend
+
+
+def load_tables(backend=BACKEND, data_dir=DATA_DIR, mmap=True):
+    """Đọc (df_close, df_vol). Chưa có dữ liệu nhị phân thì đọc CSV; không có gì thì (None, None)"""
+    backend = _resolve(backend)
+    try:
+        if backend != 'csv':
+            tables = BACKENDS[backend][1](data_dir, mmap)
+            return tables['close'], tables['volume']
+    except FileNotFoundError:
+        pass
+    try:
+        tables = _load_csv('.')
+        return tables['close'], tables['volume']
+    except FileNotFoundError:
+        return None, None
+
+
+def export_csv(df_close, df_vol, data_dir='.'):
+    """Xuất Fact Tables ra CSV (funds_data.csv, funds_volume.csv)"""
+    _save_csv({'close': df_close, 'volume': df_vol}, data_dir)
+
+
+# ==========================================
+# TICK STORE: dạng long (ticker, date, close, volume), mỗi mã một partition
+# ==========================================
+TICK_DIR = os.path.join(DATA_DIR, 'ticks')
+TICK_DTYPE = np.dtype([('date', 'M8[ns]'), ('close', 'f8'), ('volume', 'i8')])
+FIELDS = {'close': 'close', 'volume': 'volume', 'Close': 'close', 'Volume': 'volume'}
+
+
+def _to_records(df):
+    """DataFrame (index Date, cột Close/Volume) -> mảng structured sắp theo ngày, bỏ dòng trống"""
+    df = df[df['Close'].notna()].sort_index()
+    df = df[~df.index.duplicated(keep='last')]
+    rec = np.empty(len(df), dtype=TICK_DTYPE)
+    rec['date'] = df.index.values.astype('M8[ns]')
+    rec['close'] = df['Close'].to_numpy(dtype='f8')
+    rec['volume'] = df['Volume'].fillna(0).to_numpy(dtype='i8') if 'Volume' in df else 0
+    return rec
+
+
+class TickStore:
+    """Kho dữ liệu theo từng mã: data/ticks/<TICKER>.npy + manifest.json.
+
+    Mỗi partition chỉ chứa các phiên thực sự có giao dịch (không ffill, không NaN trước ngày ra mắt).
+    Đọc bằng memory-map và cắt theo ngày bằng tìm kiếm nhị phân, nên chi phí tỉ lệ với phần được chọn.
+    """
+
+    def __init__(self, root=TICK_DIR, mmap=True):
+        self.root = root
+        self.mmap = mmap
+        self._mem = None  # Partition trong bộ nhớ (khi dựng từ bảng wide)
+        self.manifest = {'tickers': {}}
+        path = os.path.join(root, 'manifest.json') if root else None
+        if path and os.path.exists(path):
+            with open(path) as f:
+                self.manifest = json.load(f)
+
+    @classmethod
+    def from_wide(cls, df_close, df_vol=None):
+        """Dựng store trong bộ nhớ từ bảng wide (CSV cũ), bỏ các dòng NaN trước ngày ra mắt.
+
+        Bảng wide cũ được ffill qua ngày nghỉ: khi có khối lượng, dòng giá không đổi và khối lượng = 0
+        là dòng ffill chứ không phải phiên thật nên bị bỏ.
+        """
+        store = cls(root=None)
+        store._mem = {}
+        for ticker in df_close.columns:
+            close = df_close[ticker]
+            vol = df_vol[ticker].reindex(close.index) if df_vol is not None and ticker in df_vol else None
+            if vol is not None:
+                close = close.where(~((close == close.shift()) & (vol.fillna(0) == 0)))
+            store._mem[ticker] = _to_records(pd.DataFrame({'Close': close, 'Volume': vol if vol is not None else 0}))
+        store._refresh_manifest(list(df_close.columns))
+        return store
+
+    # --- Metadata ---
+    @property
+    def tickers(self):
+        return list(self.manifest['tickers'])
+
+    def __contains__(self, ticker):
+        return ticker in self.manifest['tickers']
+
+    def __bool__(self):
+        return bool(self.manifest['tickers'])
+
+    @property
+    def version(self):
+        """Mã phiên bản dữ liệu: đổi khi có mã mới, đổi thứ tự mã hoặc nội dung bất kỳ partition nào thay đổi"""
+        raw = json.dumps(self.manifest, sort_keys=True).encode()
+        return hashlib.sha1(raw).hexdigest()[:12]
+
+    def first_date(self, ticker=None):
+        return self._bound('first', min, ticker)
+
+    def last_date(self, ticker=None):
+        return self._bound('last', max, ticker)
+
+    def _bound(self, key, agg, ticker):
+        meta = self.manifest['tickers']
+        if ticker is not None:
+            return pd.Timestamp(meta[ticker][key]) if ticker in meta and meta[ticker]['rows'] else None
+        values = [m[key] for m in meta.values() if m['rows']]
+        return pd.Timestamp(agg(values)) if values else None
+
+    # --- Đọc ---
+    def _path(self, ticker):
+        return os.path.join(self.root, f'{ticker}.npy')
+
+    def read(self, ticker, start=None, end=None):
+        """Mảng structured của một mã trong [start, end] (view memory-map, không copy)"""
+        if self._mem is not None:
+            rec = self._mem.get(ticker, np.empty(0, dtype=TICK_DTYPE))
+        elif os.path.exists(self._path(ticker)):
+            rec = np.load(self._path(ticker), mmap_mode='r' if self.mmap else None)
+        else:
+            return np.empty(0, dtype=TICK_DTYPE)
+        dates = rec['date']
+        lo = 0 if start is None else np.searchsorted(dates, np.datetime64(pd.Timestamp(start), 'ns'), 'left')
+        hi = len(rec) if end is None else np.searchsorted(dates, np.datetime64(pd.Timestamp(end), 'ns'), 'right')
+        rec = rec[lo:hi]
+        # Partition cũ ghi giá float32: đổi sang float64 khi đọc (ghi lại đúng kiểu ở lần upsert kế tiếp)
+        return rec if rec.dtype == TICK_DTYPE else rec.astype(TICK_DTYPE)
+
+    def frame(self, ticker, start=None, end=None):
+        """DataFrame Close/Volume của một mã (chỉ các phiên có giao dịch)"""
+        rec = self.read(ticker, start, end)
+        return pd.DataFrame({'Close': rec['close'], 'Volume': rec['volume']},
+                            index=pd.DatetimeIndex(rec['date'], name='Date'))
+
+    def series(self, ticker, start=None, end=None, field='close'):
+        rec = self.read(ticker, start, end)
+        return pd.Series(rec[FIELDS[field]], index=pd.DatetimeIndex(rec['date'], name='Date'), name=ticker)
+
+    def wide(self, tickers, start=None, end=None, field='close'):
+        """Bảng wide đã căn ngày cho các mã được chọn trong [start, end].
+
+        Giá được ffill trong phạm vi lựa chọn (lấy thêm phiên liền trước start làm mốc),
+        khối lượng điền 0 cho ngày không giao dịch.
+        """
+        field = FIELDS[field]
+        is_close = field == 'close'
+        recs = []
+        for ticker in tickers:
+            rec = self.read(ticker, start, end)
+            if is_close and start is not None:
+                prev = self.read(ticker, None, pd.Timestamp(start) - pd.Timedelta(1, 'ns'))
+                if len(prev):
+                    rec = np.concatenate([prev[-1:], rec])
+            recs.append(rec)
+        if not recs:
+            return pd.DataFrame()
+
+        dates = np.unique(np.concatenate([r['date'] for r in recs]))
+        if is_close:
+            out = np.full((len(dates), len(recs)), np.nan, dtype='f8')
+        else:
+            out = np.zeros((len(dates), len(recs)), dtype='i8')
+        for j, rec in enumerate(recs):
+            out[np.searchsorted(dates, rec['date']), j] = rec[field]
+        if is_close:
+            # ffill theo cột bằng chỉ số dòng hợp lệ gần nhất
+            last = np.where(np.isnan(out), 0, np.arange(len(dates))[:, None])
+            np.maximum.accumulate(last, axis=0, out=last)
+            out = out[last, np.arange(len(recs))]
+            if start is not None:
+                keep = dates >= np.datetime64(pd.Timestamp(start), 'ns')
+                dates, out = dates[keep], out[keep]
+        return pd.DataFrame(out, index=pd.DatetimeIndex(dates, name='Date'), columns=list(tickers))
+
+    def long(self, tickers=None, start=None, end=None):
+        """Dạng long (Ticker, Date, Close, Volume)"""
+        parts = []
+        for ticker in tickers or self.tickers:
+            df = self.frame(ticker, start, end).reset_index()
+            df.insert(0, 'Ticker', ticker)
+            parts.append(df)
+        return pd.concat(parts, ignore_index=True) if parts else pd.DataFrame(columns=['Ticker', 'Date', 'Close', 'Volume'])
+
+    # --- Ghi ---
+    def write(self, ticker, rec):
+        """Ghi đè partition của một mã (ghi file tạm rồi os.replace)"""
+        if self._mem is not None:
+            self._mem[ticker] = rec
+            return
+        os.makedirs(self.root, exist_ok=True)
+        tmp = os.path.join(self.root, f'.{ticker}.tmp.npy')
+        np.save(tmp, rec)
+        os.replace(tmp, self._path(ticker))
+
+    def upsert(self, ticker, df, window_start=None):
+        """Thay các phiên từ window_start trở đi bằng dữ liệu mới df (Close/Volume)"""
+        old = np.array(self.read(ticker))
+        if window_start is not None:
+            old = old[old['date'] < np.datetime64(pd.Timestamp(window_start), 'ns')]
+        else:
+            old = old[:0]
+        fresh = _to_records(df)
+        if len(old) and len(fresh):
+            fresh = fresh[fresh['date'] > old['date'][-1]]
+        self.write(ticker, np.concatenate([old, fresh]))
+
+    def save_manifest(self, order=None):
+        """Cập nhật manifest (thứ tự mã, ngày đầu/cuối, số dòng)"""
+        self._refresh_manifest(order or self.tickers)
+        if self._mem is None:
+            os.makedirs(self.root, exist_ok=True)
+            tmp = os.path.join(self.root, '.manifest.tmp.json')
+            with open(tmp, 'w') as f:
+                json.dump(self.manifest, f, indent=1)
+            os.replace(tmp, os.path.join(self.root, 'manifest.json'))
+
+    def _refresh_manifest(self, order):
+        meta = {}
+        for ticker in order:
+            rec = self.read(ticker)
+            meta[ticker] = {
+                'rows': int(len(rec)),
+                'first': str(pd.Timestamp(rec['date'][0]).date()) if len(rec) else None,
+                'last': str(pd.Timestamp(rec['date'][-1]).date()) if len(rec) else None,
+                # Dấu vân tay nội dung: giá điều chỉnh lại / giá phiên hôm nay đổi cũng đổi version
+                'sha1': hashlib.sha1(np.ascontiguousarray(rec).tobytes()).hexdigest()[:12],
+            }
+        self.manifest = {'tickers': meta}
+
+
+def open_store(root=TICK_DIR):
+    """Mở TickStore; nếu chưa có partition thì dựng tạm trong bộ nhớ từ bảng wide (npy/CSV)"""
+    store = TickStore(root)
+    if store:
+        return store
+    df_close, df_vol = load_tables(mmap=False)
+    if df_close is None:
+        return None
+    return TickStore.from_wide(df_close, df_vol)
@@ -0,0 +1,59 @@
+"""Engine backtest ma trận (backtest.py) phải trùng vòng lặp từng danh mục từng phiên (benchmarks/bench_backtest.py)"""
+import numpy as np
+import pandas as pd
+import pytest
+
+import backtest
+from benchmarks.bench_backtest import loop_backtest
+from benchmarks.synthetic import make_universe
+
+
+@pytest.fixture(scope='module')
+def prices():
+    # Ngày ra mắt so le: phần tỷ trọng của mã chưa niêm yết đứng yên như tiền mặt
+    return make_universe(n_tickers=6, years=3, seed=2)[0]
+
+
+@pytest.mark.parametrize('rebalance', ['M', 'Q', 'Y', None])
+@pytest.mark.parametrize('contribution, contribution_freq', [(0.0, 'M'), (5.0, 'M'), (10.0, 'Q')])
+def test_simulate_matches_loop(prices, rebalance, contribution, contribution_freq):
+    W = backtest.random_weights(20, prices.shape[1], seed=0)
+    fees = np.linspace(0.0, 1.0, prices.shape[1])
+    kwargs = dict(rebalance=rebalance, contribution=contribution, contribution_freq=contribution_freq, fees=fees)
+    value, flows = backtest.simulate(prices, W, **kwargs)
+    ref = loop_backtest(prices, W, **kwargs)
+    np.testing.assert_allclose(value, ref, rtol=1e-10)
+    assert flows.sum() == contribution * len(backtest.period_ends(prices.index, contribution_freq))
+
+
+def test_buy_and_hold_returns_match_prices(prices):
+    one = np.eye(prices.shape[1])[:1]
+    value, flows = backtest.simulate(prices, one, rebalance=None)
+    ret = backtest.twr_returns(value, flows)[:, 0]
+    expected = backtest.price_matrix(prices[prices.columns[:1]])[:, 0]
+    np.testing.assert_allclose(value[:, 0], backtest.INITIAL * expected / expected[0], rtol=1e-12)
+    np.testing.assert_allclose(ret[1:], expected[1:] / expected[:-1] - 1, rtol=1e-9, atol=1e-15)
+
+
+def test_twr_ignores_contributions(prices):
+    W = backtest.random_weights(3, prices.shape[1], seed=1)
+    plain = backtest.twr_returns(*backtest.simulate(prices, W, rebalance='M'))
+    dca = backtest.twr_returns(*backtest.simulate(prices, W, rebalance='M', contribution=50.0))
+    # Tiền nạp mua theo tỷ trọng mục tiêu, trùng với tái cân bằng cuối tháng -> lợi nhuận theo thời gian không đổi
+    np.testing.assert_allclose(dca, plain, rtol=1e-9, atol=1e-12)
+
+
+def test_run_batch_chunks_match_single_pass(prices):
+    W = backtest.random_weights(25, prices.shape[1], seed=3)
+    bench = prices.iloc[:, 0].pct_change()
+    whole = backtest.run_batch(prices, W, bench, chunk=len(W), rebalance='Q', contribution=5.0)
+    chunked = backtest.run_batch(prices, W, bench, chunk=7, rebalance='Q', contribution=5.0)
+    pd.testing.assert_frame_equal(whole, chunked, rtol=1e-10)
+    assert list(chunked.index) == list(range(len(W)))
+
+
+def test_invalid_weights(prices):
+    with pytest.raises(ValueError):
+        backtest.simulate(prices, np.ones(prices.shape[1] + 1))
+    with pytest.raises(ValueError):
+        backtest.simulate(prices, np.zeros(prices.shape[1]))
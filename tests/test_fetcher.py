@@ -0,0 +1,118 @@
+"""Engine tải (fetcher.py) chạy với server dchart giả lập trên máy"""
+import time
+
+import pandas as pd
+import pytest
+
+import fetcher
+import httpcache
+from benchmarks.standin_server import StandinServer, synthetic_history
+
+START, END = 1388534400, 1420070399   # 2014-01-01 .. 2014-12-31
+FAST = dict(backoff=0.001, timeout=5)
+
+
+@pytest.fixture
+def session():
+    s = fetcher.make_session()
+    yield s
+    s.close()
+
+
+def test_fetch_one_matches_server(session):
+    with StandinServer(latency=0) as srv:
+        df, stat = fetcher.fetch_one(session, 'E1VFVN30', START, END, base_url=srv.url, **FAST)
+    ref = synthetic_history('E1VFVN30', START, END)
+    assert stat['Error'] is None and stat['Attempts'] == 1
+    assert len(df) == len(ref['t']) == stat['Rows']
+    assert df['Close'].tolist() == ref['c']
+    assert df['Volume'].tolist() == ref['v']
+
+
+def test_fetch_one_retries_until_success(session):
+    with StandinServer(latency=0, fail_first=2) as srv:
+        df, stat = fetcher.fetch_one(session, 'VNINDEX', START, END, retries=3, base_url=srv.url, **FAST)
+        hits = srv.hits['VNINDEX']
+    assert stat['Error'] is None
+    assert stat['Attempts'] == hits == 3
+    assert len(df) > 0
+
+
+def test_fetch_one_gives_up_after_retries(session):
+    with StandinServer(latency=0, fail_first=10) as srv:
+        df, stat = fetcher.fetch_one(session, 'VNINDEX', START, END, retries=2, base_url=srv.url, **FAST)
+        hits = srv.hits['VNINDEX']
+    assert df.empty
+    assert stat['Error'] == 'HTTP 503'
+    assert stat['Attempts'] == hits == 3
+
+
+def test_fetch_one_does_not_retry_client_error(session):
+    with StandinServer(latency=0, errors={'NOPE': 404}) as srv:
+        df, stat = fetcher.fetch_one(session, 'NOPE', START, END, retries=3, base_url=srv.url, **FAST)
+        hits = srv.hits['NOPE']
+    assert df.empty
+    assert stat['Error'] == 'HTTP 404'
+    assert stat['Attempts'] == hits == 1
+
+
+@pytest.mark.parametrize('code, stale', [(503, True), (404, False)])
+def test_stale_cache_only_covers_transient_errors(session, tmp_path, code, stale):
+    cache = httpcache.HttpCache(root=str(tmp_path), ttl=0)
+    with StandinServer(latency=0) as srv:
+        fetcher.fetch_one(session, 'VNINDEX', START, END, base_url=srv.url, cache=cache, **FAST)
+        srv.errors['VNINDEX'] = code
+        df, stat = fetcher.fetch_one(session, 'VNINDEX', START, END, retries=1, base_url=srv.url, cache=cache, **FAST)
+    if stale:
+        assert stat['Error'] is None and stat['Cache'] == 'stale' and len(df) > 0
+    else:
+        # 4xx không phải lỗi tạm thời: báo lỗi thay vì âm thầm dùng bản cũ
+        assert stat['Error'] == 'HTTP 404' and stat['Cache'] is None and df.empty
+
+
+def test_token_bucket_paces_requests():
+    bucket = fetcher.TokenBucket(rate=20, burst=1)
+    t0 = time.monotonic()
+    waited = sum(bucket.acquire() for _ in range(11))
+    elapsed = time.monotonic() - t0
+    assert elapsed >= 10 / 20 * 0.9   # Token đầu có sẵn, 10 token sau mỗi cái 1/20 giây
+    assert waited == pytest.approx(elapsed, abs=0.1)
+
+
+def test_token_bucket_allows_burst():
+    bucket = fetcher.TokenBucket(rate=1, burst=5)
+    t0 = time.monotonic()
+    assert sum(bucket.acquire() for _ in range(5)) == 0
+    assert time.monotonic() - t0 < 0.1
+
+
+def test_fetch_all_respects_rate_limit():
+    symbols = [f'SYM{i}' for i in range(9)]
+    with StandinServer(latency=0) as srv:
+        t0 = time.monotonic()
+        frames, stats = fetcher.fetch_all(symbols, START, END, workers=4, rate=20, burst=1, base_url=srv.url, **FAST)
+        elapsed = time.monotonic() - t0
+    assert elapsed >= 8 / 20 * 0.9
+    assert stats['Error'].isna().all()
+    assert all(len(frames[s]) for s in symbols)
+
+
+def test_fetch_all_isolates_ticker_errors():
+    symbols = ['VNINDEX', 'BAD', 'FLAKY', 'VN30']
+    with StandinServer(latency=0, errors={'BAD': 404, 'FLAKY': 503}) as srv:
+        frames, stats = fetcher.fetch_all(symbols, START, END, workers=2, rate=0, retries=2, base_url=srv.url, **FAST)
+    assert list(stats.index) == symbols
+    assert frames['BAD'].empty and frames['FLAKY'].empty
+    assert stats.loc['BAD', 'Error'] == 'HTTP 404' and stats.loc['BAD', 'Attempts'] == 1
+    assert stats.loc['FLAKY', 'Error'] == 'HTTP 503' and stats.loc['FLAKY', 'Attempts'] == 3
+    for s in ('VNINDEX', 'VN30'):
+        assert pd.isna(stats.loc[s, 'Error'])
+        assert len(frames[s]) == stats.loc[s, 'Rows'] > 0
+
+
+def test_fetch_all_per_ticker_start():
+    starts = {'VNINDEX': START, 'VN30': 1417392000}   # VN30 chỉ từ 2014-12-01
+    with StandinServer(latency=0) as srv:
+        frames, _ = fetcher.fetch_all(list(starts), starts, END, rate=0, base_url=srv.url, **FAST)
+    assert frames['VNINDEX'].index.min().year == 2014 and frames['VNINDEX'].index.min().month == 1
+    assert frames['VN30'].index.min().month == 12
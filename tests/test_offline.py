@@ -0,0 +1,65 @@
+"""Chế độ offline: lịch sử đầy đủ được ghim trong cache, dữ liệu dựng lại được ghép lên lịch sử đã lưu"""
+import time
+
+import numpy as np
+import pandas as pd
+
+import httpcache
+import storage
+import update_data
+
+URL = 'http://dchart.test/history'
+FULL = update_data.START_TIMESTAMP
+
+
+def put(cache, symbol, start, end, body, age_days):
+    entry = cache.store(URL, {'symbol': symbol, 'resolution': 'D', 'from': start, 'to': end}, body)
+    cache._save_entry(dict(entry, fetched=entry['fetched'] - age_days * 86400, used=entry['used'] - age_days * 86400))
+
+
+def test_evict_keeps_latest_full_history(tmp_path):
+    cache = httpcache.HttpCache(root=str(tmp_path), pinned={'from': FULL})
+    put(cache, 'AAA', FULL, 100, b'full-old', age_days=90)
+    put(cache, 'AAA', FULL, 200, b'full-new', age_days=60)
+    put(cache, 'AAA', 150, 200, b'incremental', age_days=45)
+    put(cache, 'BBB', FULL, 200, b'full-b', age_days=60)
+    assert cache.evict() == 2
+    left = {e['blob']: e['params']['to'] for e in cache.entries()}
+    assert sorted(left.values()) == ['200', '200']
+    assert cache.size()[0] == 2
+
+    # Không ghim: entry quá MAX_AGE bị xóa hết
+    assert httpcache.HttpCache(root=str(tmp_path)).evict() == 2
+
+
+def test_pinned_entries_survive_size_limit(tmp_path):
+    cache = httpcache.HttpCache(root=str(tmp_path), pinned={'from': FULL}, max_bytes=10)
+    put(cache, 'AAA', FULL, 200, b'x' * 20, age_days=1)
+    put(cache, 'AAA', 150, 200, b'y' * 5, age_days=0)
+    cache.evict(now=time.time())
+    assert [e['params']['from'] for e in cache.entries()] == [str(FULL)]
+
+
+def frame(dates, closes):
+    return pd.DataFrame({'Close': closes, 'Volume': 100}, index=pd.DatetimeIndex(dates, name='Date'))
+
+
+def test_merge_replayed_keeps_stored_sessions_missing_from_cache():
+    dates = pd.bdate_range('2024-01-01', periods=10)
+    store = storage.TickStore.from_wide(pd.DataFrame({'AAA': np.arange(10.0) + 1}, index=dates))
+    # Cache: lịch sử đầy đủ tới phiên 3 + incremental từ phiên 7 (đoạn giữa đã bị evict), phiên 8 được điều chỉnh
+    replayed = frame(dates[:4].append(dates[7:]), [1.0, 2.0, 3.0, 4.0, 8.0, 90.0, 10.0])
+    frames, starts = {'AAA': replayed}, {'AAA': FULL}
+    assert update_data.merge_replayed(store, frames, starts) == []
+    merged = frames['AAA']
+    assert list(merged.index) == list(dates)
+    assert merged['Close'].tolist() == [1, 2, 3, 4, 5, 6, 7, 8, 90, 10]
+    assert update_data.window_start_date(starts['AAA']) == dates[0]
+
+
+def test_merge_replayed_reports_short_cache():
+    dates = pd.bdate_range('2024-01-01', periods=10)
+    store = storage.TickStore.from_wide(pd.DataFrame({'AAA': np.arange(10.0) + 1}, index=dates))
+    frames, starts = {'AAA': frame(dates[5:], np.arange(5.0) + 6), 'NEW': frame(dates, np.ones(10))}, {'AAA': 0, 'NEW': FULL}
+    assert update_data.merge_replayed(store, frames, starts) == ['AAA']
+    assert starts == {'AAA': 0, 'NEW': FULL}
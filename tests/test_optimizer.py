@@ -0,0 +1,30 @@
+"""Tối ưu danh mục (optimizer.py) với quỹ lịch sử ngắn bị loại"""
+import numpy as np
+import pandas as pd
+import pytest
+
+import optimizer
+
+
+@pytest.fixture
+def returns():
+    idx = pd.bdate_range('2026-01-01', periods=120, name='Date')
+    return pd.DataFrame(np.random.default_rng(0).normal(0.0005, 0.01, (120, 4)), index=idx, columns=list('ABCD'))
+
+
+def test_portfolios_are_long_only_and_fully_invested(returns):
+    res = optimizer.optimize(returns)
+    W = res['portfolios'][list(returns.columns)].to_numpy()
+    np.testing.assert_allclose(W.sum(axis=1), 1.0, atol=1e-8)
+    assert (W >= -1e-12).all()
+    assert len(res['frontier']) == optimizer.N_POINTS and not res['info']['dropped']
+
+
+@pytest.mark.parametrize('short', [list('ABCD'), list('ABC')])
+def test_too_few_funds_returns_empty_result(returns, short):
+    returns = returns.copy()
+    returns.iloc[:len(returns) - optimizer.MIN_OBS + 1, [returns.columns.get_loc(c) for c in short]] = np.nan
+    res = optimizer.optimize(returns)
+    assert res['info']['dropped'] == short
+    assert res['frontier'].empty and res['portfolios'].empty
+    assert list(res['mu'].index) == [c for c in returns.columns if c not in short]
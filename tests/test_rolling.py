@@ -0,0 +1,117 @@
+"""Thống kê trượt O(1) (rolling.py) phải trùng pandas rolling, cập nhật tiến dần phải trùng tính lại từ đầu"""
+import numpy as np
+import pandas as pd
+import pytest
+
+import rolling
+import storage
+import tracking
+from benchmarks.synthetic import make_universe
+from metrics import TRADING_DAYS
+
+WINDOW = 63
+
+
+@pytest.fixture(scope='module')
+def universe():
+    df_close, df_vol = make_universe(n_tickers=8, years=4, seed=1)
+    # Vài phiên thiếu giữa chuỗi để kiểm tra cửa sổ chứa NaN
+    df_close.iloc[300:303, 2] = np.nan
+    df_close.iloc[700, 5] = np.nan
+    return df_close, df_vol
+
+
+@pytest.fixture(scope='module')
+def returns(universe):
+    rets = universe[0].pct_change(fill_method=None)
+    return rets, rets.iloc[:, 0]
+
+
+def assert_same(actual, expected):
+    np.testing.assert_allclose(np.asarray(actual, dtype=float), np.asarray(expected, dtype=float),
+                               rtol=1e-7, atol=1e-10, equal_nan=True)
+
+
+def test_rolling_mean_std_match_pandas(returns):
+    rets, _ = returns
+    for w in (5, WINDOW):
+        assert_same(rolling.rolling_mean(rets, w), rets.rolling(w).mean())
+        assert_same(rolling.rolling_std(rets, w), rets.rolling(w).std())
+    assert_same(rolling.rolling_mean(rets.iloc[:, 3], 20), rets.iloc[:, 3].rolling(20).mean())
+
+
+def test_rolling_cov_matches_pandas(returns):
+    rets, bench = returns
+    expected = pd.DataFrame({c: rets[c].rolling(WINDOW).cov(bench) for c in rets})
+    assert_same(rolling.rolling_cov(rets, bench, WINDOW), expected)
+
+
+def test_tracking_error_and_beta_match_pandas(returns):
+    rets, bench = returns
+    te = rets.sub(bench, axis=0).rolling(WINDOW).std() * np.sqrt(TRADING_DAYS) * 100
+    beta = pd.DataFrame({c: rets[c].rolling(WINDOW).cov(bench) for c in rets}).div(bench.rolling(WINDOW).var(), axis=0)
+    assert_same(rolling.tracking_error(rets, bench, WINDOW), te)
+    assert_same(rolling.rolling_beta(rets, bench, WINDOW), beta)
+
+
+def test_state_roundtrip_continues_identically(returns):
+    rets, bench = returns
+    x, y = rets.to_numpy(), np.broadcast_to(bench.to_numpy()[:, None], rets.shape)
+    ref = rolling.RollingMoments(WINDOW, x.shape[1], paired=True)
+    half = rolling.RollingMoments(WINDOW, x.shape[1], paired=True)
+    for i in range(500):
+        ref.push(x[i], y[i])
+        half.push(x[i], y[i])
+    half = rolling.RollingMoments.from_state(half.state())
+    for i in range(500, len(x)):
+        ref.push(x[i], y[i])
+        half.push(x[i], y[i])
+    assert_same(half.cov, ref.cov)
+    assert_same(half.std, ref.std)
+
+
+@pytest.fixture(scope='module')
+def pairs(universe):
+    # Hai mã đầu đóng vai chỉ số; mã cuối khai báo chỉ số không có dữ liệu -> so với mã đầu tiên
+    tickers = list(universe[0].columns)
+    profile = pd.DataFrame({'Benchmark': [None, None] + [tickers[i % 2] for i in range(2, len(tickers) - 1)] + ['MISSING']},
+                           index=pd.Index(tickers, name='Ticker'))
+    return tracking.benchmark_pairs(tickers, profile, default=tickers[0])
+
+
+def test_pair_outputs_match_pandas(universe, pairs):
+    store = storage.TickStore.from_wide(*universe)
+    cache = rolling.build(store, pairs)
+    ret = store.wide(store.tickers).pct_change()
+    funds = list(pairs)
+    R, B = ret[funds], pd.DataFrame({f: ret[b] for f, b in pairs.items()})
+    expected = {'TE': (R - B).rolling(WINDOW).std() * np.sqrt(TRADING_DAYS) * 100,
+                'Beta': R.rolling(WINDOW).cov(B) / B.rolling(WINDOW).var(),
+                'Corr': R.rolling(WINDOW).corr(B)}
+    for k in rolling.PAIR_OUTPUTS:
+        assert_same(rolling.lookup(cache, k, funds, store.version), expected[k])
+
+
+def test_refresh_matches_full_build(universe, pairs, tmp_path):
+    df_close, df_vol = universe
+    path = str(tmp_path / 'rolling.npz')
+    cut = len(df_close) - 40
+    rolling.refresh(storage.TickStore.from_wide(df_close.iloc[:cut], df_vol.iloc[:cut]), rebuild=True, path=path, pairs=pairs)
+
+    store = storage.TickStore.from_wide(df_close, df_vol)
+    inc = rolling.refresh(store, path=path)
+    full = rolling.build(store, pairs)
+    assert inc['version'] == full['version'] == store.version
+    assert inc['funds'] == full['funds'] == list(pairs)
+    np.testing.assert_array_equal(inc['dates'], full['dates'])
+    for k in rolling.OUTPUTS + rolling.PAIR_OUTPUTS:
+        assert_same(inc[k], full[k])
+
+    ma = rolling.lookup(rolling.load_rolling(path), 'MA50', store.tickers, store.version)
+    assert_same(ma, store.wide(store.tickers).rolling(50).mean())
+
+    te = tracking.rolling_table(rolling.load_rolling(path), 'TE', list(pairs), store.version)
+    assert_same(te, full['TE'])
+    # Cặp quỹ - benchmark thay đổi: tính lại toàn bộ thay vì nối tiếp trạng thái cũ
+    changed = dict(pairs, **{f: store.tickers[1] for f in list(pairs)[:1]})
+    assert_same(rolling.refresh(store, path=path, pairs=changed)['Beta'], rolling.build(store, changed)['Beta'])
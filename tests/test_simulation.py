@@ -0,0 +1,22 @@
+"""Mô phỏng Monte Carlo (simulation.py) với lịch sử giá ngắn"""
+import numpy as np
+import pandas as pd
+import pytest
+
+import simulation
+
+
+@pytest.mark.parametrize('prices', [[], [10.0], [10.0, 10.5], [np.nan, 10.0, 10.5, np.nan]])
+def test_too_short_history_returns_empty_result(prices):
+    res = simulation.monte_carlo(pd.Series(prices, dtype=float), 30, 20_000)
+    assert res['bands'].empty and res['paths'] == 0
+    assert np.isnan(res['prob_up']) and np.isnan(res['median'])
+    assert list(res['bands'].columns) == [f"{q:.0%}" for q in simulation.QUANTILES]
+
+
+@pytest.mark.parametrize('method', simulation.METHODS)
+def test_two_returns_give_finite_bands(method):
+    res = simulation.monte_carlo(pd.Series([10.0, 10.5, 10.2]), 30, 2000, method=method, seed=0)
+    assert len(res['bands']) == 31 and np.isfinite(res['bands'].to_numpy()).all()
+    assert 0 < res['prob_up'] < 100
+    assert res['bands'].iloc[0].eq(10.2).all()
@@ -0,0 +1,55 @@
+"""Phát hiện điều chỉnh giá trong cửa sổ chồng lấn (update_data.detect_restatements)"""
+import numpy as np
+import pandas as pd
+import pytest
+
+import storage
+import update_data
+
+
+@pytest.fixture
+def dates():
+    return pd.bdate_range('2026-09-01', periods=20, name='Date')
+
+
+def window(dates, i):
+    return {'AAA': int(dates[i].tz_localize('UTC').timestamp()), 'BBB': int(dates[i].tz_localize('UTC').timestamp())}
+
+
+def refetch(store, ticker, start, edit=None):
+    df = store.frame(ticker, start=start)
+    return edit(df) if edit else df
+
+
+def test_unchanged_overlap_is_not_restated(dates):
+    store = storage.TickStore.from_wide(pd.DataFrame({'AAA': np.arange(20.0) + 10}, index=dates))
+    frames = {'AAA': refetch(store, 'AAA', dates[10])}
+    assert update_data.detect_restatements(store, frames, window(dates, 10)).empty
+
+
+def test_changed_price_is_restated(dates):
+    store = storage.TickStore.from_wide(pd.DataFrame({'AAA': np.arange(20.0) + 10}, index=dates))
+    frames = {'AAA': refetch(store, 'AAA', dates[10], lambda df: df.assign(Close=df['Close'].where(df.index != dates[12], 99.0)))}
+    rows = update_data.detect_restatements(store, frames, window(dates, 10))
+    assert rows[['Date', 'Old', 'New']].values.tolist() == [[dates[12].date(), 22.0, 99.0]]
+
+
+def test_backfilled_session_is_restated(dates):
+    # BBB thiếu phiên 14 (lần trước tải lỗi) trong khi AAA đã có dữ liệu tới phiên cuối
+    wide = pd.DataFrame({'AAA': np.arange(20.0) + 10, 'BBB': np.arange(20.0) + 50}, index=dates)
+    store = storage.TickStore.from_wide(wide.assign(BBB=wide['BBB'].where(wide.index != dates[14])))
+    frames = {'BBB': wide[['BBB']].rename(columns={'BBB': 'Close'}).assign(Volume=100).iloc[10:]}
+    rows = update_data.detect_restatements(store, frames, window(dates, 10))
+    assert rows[['Ticker', 'Date', 'New']].values.tolist() == [['BBB', dates[14].date(), 64.0]]
+    assert np.isnan(rows['Old'].iloc[0])
+
+
+def test_session_missing_from_refetch_is_restated(dates):
+    store = storage.TickStore.from_wide(pd.DataFrame({'AAA': np.arange(20.0) + 10}, index=dates))
+    frames = {'AAA': refetch(store, 'AAA', dates[10], lambda df: df.drop(dates[15]))}
+    rows = update_data.detect_restatements(store, frames, window(dates, 10))
+    assert rows[['Ticker', 'Date', 'Old']].values.tolist() == [['AAA', dates[15].date(), 25.0]]
+    assert np.isnan(rows['New'].iloc[0])
+    # upsert thật sự xóa phiên này khỏi partition
+    store.upsert('AAA', frames['AAA'], window_start=dates[10])
+    assert dates[15] not in store.frame('AAA').index
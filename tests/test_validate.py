@@ -0,0 +1,78 @@
+"""Kiểm tra dữ liệu (validate.py): biên độ giá sau phiên ngắt quãng, ghi nhớ lỗi đã xác nhận / lặp lại"""
+import numpy as np
+import pandas as pd
+import pytest
+
+import storage
+import validate
+
+
+@pytest.fixture
+def dates():
+    return pd.bdate_range('2026-03-02', periods=40, name='Date')
+
+
+def store_with(dates, **columns):
+    base = np.linspace(10.0, 11.0, len(dates))
+    df = pd.DataFrame({t: base.copy() for t in ['REF'] + list(columns)}, index=dates)
+    for t, edit in columns.items():
+        edit(df[t].to_numpy())
+    return storage.TickStore.from_wide(df, pd.DataFrame(1000, index=dates, columns=df.columns))
+
+
+def jumps(issues):
+    return issues[issues['Check'] == 'jump'][['Ticker', 'Date']].apply(tuple, axis=1).tolist()
+
+
+def test_jump_after_adjacent_session(dates):
+    def split(c):
+        c[20:] *= 2
+    issues = validate.validate(store_with(dates, AAA=split))
+    assert jumps(issues) == [('AAA', dates[20])]
+    assert validate.quarantined(issues) == ['AAA']
+
+
+def test_jump_skipped_after_trading_gap(dates):
+    def suspended(c):
+        c[17:20] = np.nan     # Tạm ngừng giao dịch 3 phiên, mở lại với giá tham chiếu mới
+        c[20:] *= 1.3
+    issues = validate.validate(store_with(dates, AAA=suspended))
+    assert jumps(issues) == []
+    assert set(issues.loc[issues['Ticker'] == 'AAA', 'Check']) <= {'gap', 'outlier'}
+
+
+def test_market_holiday_is_not_a_gap(dates):
+    def split(c):
+        c[20:] *= 2
+    store = store_with(dates, AAA=split)
+    holiday = storage.TickStore.from_wide(store.wide(store.tickers).drop(dates[19]))   # Cả thị trường nghỉ
+    assert jumps(validate.validate(holiday)) == [('AAA', dates[20])]
+
+
+def issue(value, date='2026-03-30', check='jump', severity='error', new=True):
+    return pd.DataFrame({'Ticker': ['AAA'], 'Date': [pd.Timestamp(date)], 'Check': [check], 'Severity': [severity],
+                         'Close': [20.0], 'Volume': [1000], 'Value': [value], 'New': [new]})
+
+
+def test_repeated_jump_becomes_warning(tmp_path):
+    path = str(tmp_path / 'anomalies.csv')
+    for _ in range(validate.JUMP_REPEATS):
+        anomalies = validate.load_anomalies(path)
+        issues = validate.acknowledge(issue(1.0), anomalies)
+        assert validate.quarantined(issues) == ['AAA']
+        validate.save_anomalies(validate.remember(issues, anomalies), path)
+    anomalies = validate.load_anomalies(path)
+    assert anomalies['Seen'].tolist() == [validate.JUMP_REPEATS]
+    assert validate.quarantined(validate.acknowledge(issue(1.0), anomalies)) == []
+    # Giá trị khác trên cùng phiên (dữ liệu bị điều chỉnh lại) là lỗi mới
+    assert validate.quarantined(validate.acknowledge(issue(0.5), anomalies)) == ['AAA']
+    assert validate.remember(issue(0.5), anomalies)[['Value', 'Seen']].values.tolist() == [[0.5, 1]]
+
+
+def test_accepted_anomalies_are_remembered(tmp_path):
+    path = str(tmp_path / 'anomalies.csv')
+    validate.save_anomalies(validate.remember(issue(np.nan, check='stale'), validate.load_anomalies(path), accept=True), path)
+    anomalies = validate.load_anomalies(path)
+    assert anomalies['Acked'].tolist() == [True]
+    assert validate.quarantined(validate.acknowledge(issue(np.nan, check='stale'), anomalies)) == []
+    assert validate.quarantined(validate.acknowledge(issue(np.nan, date='2026-03-31', check='stale'), anomalies)) == ['AAA']
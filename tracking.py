@@ -0,0 +1,146 @@
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+import rolling
+import snapshot
+import storage
+from cube import BENCH, PRESETS, preset_start
+from metrics import TRADING_DAYS, benchmark_matrix, calculate_returns, resolve_benchmarks
+
+# Theo dõi chỉ số tham chiếu riêng của từng ETF (cột Benchmark trong funds_profile.csv), tính sẵn theo phiên bản dữ liệu.
+# Mọi quỹ và mọi preset được suy ra từ một lần cộng dồn (cumsum) các tổng n, Σa, Σa², Σx, Σy, ...
+# Chuỗi trượt TE / Beta / tương quan được cập nhật tiến dần trong cache thống kê trượt (rolling.py).
+TRACKING_PATH = os.path.join(storage.DATA_DIR, 'tracking.npz')
+ROLL_WINDOW = rolling.TE_WINDOW
+TRACKING_COLUMNS = ["Tracking Error", "Tracking Difference", "Active Return", "Information Ratio", "Correlation", "Obs"]
+ROLLING_OUTPUTS = rolling.PAIR_OUTPUTS
+SUMS = ('n', 'a', 'aa', 'x', 'y', 'xx', 'yy', 'xy', 'lx', 'ly')
+
+
+def _profile(df_profile):
+    return df_profile.set_index('Ticker') if 'Ticker' in df_profile.columns else df_profile
+
+
+def own_benchmarks(tickers, df_profile):
+    """{quỹ: benchmark khai báo} cho các mã có cột Benchmark (chỉ số thì không có)"""
+    bench = _profile(df_profile).get('Benchmark', pd.Series(dtype=object))
+    return {t: bench[t] for t in tickers if isinstance(bench.get(t), str) and bench[t]}
+
+
+def benchmark_pairs(tickers, df_profile, default=BENCH):
+    """{quỹ: benchmark đã dùng}: benchmark khai báo nếu có dữ liệu giá, không thì `default`"""
+    return resolve_benchmarks(list(own_benchmarks(tickers, df_profile)), _profile(df_profile), tickers, default)
+
+
+def _cumsums(R, B):
+    """Tổng cộng dồn (T+1 dòng, dòng đầu = 0) trên các phiên cả quỹ và benchmark đều có lợi nhuận"""
+    valid = ~np.isnan(R) & ~np.isnan(B)
+    x, y = np.where(valid, R, 0.0), np.where(valid, B, 0.0)
+    a = x - y
+    parts = {'n': valid.astype(np.float64), 'a': a, 'aa': a * a, 'x': x, 'y': y, 'xx': x * x, 'yy': y * y,
+             'xy': x * y, 'lx': np.log1p(x), 'ly': np.log1p(y)}
+    zero = np.zeros((1, R.shape[1]))
+    return {k: np.vstack([zero, np.cumsum(v, axis=0)]) for k, v in parts.items()}
+
+
+def _stats(s):
+    """Các chỉ số theo dõi từ tổng cửa sổ s (dict mảng cùng kích thước)"""
+    n = s['n']
+    with np.errstate(invalid='ignore', divide='ignore'):
+        var_a = (s['aa'] - s['a'] ** 2 / n) / (n - 1)
+        te = np.sqrt(np.maximum(var_a, 0.0) * TRADING_DAYS)
+        active = s['a'] / n * TRADING_DAYS
+        cov = s['xy'] - s['x'] * s['y'] / n
+        corr = cov / np.sqrt((s['xx'] - s['x'] ** 2 / n) * (s['yy'] - s['y'] ** 2 / n))
+        td = np.expm1(s['lx']) - np.expm1(s['ly'])   # Lợi nhuận tích lũy quỹ - benchmark trên các phiên chung
+        ir = active / te
+    ok = n > 1
+    return {"Tracking Error": np.where(ok, te * 100, np.nan), "Tracking Difference": np.where(ok, td * 100, np.nan),
+            "Active Return": np.where(ok, active * 100, np.nan), "Information Ratio": np.where(ok & (te > 0), ir, np.nan),
+            "Correlation": np.where(ok, corr, np.nan), "Obs": n}
+
+
+def build_tracking(store, df_profile, default=BENCH):
+    """Bảng theo dõi (preset x quỹ x chỉ số) cho mọi ETF có benchmark.
+
+    Quỹ có benchmark chưa có dữ liệu giá (vd. VN70, VNFINSELECT) được so với `default` và đánh dấu missing.
+    """
+    own = own_benchmarks(store.tickers, df_profile)
+    funds = list(own)
+    used = benchmark_pairs(store.tickers, df_profile, default)
+    missing = [f for f in funds if own[f] not in store]
+    cols = list(dict.fromkeys(funds + list(used.values())))
+    ret = calculate_returns(store.wide(cols))
+    R = ret[funds].to_numpy(dtype=np.float64)
+    B = benchmark_matrix(ret, used).to_numpy(dtype=np.float64)
+    cs = _cumsums(R, B)
+    dates = ret.index
+
+    # Preset: tổng trong cửa sổ = hiệu hai dòng cumsum (bỏ lợi nhuận vào phiên đầu cửa sổ, như daily_ret của dashboard)
+    end_d, first_d = store.last_date(), store.first_date()
+    values = np.full((len(PRESETS), len(funds), len(TRACKING_COLUMNS)), np.nan)
+    for i, preset in enumerate(PRESETS):
+        lo = dates.searchsorted(preset_start(preset, end_d, first_d)) + 1
+        stats = _stats({k: v[-1] - v[min(lo, len(dates))] for k, v in cs.items()})
+        values[i] = np.column_stack([stats[c] for c in TRACKING_COLUMNS])
+
+    return {'version': store.version, 'funds': funds, 'benchmarks': [own[f] for f in funds],
+            'used': [used[f] for f in funds], 'missing': missing, 'presets': PRESETS, 'columns': TRACKING_COLUMNS,
+            'values': values}
+
+
+def save_tracking(trk, path=TRACKING_PATH):
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp = path + '.tmp.npz'
+    np.savez(tmp, version=np.array(trk['version']), funds=np.array(trk['funds'], dtype=str),
+             benchmarks=np.array(trk['benchmarks'], dtype=str), used=np.array(trk['used'], dtype=str),
+             missing=np.array(trk['missing'], dtype=str), presets=np.array(trk['presets']),
+             columns=np.array(trk['columns']), values=trk['values'])
+    os.replace(tmp, path)
+
+
+def load_tracking(path=TRACKING_PATH):
+    """Đọc bảng theo dõi đã lưu (None nếu chưa có)"""
+    if not os.path.exists(path):
+        return None
+    with np.load(path) as z:
+        out = {k: z[k].tolist() for k in ('funds', 'benchmarks', 'used', 'missing', 'presets', 'columns')}
+        return {'version': str(z['version']), 'values': z['values'], **out}
+
+
+def table(trk, preset, tickers=None):
+    """Bảng quỹ x chỉ số theo dõi cho một preset, kèm benchmark khai báo / benchmark đã dùng"""
+    funds = [f for f in (tickers or trk['funds']) if f in trk['funds']]
+    idx = [trk['funds'].index(f) for f in funds]
+    out = pd.DataFrame(trk['values'][trk['presets'].index(preset)][idx], index=pd.Index(funds, name='Ticker'),
+                       columns=trk['columns'])
+    out.insert(0, 'Benchmark', [trk['benchmarks'][i] for i in idx])
+    out.insert(1, 'Used', [trk['used'][i] for i in idx])
+    out['Missing'] = [f in trk['missing'] for f in funds]
+    return out
+
+
+def rolling_table(roll, kind, tickers, version, start=None, end=None):
+    """Bảng ngày x quỹ của chuỗi trượt (TE % / Beta / Corr) trong [start, end] từ cache rolling.py; None nếu cache cũ"""
+    if roll is None:
+        return None
+    return rolling.lookup(roll, kind, [f for f in tickers if f in roll['funds']], version, start, end)
+
+
+def refresh(store, df_profile, path=TRACKING_PATH):
+    """Tính lại bảng theo dõi sau mỗi lần cập nhật dữ liệu"""
+    t0 = time.perf_counter()
+    trk = build_tracking(store, df_profile)
+    save_tracking(trk, path)
+    note = f", thiếu benchmark: {', '.join(f'{f}->{b}' for f, b in zip(trk['funds'], trk['benchmarks']) if f in trk['missing'])}" if trk['missing'] else ""
+    print(f"🎯 Đã tính tracking cho {len(trk['funds'])} ETF theo benchmark riêng ({time.perf_counter() - t0:.2f}s{note})")
+    return trk
+
+
+if __name__ == "__main__":
+    with snapshot.update() as snap:
+        profile = pd.read_csv(snap.path('profile'))
+        snap.version = refresh(snap.open_store(), profile, snap.path('tracking'))['version']
@@ -1,7 +1,23 @@
+import argparse
+import os
+import shutil
+import sys
+import numpy as np
 import pandas as pd
-import requests
 import time
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
+
+import cube
+import fetcher
+import httpcache
+import instrument
+import refresh
+import rolling
+import snapshot
+import storage
+import tracking
+import validate
+import volume
 
 # --- 1. MASTER DATA CHUẨN HÓA (ETFs & Indices) ---
 # Đã cập nhật theo danh sách bạn cung cấp
@@ -43,95 +59,276 @@ MASTER_DATA = [
 # Thời điểm bắt đầu lấy dữ liệu (2014)
 START_TIMESTAMP = 1388534400 
 
-def create_dimension_table():
-    """Tạo file funds_profile.csv chuẩn hóa"""
+# Incremental: tải lại N ngày gần nhất để bắt các điều chỉnh giá (restatement)
+OVERLAP_DAYS = 10
+RESTATE_TOL = 1e-6
+
+def create_dimension_table(paths=('funds_profile.csv',)):
+    """Tạo file funds_profile.csv chuẩn hóa (ghi file tạm rồi os.replace)"""
     df = pd.DataFrame(MASTER_DATA)
     # Sắp xếp cho đẹp
     df = df[['Ticker', 'Name', 'Issuer', 'Type', 'Benchmark', 'Launch', 'Fee']]
-    df.to_csv('funds_profile.csv', index=False)
+    for path in paths:
+        df.to_csv(path + '.tmp', index=False)
+        os.replace(path + '.tmp', path)
     print("✅ Đã chuẩn hóa Master Data: funds_profile.csv")
     return df
 
-def get_vndirect_data(symbol):
-    """Lấy dữ liệu Full History từ VNDIRECT"""
+def publish_profile(src, path='funds_profile.csv'):
+    """Chép funds_profile.csv của snapshot đã commit ra thư mục gốc (ghi file tạm rồi os.replace)"""
+    shutil.copyfile(src, path + '.tmp')
+    os.replace(path + '.tmp', path)
+
+def get_vndirect_data(symbol, cache=None):
+    """Lấy dữ liệu Full History từ VNDIRECT cho một mã (báo lỗi thay vì trả về bảng rỗng)"""
     print(f"   -> Đang tải {symbol}...")
-    current_ts = int(time.time())
-    
-    # API của VNDIRECT
-    url = f"https://dchart-api.vndirect.com.vn/dchart/history?resolution=D&symbol={symbol}&from={START_TIMESTAMP}&to={current_ts}"
-    headers = {
-        'User-Agent': 'Mozilla/5.0',
-        'Referer': 'https://dchart.vndirect.com.vn/'
-    }
-    
-    try:
-        response = requests.get(url, headers=headers, timeout=20)
-        if response.status_code == 200:
-            data = response.json()
-            if 't' in data and 'c' in data:
-                df = pd.DataFrame({
-                    'Date': pd.to_datetime(data['t'], unit='s'),
-                    'Close': data['c'],
-                    'Volume': data.get('v', 0)
-                })
-                df['Date'] = df['Date'].dt.normalize()
-                # Loại bỏ các giá trị 0 hoặc NaN
-                df = df[df['Close'] > 0]
-                return df.set_index('Date')
-    except Exception as e:
-        print(f"❌ Lỗi tải {symbol}: {e}")
-    
-    return pd.DataFrame()
-
-def update_csv():
+    with fetcher.make_session(1) as session:
+        df, stat = fetcher.fetch_one(session, symbol, START_TIMESTAMP, fetcher.day_end(time.time()), cache=cache)
+    if stat['Error']:
+        raise RuntimeError(f"Lỗi tải {symbol}: {stat['Error']}")
+    return df
+
+def plan_start_timestamps(tickers, store, full=False, overlap_days=OVERLAP_DAYS):
+    """Mốc 'from' cho từng mã: full history cho mã mới / khi rebuild, còn lại từ ngày cuối - overlap"""
+    starts = {}
+    for ticker in tickers:
+        last_date = None if full or store is None else store.last_date(ticker)
+        if last_date is None:
+            starts[ticker] = START_TIMESTAMP
+        else:
+            window_start = last_date - timedelta(days=overlap_days)
+            starts[ticker] = max(START_TIMESTAMP, int(window_start.replace(tzinfo=timezone.utc).timestamp()))
+    return starts
+
+def window_start_date(ts):
+    return pd.Timestamp(datetime.fromtimestamp(ts, tz=timezone.utc).date())
+
+def detect_restatements(store, frames, starts, tol=RESTATE_TOL):
+    """So sánh giá mới tải với giá đã lưu trong cửa sổ chồng lấn.
+
+    Phiên mới của một mã nằm trước ngày cuối của cả bảng (vd. phiên bị thiếu do lần trước tải lỗi, nay được
+    bổ sung) cũng tính là điều chỉnh (Old = NaN): các thống kê cộng dồn đã dùng giá ffill cho phiên đó.
+    Phiên đã lưu mà lần tải lại không còn trả về bị upsert xóa nên cũng là điều chỉnh (New = NaN).
+    """
+    rows = []
+    end = store.last_date() if store else None
+    for ticker, df in frames.items():
+        if store is None or df.empty or ticker not in store or starts[ticker] == START_TIMESTAMP:
+            continue
+        start = window_start_date(starts[ticker])
+        old = store.series(ticker, start=start).astype(float)
+        new = df['Close'].reindex(old.index)
+        changed = new.isna() | ((new - old).abs() > tol * old.abs())
+        for d in old.index[changed]:
+            rows.append({'Ticker': ticker, 'Date': d.date(), 'Old': old[d], 'New': new[d]})
+        fresh = df['Close'][~df.index.isin(old.index) & (df.index >= start) & (df.index <= end)]
+        for d, price in fresh.items():
+            rows.append({'Ticker': ticker, 'Date': d.date(), 'Old': np.nan, 'New': price})
+    return pd.DataFrame(rows, columns=['Ticker', 'Date', 'Old', 'New'])
+
+def merge_replayed(store, frames, starts):
+    """Offline: ghép dữ liệu dựng lại từ cache lên lịch sử đã lưu, phiên trùng thì dữ liệu từ cache thắng.
+
+    Phiên đã lưu mà cache không có (vd. phản hồi incremental đã bị evict) được giữ nguyên; mốc 'from' của mã
+    được đặt về ngày đầu dựng lại được để upsert / so điều chỉnh trên cả đoạn đó.
+    Trả về danh sách mã mà cache không phủ tới ngày đầu đã lưu (không dựng lại được trọn vẹn).
+    """
+    short = []
+    for ticker, df in frames.items():
+        if store is None or df.empty or ticker not in store or store.first_date(ticker) is None:
+            continue
+        if df.index[0] > store.first_date(ticker):
+            short.append(ticker)
+            continue
+        old = store.frame(ticker)
+        frames[ticker] = pd.concat([df, old[~old.index.isin(df.index)]]).sort_index()
+        starts[ticker] = int(df.index[0].tz_localize(timezone.utc).timestamp())
+    return short
+
+def open_tick_store(full=False, root=storage.TICK_DIR):
+    """Mở TickStore trên đĩa; lần đầu thì chuyển đổi từ bảng wide cũ để không phải tải lại từ 2014"""
+    store = storage.TickStore(root)
+    if store or full:
+        return store
+    legacy = storage.open_store()
+    if legacy is None:
+        return store
+    print(f"🔁 Chuyển {len(legacy.tickers)} mã từ bảng wide sang TickStore...")
+    for ticker in legacy.tickers:
+        store.write(ticker, np.array(legacy.read(ticker)))
+    store.save_manifest(legacy.tickers)
+    return store
+
+def update_csv(workers=fetcher.MAX_WORKERS, rate=fetcher.RATE_PER_SEC, full=False, export_csv=False,
+               wait=True, progress_path=None, cache_mode='on', cache_ttl=httpcache.TTL, accept_anomalies=False,
+               backend=None):
+    """Ghi toàn bộ dữ liệu mới vào một snapshot mới; chỉ đổi con trỏ CURRENT khi mọi bước đã xong.
+
+    Dashboard vẫn đọc snapshot cũ trong suốt quá trình cập nhật; lỗi giữa chừng thì snapshot mới bị bỏ.
+    wait=False: báo snapshot.Busy ngay nếu đang có tiến trình khác cập nhật.
+    progress_path: ghi tiến độ (giai đoạn, số mã đã tải, byte, lỗi) ra file JSON cho dashboard đọc.
+    cache_mode: cache phản hồi API trên đĩa (httpcache.MODES); 'offline' dựng lại từ cache, ghép lên lịch sử đã lưu.
+    accept_anomalies: vẫn nhận dữ liệu mới của mã có lỗi nghiêm trọng (mặc định: cách ly, giữ dữ liệu cũ);
+    các lỗi được nhận ghi vào validate.ANOMALY_PATH nên không bị cách ly lại (vd. khi tải lại --full).
+    backend: ghi thêm bảng wide close/volume theo storage.BACKENDS (npy / parquet / csv) cho công cụ đọc bảng wide.
+    Trả về TickStore của snapshot mới, None nếu snapshot bị hủy (không tải được gì / mọi dữ liệu mới bị cách ly).
+    """
+    progress = refresh.Progress(progress_path) if progress_path else None
+    tracer = instrument.Tracer('update', on_start=progress.stage if progress else None).start()
+    # Ghim phản hồi lịch sử đầy đủ: các lần incremental không dùng lại nên không được để evict() xóa
+    cache = httpcache.HttpCache(ttl=cache_ttl, mode=cache_mode, pinned={'from': START_TIMESTAMP})
+    with snapshot.update(wait=wait) as snap:
+        store = build_snapshot(snap, tracer, workers, rate, full, export_csv, progress, cache, accept_anomalies, backend)
+        if store is None:
+            snap.abort()
+        else:
+            snap.version = store.version
+    if store is not None:
+        # Bản ở thư mục gốc chỉ đổi sau khi snapshot đã commit (snapshot bị hủy thì giữ nguyên)
+        publish_profile(snap.path('profile'))
+    if cache.mode != 'off' and not cache.offline:
+        tracer.call('cache_evict', cache.evict)
+    tracer.finish({'snapshot': None if store is None else snap.id, 'full': full, 'http_cache': dict(cache.stats, mode=cache.mode)})
+    if progress:
+        progress.stage('done' if store is not None else 'failed')
+    if cache.mode != 'off':
+        print(cache.report())
+    if store is None:
+        return None
+    print(tracer.report())
+    print(f"📸 Snapshot {snap.id} (phiên bản {store.version})")
+    print(f"✅ HOÀN TẤT! Dữ liệu từ {store.first_date().date()} đến {store.last_date().date()}")
+    return store
+
+def build_snapshot(snap, tracer, workers, rate, full, export_csv, progress=None, cache=None, accept_anomalies=False,
+                   backend=None):
     # 1. Tạo Dimension Table
-    df_profile = create_dimension_table()
+    with tracer.span('profile'):
+        df_profile = create_dimension_table((snap.path('profile'),))
     tickers_to_fetch = df_profile['Ticker'].tolist()
 
-    # 2. Tải dữ liệu Fact Tables
-    print(f"⏳ Bắt đầu tải dữ liệu lịch sử cho {len(tickers_to_fetch)} mã...")
-    
-    close_list = []
-    vol_list = []
-    
-    for ticker in tickers_to_fetch:
-        df = get_vndirect_data(ticker)
-        if not df.empty:
-            close_list.append(df['Close'].rename(ticker))
-            vol_list.append(df['Volume'].rename(ticker))
-        time.sleep(1) # Delay nhẹ để tránh bị chặn
-
-    if not close_list:
+    # 2. Tải dữ liệu Fact Tables (incremental nếu đã có dữ liệu)
+    offline = cache is not None and cache.offline
+    with tracer.span('plan'):
+        store = open_tick_store(full=full, root=snap.path('ticks'))
+        starts = plan_start_timestamps(tickers_to_fetch, store, full=full)
+    n_full = sum(ts == START_TIMESTAMP for ts in starts.values())
+    if progress:
+        progress.set_total(len(tickers_to_fetch))
+    t0 = time.perf_counter()
+    if offline:
+        print(f"📼 Offline: dựng lại {len(tickers_to_fetch)} mã từ cache {cache.root}...")
+        with tracer.span('fetch'):
+            frames, stats = fetcher.replay_all(tickers_to_fetch, cache, progress=progress.ticker if progress else None)
+        short = merge_replayed(store, frames, starts)
+        if short:
+            print(f"❌ Offline: cache không phủ tới ngày đầu đã lưu của {', '.join(short)}"
+                  " (thiếu phản hồi lịch sử đầy đủ), giữ nguyên snapshot hiện tại")
+            return None
+    else:
+        print(f"⏳ Bắt đầu tải dữ liệu cho {len(tickers_to_fetch)} mã ({n_full} full history, {len(starts) - n_full} incremental)...")
+        with tracer.span('fetch'):
+            frames, stats = fetcher.fetch_all(tickers_to_fetch, starts, workers=workers, rate=rate,
+                                              progress=progress.ticker if progress else None, cache=cache)
+    print(f"⏱️ Tải xong trong {time.perf_counter() - t0:.2f}s")
+    print(stats[['Attempts', 'Wait', 'Seconds', 'Rows', 'Bytes', 'Cache']].round(3).to_string())
+    failed = stats.index[stats['Error'].notna()].tolist()
+    if failed:
+        kept = [t for t in failed if t in store]
+        print(f"⚠️ {len(failed)} mã tải lỗi: {', '.join(failed)}"
+              + (f" (giữ dữ liệu cũ: {', '.join(kept)})" if kept else "")
+              + (f" · không có dữ liệu, bị bỏ khỏi bảng: {', '.join(t for t in failed if t not in kept)}" if len(kept) < len(failed) else ""))
+
+    if all(df.empty for df in frames.values()):
         print("❌ Không tải được dữ liệu nào!")
-        return
+        return None
 
-    # 3. Gộp và Xử lý
+    # 3. Gộp vào TickStore (mỗi mã một partition, trong cửa sổ đã tải thì dữ liệu mới là chuẩn)
     print("🔄 Đang xử lý và gộp dữ liệu...")
-    
-    # Gộp giá (Close Price)
-    df_close = pd.concat(close_list, axis=1)
-    df_close.sort_index(inplace=True)
-    df_close.ffill(inplace=True) # Lấp đầy ngày nghỉ
-    df_close.dropna(how='all', inplace=True)
-    
-    # Gộp khối lượng (Volume)
-    df_vol = pd.concat(vol_list, axis=1)
-    df_vol.sort_index(inplace=True)
-    df_vol.fillna(0, inplace=True)
-
-    # Lọc từ ngày bắt đầu
-    start_date_str = datetime.fromtimestamp(START_TIMESTAMP).strftime('%Y-%m-%d')
-    df_close = df_close[df_close.index >= start_date_str]
-    df_vol = df_vol[df_vol.index >= start_date_str]
-
-    # 4. Lưu file
-    df_close.index.name = 'Date'
-    df_vol.index.name = 'Date'
-    
-    df_close.reset_index().to_csv('funds_data.csv', index=False)
-    df_vol.reset_index().to_csv('funds_volume.csv', index=False)
-    
-    print(f"✅ HOÀN TẤT! Dữ liệu từ {df_close.index.min().date()} đến {df_close.index.max().date()}")
+    with tracer.span('restatements'):
+        restated = detect_restatements(store, frames, starts)
+    if not restated.empty:
+        print(f"⚠️ Phát hiện {len(restated)} giá bị điều chỉnh lại hoặc phiên cũ được bổ sung (Old = NaN) / bị xóa (New = NaN) trong cửa sổ chồng lấn:")
+        print(restated.to_string(index=False))
+
+    previous, fresh = {}, {}
+    with tracer.span('upsert'):
+        for ticker in tickers_to_fetch:
+            df = frames.get(ticker)
+            if df is None or df.empty:
+                continue  # Tải lỗi -> giữ nguyên dữ liệu cũ
+            window = None if starts[ticker] == START_TIMESTAMP else window_start_date(starts[ticker])
+            previous[ticker] = np.array(store.read(ticker))
+            store.upsert(ticker, df, window_start=window)
+            fresh[ticker] = validate.changed_dates(previous[ticker], store.read(ticker))
+
+    # 4. Kiểm tra chất lượng dữ liệu; mã có lỗi nghiêm trọng trong phần dữ liệu mới bị cách ly (giữ partition cũ)
+    with_data = [t for t in tickers_to_fetch if len(store.read(t))]
+    anomalies = validate.load_anomalies()
+    issues = tracer.call('validate', validate.run, store, df_profile, fresh, snap.path('quarantine'), with_data, anomalies)
+    bad = validate.quarantined(issues)
+    # Ghi nhận cả khi snapshot bị hủy: lỗi lặp lại qua nhiều lần cập nhật mới được hạ xuống cảnh báo
+    validate.save_anomalies(validate.remember(issues, anomalies, accept=accept_anomalies))
+    if bad and accept_anomalies:
+        print(f"⚠️ Vẫn nhận dữ liệu mới của {len(bad)} mã có lỗi nghiêm trọng: {', '.join(bad)}")
+    elif bad:
+        for ticker in bad:
+            store.write(ticker, previous[ticker])
+        print(f"🚧 Cách ly {len(bad)} mã (giữ dữ liệu cũ): {', '.join(bad)} · chi tiết trong {snapshot.FILES['quarantine']} của snapshot")
+        if all(t in bad for t, d in fresh.items() if len(d)):
+            report_path = os.path.join(validate.REPORT_DIR, 'quarantine.csv')   # Snapshot bị hủy: lưu báo cáo ra ngoài
+            validate.save_report(issues, report_path)
+            print(f"❌ Mọi dữ liệu mới đều bị cách ly, giữ nguyên snapshot hiện tại (báo cáo: {report_path})")
+            return None
+
+    # 5. Lưu manifest (chỉ giữ các mã có trong MASTER_DATA và đã có dữ liệu)
+    with tracer.span('manifest'):
+        store.save_manifest([t for t in tickers_to_fetch if len(store.read(t))])
+    print(f"💾 Đã lưu TickStore: {len(store.tickers)} mã tại {store.root}")
+    rebuild = full or not restated.empty
+    tracer.call('cube', cube.refresh, store, path=snap.path('cube'), rebuild=rebuild)
+    tracer.call('rolling', rolling.refresh, store, rebuild=rebuild, path=snap.path('rolling'),
+                pairs=tracking.benchmark_pairs(store.tickers, df_profile))
+    tracer.call('volume', volume.refresh, store, path=snap.path('volume'))
+    tracer.call('tracking', tracking.refresh, store, df_profile, path=snap.path('tracking'))
+
+    if export_csv or backend:
+        with tracer.span('export'):
+            start_date = window_start_date(START_TIMESTAMP)
+            df_close = store.wide(store.tickers, start=start_date).dropna(how='all')
+            df_vol = store.wide(store.tickers, start=start_date, field='volume').reindex(df_close.index).fillna(0)
+            if export_csv:
+                storage.export_csv(df_close, df_vol)
+                print("💾 Đã xuất funds_data.csv, funds_volume.csv")
+            if backend:
+                used = storage.save_tables(df_close, df_vol, backend=backend)
+                print(f"💾 Đã ghi bảng wide (backend: {used})")
+    return store
 
 if __name__ == "__main__":
-    update_csv()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Cập nhật dữ liệu ETF từ VNDIRECT")
+    parser.add_argument('--workers', type=int, default=fetcher.MAX_WORKERS, help="Số luồng tải song song")
+    parser.add_argument('--rate', type=float, default=fetcher.RATE_PER_SEC, help="Số request tối đa mỗi giây")
+    parser.add_argument('--full', action='store_true', help="Tải lại toàn bộ lịch sử từ 2014 thay vì incremental")
+    parser.add_argument('--export-csv', action='store_true', help="Xuất thêm funds_data.csv / funds_volume.csv")
+    parser.add_argument('--backend', choices=list(storage.BACKENDS),
+                        help="Ghi thêm bảng wide close/volume theo định dạng này (npy/parquet tại data/, csv tại thư mục gốc)")
+    parser.add_argument('--no-wait', action='store_true', help="Thoát ngay (mã 75) nếu đang có tiến trình khác cập nhật")
+    parser.add_argument('--progress', help="File JSON ghi tiến độ (dùng bởi worker nền của dashboard)")
+    parser.add_argument('--cache', choices=httpcache.MODES, default='on',
+                        help="Cache phản hồi API trên đĩa: on / refresh (luôn hỏi lại server) / offline / off")
+    parser.add_argument('--offline', action='store_true', help="Dựng lại dữ liệu chỉ từ cache, không gọi mạng (= --cache offline)")
+    parser.add_argument('--cache-ttl', type=float, default=httpcache.TTL, help="Số giây một phản hồi trong cache còn hạn")
+    parser.add_argument('--accept-anomalies', action='store_true',
+                        help="Vẫn nhận dữ liệu mới của mã có lỗi nghiêm trọng và ghi nhớ các lỗi này (mặc định: cách ly, giữ dữ liệu cũ)")
+    args = parser.parse_args()
+    try:
+        store = update_csv(workers=args.workers, rate=args.rate, full=args.full, export_csv=args.export_csv,
+                   wait=not args.no_wait, progress_path=args.progress,
+                   cache_mode='offline' if args.offline else args.cache, cache_ttl=args.cache_ttl,
+                   accept_anomalies=args.accept_anomalies, backend=args.backend)
+    except snapshot.Busy as e:
+        print(f"⏸️ {e}")
+        sys.exit(refresh.BUSY_EXIT)
+    if store is None:
+        sys.exit(1)   # Snapshot bị hủy: cron / worker nền báo lỗi thay vì 'done'
@@ -0,0 +1,311 @@
+import argparse
+import os
+import time
+import warnings
+
+import numpy as np
+import pandas as pd
+
+import snapshot
+import storage
+from cube import BENCH
+from metrics import resolve_benchmarks
+
+# Kiểm tra chất lượng dữ liệu giá / khối lượng sau mỗi lần tải, vector hóa trên cả ma trận phiên x mã
+# (dữ liệu gốc trong TickStore, không ffill). Mã có lỗi mức 'error' trong dữ liệu mới bị cách ly:
+# giữ nguyên partition cũ, snapshot mới không nhận dữ liệu hỏng.
+REPORT_DIR = 'reports'
+# Lỗi đã gặp qua các lần cập nhật (nằm ngoài snapshot): số lần bị cách ly và đã được xác nhận (--accept-anomalies) chưa
+ANOMALY_PATH = os.path.join(storage.DATA_DIR, 'anomalies.csv')
+ANOMALY_COLUMNS = ['Ticker', 'Date', 'Check', 'Value', 'Seen', 'Acked']
+JUMP_REPEATS = 3          # Nhà cung cấp trả cùng một 'jump' chừng này lần thì coi là biến động thật (vd. ngày GDKHQ)
+PRICE_LIMIT = 0.07        # Biên độ dao động giá trong phiên của HOSE (so với giá tham chiếu = giá đóng cửa trước)
+LIMIT_TOL = 0.005         # Dung sai làm tròn bước giá
+OUTLIER_Z = 12.0          # Ngưỡng z-score (median / MAD) của lợi nhuận vượt benchmark
+OUTLIER_MIN = 0.05        # ... và lợi nhuận vượt tối thiểu, tránh báo lỗi ở quỹ rất ít biến động
+FLAT_DAYS = 10            # Số phiên liên tiếp giá không đổi thì cảnh báo
+STALE_DAYS = 3            # Số phiên liên tiếp lặp lại y nguyên (giá, khối lượng > 0) của phiên trước thì coi là dữ liệu treo
+FIXED_HOLIDAYS = ((1, 1), (4, 30), (5, 1), (9, 2))   # Nghỉ lễ dương lịch; Tết, Giỗ Tổ, nghỉ bù được suy ra từ dữ liệu
+CHECKS = {
+    'invalid': 'error',    # Giá <= 0 / khối lượng âm
+    'jump': 'error',       # Vượt biên độ giá so với phiên liền trước (thường do chia tách / đổi đơn vị giá)
+    'stale': 'error',      # Nhà cung cấp lặp lại phiên cũ
+    'weekend': 'error',    # Có phiên vào thứ 7 / chủ nhật
+    'outlier': 'warning',  # Lợi nhuận vượt benchmark bất thường
+    'flat': 'warning',     # Giá đứng yên quá lâu
+    'gap': 'warning',      # Thiếu phiên so với lịch giao dịch
+    'holiday': 'warning',  # Có phiên vào ngày nghỉ lễ cố định
+    'volume': 'warning',   # Giá đổi nhưng khối lượng = 0
+}
+ISSUE_COLUMNS = ['Ticker', 'Date', 'Check', 'Severity', 'Close', 'Volume', 'Value', 'New']
+
+
+def matrices(store, tickers):
+    """(ngày, giá, khối lượng) dạng ma trận phiên x mã; NaN ở phiên mã không có dữ liệu"""
+    recs = [np.asarray(store.read(t)) for t in tickers]
+    dates = np.unique(np.concatenate([r['date'] for r in recs])) if recs else np.empty(0, dtype='M8[ns]')
+    C = np.full((len(dates), len(recs)), np.nan)
+    V = np.full((len(dates), len(recs)), np.nan)
+    for j, rec in enumerate(recs):
+        i = np.searchsorted(dates, rec['date'])
+        C[i, j] = rec['close']
+        V[i, j] = rec['volume']
+    return pd.DatetimeIndex(dates, name='Date'), C, V
+
+
+def hose_calendar(dates):
+    """Phiên nào trong `dates` thuộc lịch giao dịch HOSE: ngày làm việc, không trùng nghỉ lễ cố định.
+
+    `dates` là hợp các phiên của mọi mã, nên ngày làm việc cả thị trường nghỉ (Tết, Giỗ Tổ, nghỉ bù) không có trong đó.
+    Trả về (is_session, is_weekend, is_holiday).
+    """
+    weekend = dates.dayofweek >= 5
+    holiday = np.zeros(len(dates), dtype=bool)
+    for month, day in FIXED_HOLIDAYS:
+        holiday |= (dates.month == month) & (dates.day == day)
+    holiday &= ~weekend
+    return ~weekend & ~holiday, weekend, holiday
+
+
+def _last_valid(M):
+    """Chỉ số dòng có dữ liệu gần nhất (tính cả dòng hiện tại) theo từng cột; -1 nếu chưa có"""
+    idx = np.where(np.isnan(M), -1, np.arange(len(M))[:, None])
+    return np.maximum.accumulate(idx, axis=0)
+
+
+def _previous_index(M):
+    """Chỉ số dòng có dữ liệu liền trước (không tính dòng hiện tại) theo từng cột; -1 nếu chưa có"""
+    return np.vstack([np.full((1, M.shape[1]), -1), _last_valid(M)[:-1]])
+
+
+def _previous(M):
+    """Giá trị ở phiên có dữ liệu liền trước của cùng mã (NaN nếu không có)"""
+    idx = _previous_index(M)
+    out = M[np.maximum(idx, 0), np.arange(M.shape[1])]
+    out[idx < 0] = np.nan
+    return out
+
+
+def _run_length(F):
+    """Độ dài chuỗi True liên tiếp kết thúc tại mỗi dòng"""
+    n = np.arange(1, len(F) + 1)[:, None]
+    last_false = np.maximum.accumulate(np.where(F, 0, n), axis=0)
+    return np.where(F, n - last_false, 0)
+
+
+def _run_ends(F, min_len):
+    """(mask dòng cuối của mỗi chuỗi True dài >= min_len, độ dài chuỗi)"""
+    run = _run_length(F)
+    nxt = np.vstack([run[1:], np.zeros((1, F.shape[1]), dtype=run.dtype)])
+    return (run >= min_len) & (nxt == 0), run
+
+
+def _bench_columns(tickers, df_profile, default):
+    """Cột benchmark của từng mã (-1: chính là benchmark mặc định, so lợi nhuận tuyệt đối)"""
+    profile = df_profile.set_index('Ticker') if df_profile is not None and 'Ticker' in df_profile.columns else df_profile
+    mapping = resolve_benchmarks(tickers, profile if profile is not None else pd.DataFrame(), tickers, default)
+    pos = {t: j for j, t in enumerate(tickers)}
+    return np.array([-1 if b == t or b not in pos else pos[b] for t, b in mapping.items()])
+
+
+def fresh_mask(dates, tickers, fresh):
+    """Mask phiên x mã của dữ liệu mới (fresh: {mã: mảng ngày mới/đổi}; None = mọi phiên đều mới)"""
+    if fresh is None:
+        return np.ones((len(dates), len(tickers)), dtype=bool)
+    mask = np.zeros((len(dates), len(tickers)), dtype=bool)
+    values = dates.to_numpy(dtype='M8[ns]')
+    for j, t in enumerate(tickers):
+        d = np.asarray(fresh.get(t, ()), dtype='M8[ns]')
+        i = np.searchsorted(values, d)
+        mask[i[(i < len(values)) & (values[np.minimum(i, len(values) - 1)] == d)], j] = True
+    return mask
+
+
+def changed_dates(old, new):
+    """Ngày của các dòng trong partition mới không có (hoặc khác giá / khối lượng) trong partition cũ"""
+    if not len(old):
+        return new['date']
+    j = np.minimum(np.searchsorted(old['date'], new['date']), len(old) - 1)
+    same = (old['date'][j] == new['date']) & (old['close'][j] == new['close']) & (old['volume'][j] == new['volume'])
+    return new['date'][~same]
+
+
+def checks(dates, C, V, bench_cols):
+    """{kiểm tra: (mask phiên x mã, giá trị kèm theo)} trên toàn ma trận"""
+    present = ~np.isnan(C)
+    prev_c = _previous(C)
+    prev_v = _previous(V)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        r = C / prev_c - 1
+    out = {}
+
+    out['invalid'] = (present & ((C <= 0) | (V < 0)), C)
+    # Biên độ chỉ áp dụng khi mã có giao dịch ở phiên liền trước của thị trường; sau khi mã bị ngắt quãng
+    # (tạm ngừng giao dịch, thiếu dữ liệu) giá tham chiếu không phải giá đóng cửa đã lưu
+    adjacent = _previous_index(C) == np.arange(len(C))[:, None] - 1
+    jump = adjacent & (np.abs(r) > PRICE_LIMIT + LIMIT_TOL)
+    out['jump'] = (jump, r)
+
+    # Lợi nhuận vượt benchmark: z-score vững (median / MAD theo từng mã), bỏ các phiên đã vượt biên độ
+    bench_r = np.where(bench_cols >= 0, r[:, np.maximum(bench_cols, 0)], 0.0)
+    excess = np.where(jump, np.nan, r - bench_r)
+    with np.errstate(invalid='ignore', divide='ignore'), warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)   # Mã chưa có lợi nhuận nào: median của cột toàn NaN
+        med = np.nanmedian(excess, axis=0)
+        mad = np.nanmedian(np.abs(excess - med), axis=0) * 1.4826
+        z = np.abs(excess - med) / mad
+    out['outlier'] = ((z > OUTLIER_Z) & (np.abs(excess) > OUTLIER_MIN), z)
+
+    # Giá đứng yên / phiên lặp lại y nguyên: chuỗi liên tiếp tính trên các phiên có dữ liệu
+    unchanged = present & (C == prev_c)
+    flat_end, flat_run = _run_ends(unchanged, FLAT_DAYS)
+    out['flat'] = (flat_end, flat_run)
+    repeated = unchanged & (V == prev_v) & (V > 0)
+    stale_end, stale_run = _run_ends(repeated, STALE_DAYS)
+    out['stale'] = (stale_end, stale_run)
+
+    # Lịch giao dịch: thiếu phiên trong khoảng mã đang niêm yết, hoặc có phiên ngoài lịch
+    is_session, weekend, holiday = hose_calendar(dates)
+    listed = (np.maximum.accumulate(present, axis=0) & np.maximum.accumulate(present[::-1], axis=0)[::-1])
+    out['gap'] = (listed & ~present & is_session[:, None], np.full(C.shape, np.nan))
+    out['weekend'] = (present & weekend[:, None], np.full(C.shape, np.nan))
+    out['holiday'] = (present & holiday[:, None], np.full(C.shape, np.nan))
+
+    # Giá đổi mà không có giao dịch (chỉ xét mã có ghi nhận khối lượng)
+    has_volume = np.nansum(V, axis=0) > 0
+    out['volume'] = ((r != 0) & ~np.isnan(r) & (V == 0) & has_volume, r)
+    return out
+
+
+def validate(store, tickers=None, df_profile=None, fresh=None, default=BENCH):
+    """Bảng lỗi dữ liệu (ISSUE_COLUMNS) của các mã; cột New đánh dấu lỗi nằm trong dữ liệu mới tải (fresh)"""
+    tickers = list(tickers or store.tickers)
+    dates, C, V = matrices(store, tickers)
+    new = fresh_mask(dates, tickers, fresh)
+    bench_cols = _bench_columns(tickers, df_profile, default)
+    parts = []
+    for name, (mask, value) in checks(dates, C, V, bench_cols).items():
+        i, j = np.nonzero(mask)
+        if len(i):
+            parts.append(pd.DataFrame({'Ticker': np.asarray(tickers)[j], 'Date': dates[i], 'Check': name,
+                                       'Severity': CHECKS[name], 'Close': C[i, j], 'Volume': V[i, j],
+                                       'Value': value[i, j], 'New': new[i, j]}))
+    if not parts:
+        return pd.DataFrame(columns=ISSUE_COLUMNS)
+    return pd.concat(parts, ignore_index=True).sort_values(['Ticker', 'Date', 'Check'], ignore_index=True)
+
+
+def load_anomalies(path=ANOMALY_PATH):
+    """Lịch sử lỗi đã gặp (ANOMALY_COLUMNS); bảng rỗng nếu chưa có"""
+    if not os.path.exists(path):
+        return pd.DataFrame(columns=ANOMALY_COLUMNS)
+    df = pd.read_csv(path, parse_dates=['Date'])
+    return df.astype({'Seen': int, 'Acked': bool})
+
+
+def _match(issues, anomalies):
+    """Vị trí trong anomalies của từng dòng issues cùng (mã, ngày, kiểm tra, giá trị); -1 nếu chưa gặp"""
+    pos = {(t, pd.Timestamp(d), c): i for i, (t, d, c) in
+           enumerate(zip(anomalies['Ticker'], anomalies['Date'], anomalies['Check']))}
+    idx = np.array([pos.get((t, pd.Timestamp(d), c), -1) for t, d, c in
+                    zip(issues['Ticker'], issues['Date'], issues['Check'])], dtype=int)
+    if len(idx):
+        # Giá trị khác (vd. bị điều chỉnh lại) là lỗi mới
+        old = anomalies['Value'].to_numpy(dtype=np.float64)[np.maximum(idx, 0)] if len(anomalies) else np.full(len(idx), np.nan)
+        same = np.isclose(issues['Value'].to_numpy(dtype=np.float64), old, rtol=1e-6, equal_nan=True)
+        idx[~same] = -1
+    return idx
+
+
+def acknowledge(issues, anomalies):
+    """Hạ lỗi đã xác nhận, hoặc 'jump' đã bị cách ly JUMP_REPEATS lần với cùng giá trị, xuống 'warning'"""
+    errors = issues[issues['Severity'] == 'error']
+    idx = _match(errors, anomalies)
+    if not (idx >= 0).any():
+        return issues
+    known = anomalies.iloc[idx[idx >= 0]]
+    ok = known['Acked'].to_numpy(dtype=bool) | ((known['Check'] == 'jump') & (known['Seen'] >= JUMP_REPEATS)).to_numpy()
+    issues = issues.copy()
+    issues.loc[errors.index[idx >= 0][ok], 'Severity'] = 'warning'
+    return issues
+
+
+def remember(issues, anomalies, accept=False):
+    """Cộng một lần gặp cho các lỗi nghiêm trọng trong dữ liệu mới; accept=True đánh dấu đã xác nhận"""
+    new = issues[issues['New'] & (issues['Severity'] == 'error')]
+    if new.empty:
+        return anomalies
+    anomalies = anomalies.copy()
+    idx = _match(new, anomalies)
+    seen = idx[idx >= 0]
+    anomalies.loc[anomalies.index[seen], 'Seen'] += 1
+    if accept:
+        anomalies.loc[anomalies.index[seen], 'Acked'] = True
+    fresh = new[idx < 0][['Ticker', 'Date', 'Check', 'Value']].assign(Seen=1, Acked=accept)
+    # Cùng (mã, ngày, kiểm tra) nhưng giá trị khác: bản mới thay bản cũ
+    stale = anomalies.set_index(['Ticker', 'Date', 'Check']).index.isin(fresh.set_index(['Ticker', 'Date', 'Check']).index)
+    parts = [p for p in (anomalies[~stale], fresh) if len(p)]
+    return pd.concat(parts, ignore_index=True)[ANOMALY_COLUMNS] if parts else anomalies
+
+
+def save_anomalies(anomalies, path=ANOMALY_PATH):
+    save_report(anomalies.sort_values(['Ticker', 'Date', 'Check']), path)
+
+
+def quarantined(issues):
+    """Các mã có lỗi mức 'error' trong dữ liệu mới"""
+    bad = issues[issues['New'] & (issues['Severity'] == 'error')]
+    return sorted(bad['Ticker'].unique().tolist())
+
+
+def summary(issues):
+    """Bảng mã x kiểm tra: số lỗi mới (tổng số lỗi), chỉ các mã có lỗi mới"""
+    issues = issues[issues['Ticker'].isin(issues.loc[issues['New'], 'Ticker'])]
+    if issues.empty:
+        return pd.DataFrame()
+    total = issues.pivot_table(index='Ticker', columns='Check', values='New', aggfunc='size', fill_value=0)
+    new = issues.pivot_table(index='Ticker', columns='Check', values='New', aggfunc='sum', fill_value=0)
+    return new.astype(int).astype(str) + ' (' + total.astype(str) + ')'
+
+
+def save_report(issues, path):
+    """Ghi bảng lỗi ra CSV (ghi file tạm rồi os.replace)"""
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp = path + '.tmp'
+    issues.to_csv(tmp, index=False)
+    os.replace(tmp, path)
+
+
+def run(store, df_profile=None, fresh=None, path=None, tickers=None, anomalies=None):
+    """Kiểm tra dữ liệu, in tóm tắt và ghi báo cáo; trả về bảng lỗi.
+
+    anomalies: lịch sử lỗi (load_anomalies) để hạ các lỗi đã xác nhận / lặp lại xuống 'warning'.
+    """
+    t0 = time.perf_counter()
+    tickers = list(tickers or store.tickers)
+    issues = validate(store, tickers, df_profile, fresh)
+    if anomalies is not None:
+        before = issues['New'] & (issues['Severity'] == 'error')
+        issues = acknowledge(issues, anomalies)
+        n_ack = int((before & (issues['Severity'] == 'warning')).sum())
+        if n_ack:
+            print(f"ℹ️ {n_ack} lỗi đã được xác nhận trước đó hoặc lặp lại {JUMP_REPEATS} lần, chỉ cảnh báo")
+    if path:
+        save_report(issues, path)
+    n_new = int(issues['New'].sum())
+    print(f"🔎 Kiểm tra dữ liệu {len(tickers)} mã: {n_new} lỗi mới / {len(issues)} tổng "
+          f"({time.perf_counter() - t0:.2f}s)")
+    if n_new:
+        print(summary(issues).to_string())
+    return issues
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Kiểm tra chất lượng dữ liệu của snapshot hiện tại (toàn bộ lịch sử)")
+    parser.add_argument('--out', default=os.path.join(REPORT_DIR, 'quarantine.csv'), help="File CSV kết quả")
+    args = parser.parse_args()
+    store = storage.open_store(snapshot.resolve('ticks'))
+    if store is None:
+        parser.error("Chưa có dữ liệu, hãy chạy update_data.py trước")
+    profile_path = snapshot.resolve('profile')
+    run(store, pd.read_csv(profile_path) if os.path.exists(profile_path) else None, path=args.out)
@@ -0,0 +1,132 @@
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+import snapshot
+import storage
+
+# Thanh khoản tính sẵn theo ngày / tuần / tháng cho mọi mã, dựng lại mỗi lần dữ liệu đổi phiên bản
+VOLUME_PATH = os.path.join(storage.DATA_DIR, 'volume.npz')
+RESOLUTIONS = {'D': None, 'W': 'W-FRI', 'M': 'ME'}
+BUCKET_COLUMNS = ['Volume', 'Value', 'Sessions', 'Avg Volume', 'Avg Value']
+MAX_BARS = 300          # Số cột tối đa gửi xuống biểu đồ khối lượng
+LIQUIDITY_WINDOW = 63   # Số phiên gần nhất dùng cho điểm thanh khoản (~3 tháng)
+LIQUIDITY_COLUMNS = ['ADV', 'ADTV', 'Zero Days', 'Amihud', 'Liquidity Score']
+
+
+def pick_resolution(start, end, max_bars=MAX_BARS):
+    """Độ phân giải nhỏ nhất mà số cột trong [start, end] không vượt max_bars"""
+    days = (pd.Timestamp(end) - pd.Timestamp(start)).days
+    if days * 5 / 7 <= max_bars:
+        return 'D'
+    if days / 7 <= max_bars:
+        return 'W'
+    return 'M'
+
+
+def aggregate(long):
+    """Bảng long (Ticker, Date, Close, Volume) -> dict độ phân giải -> DataFrame MultiIndex (Ticker, Date)"""
+    df = long[['Ticker', 'Date', 'Volume']].copy()
+    df['Value'] = long['Close'].astype(np.float64) * long['Volume']   # Giá trị giao dịch = Close x Volume
+    df['Sessions'] = 1
+    out = {}
+    for res, freq in RESOLUTIONS.items():
+        key = 'Date' if freq is None else pd.Grouper(key='Date', freq=freq)
+        g = df.groupby(['Ticker', key], sort=True)[['Volume', 'Value', 'Sessions']].sum()
+        g['Avg Volume'] = g['Volume'] / g['Sessions']
+        g['Avg Value'] = g['Value'] / g['Sessions']
+        out[res] = g[BUCKET_COLUMNS]
+    return out
+
+
+def liquidity_scores(long, window=LIQUIDITY_WINDOW):
+    """Điểm thanh khoản 0-100 của từng mã trên `window` phiên gần nhất.
+
+    Trung bình hạng phần trăm của: ADTV (giá trị giao dịch bình quân, cao = tốt),
+    tỷ lệ phiên không khớp lệnh (thấp = tốt) và Amihud |lợi nhuận| / giá trị (thấp = tốt).
+    """
+    rows = {}
+    for ticker, g in long.groupby('Ticker', sort=False):
+        g = g.tail(window + 1)   # thêm một phiên làm gốc cho lợi nhuận
+        ret = g['Close'].astype(np.float64).pct_change().iloc[1:]
+        g = g.iloc[1:] if len(g) > 1 else g
+        value = g['Close'].astype(np.float64) * g['Volume']
+        with np.errstate(divide='ignore', invalid='ignore'):
+            amihud = ret.abs().to_numpy() / value.to_numpy()[-len(ret):] if len(ret) else np.array([])
+        amihud = amihud[np.isfinite(amihud)]
+        rows[ticker] = {
+            'ADV': g['Volume'].mean(), 'ADTV': value.mean(),
+            'Zero Days': (g['Volume'] == 0).mean(),
+            'Amihud': amihud.mean() * 1e9 if amihud.size else np.nan,
+        }
+    df = pd.DataFrame.from_dict(rows, orient='index', columns=LIQUIDITY_COLUMNS[:-1])
+    ranks = pd.concat([df['ADTV'].rank(pct=True), 1 - df['Zero Days'].rank(pct=True) + 1 / len(df),
+                       1 - df['Amihud'].rank(pct=True) + 1 / len(df)], axis=1)
+    df['Liquidity Score'] = ranks.mean(axis=1) * 100
+    df.index.name = 'Ticker'
+    return df
+
+
+def build_volume(store):
+    """Tính toàn bộ bucket và điểm thanh khoản cho một phiên bản dữ liệu"""
+    long = store.long()
+    return {'version': store.version, 'buckets': aggregate(long), 'liquidity': liquidity_scores(long)}
+
+
+def save_volume(vol, path=VOLUME_PATH):
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    arrays = {}
+    for res, g in vol['buckets'].items():
+        arrays[f"{res}__ticker"] = g.index.get_level_values(0).to_numpy(dtype=str)
+        arrays[f"{res}__date"] = g.index.get_level_values(1).to_numpy(dtype='M8[ns]')
+        arrays[f"{res}__values"] = g.to_numpy(dtype=np.float64)
+    liq = vol['liquidity']
+    tmp = path + '.tmp.npz'
+    np.savez(tmp, version=np.array(vol['version']), liq_tickers=liq.index.to_numpy(dtype=str),
+             liq_values=liq.to_numpy(dtype=np.float64), **arrays)
+    os.replace(tmp, path)
+
+
+def load_volume(path=VOLUME_PATH):
+    """Đọc bucket đã lưu (None nếu chưa có)"""
+    if not os.path.exists(path):
+        return None
+    with np.load(path) as z:
+        buckets = {}
+        for res in RESOLUTIONS:
+            idx = pd.MultiIndex.from_arrays([z[f"{res}__ticker"], pd.DatetimeIndex(z[f"{res}__date"])], names=['Ticker', 'Date'])
+            buckets[res] = pd.DataFrame(z[f"{res}__values"], index=idx, columns=BUCKET_COLUMNS)
+        liquidity = pd.DataFrame(z['liq_values'], index=pd.Index(z['liq_tickers'], name='Ticker'), columns=LIQUIDITY_COLUMNS)
+        return {'version': str(z['version']), 'buckets': buckets, 'liquidity': liquidity}
+
+
+def bars(vol, ticker, start, end, resolution=None):
+    """(độ phân giải, DataFrame bucket của một mã trong [start, end]); bucket tuần/tháng gán nhãn theo ngày cuối kỳ"""
+    resolution = resolution or pick_resolution(start, end)
+    g = vol['buckets'][resolution]
+    if ticker not in g.index.get_level_values(0):
+        return resolution, pd.DataFrame(columns=BUCKET_COLUMNS)
+    s = g.xs(ticker, level='Ticker')
+    # Giữ cả kỳ cuối chứa end (nhãn tuần là thứ Sáu, nhãn tháng là ngày cuối tháng)
+    hi = pd.Timestamp(end)
+    if resolution == 'W':
+        hi += pd.Timedelta(days=6)
+    elif resolution == 'M':
+        hi += pd.offsets.MonthEnd(0)
+    return resolution, s.loc[pd.Timestamp(start):hi]
+
+
+def refresh(store, path=VOLUME_PATH):
+    """Dựng lại bucket khối lượng sau mỗi lần cập nhật dữ liệu"""
+    t0 = time.perf_counter()
+    vol = build_volume(store)
+    save_volume(vol, path)
+    print(f"📊 Đã tổng hợp khối lượng D/W/M cho {len(vol['liquidity'])} mã ({time.perf_counter() - t0:.2f}s)")
+    return vol
+
+
+if __name__ == "__main__":
+    with snapshot.update() as snap:
+        snap.version = refresh(snap.open_store(), snap.path('volume'))['version']